@@ -1,5 +1,25 @@
+import json
 import os
-from typing import Optional, TypedDict
+from typing import Any, Dict, List, Mapping, Optional, TypedDict, cast
+
+
+class SkillsConfig(TypedDict):
+    # names of skills to register, None for all of them
+    ENABLED: Optional[List[str]]
+    # settings by skill name
+    SETTINGS: Mapping[str, Mapping[str, Any]]
+
+
+class WebhookConfig(TypedDict):
+    # public base URL Telegram posts updates to, None for long polling
+    URL: Optional[str]
+    LISTEN: str
+    PORT: int
+    PATH: str
+    # checked against X-Telegram-Bot-Api-Secret-Token, random if not set
+    SECRET_TOKEN: Optional[str]
+    # max simultaneous connections Telegram opens to the webhook
+    MAX_CONNECTIONS: int
 
 
 class Config(TypedDict):
@@ -9,7 +29,11 @@ class Config(TypedDict):
     AOC_SESSION: Optional[str]
     GROUP_CHAT_ID: Optional[str]
     SQLITE_DB_PATH: str
+    PERSISTENCE_PATH: str
     SENTRY_DSN: Optional[str]
+    SKILLS: SkillsConfig
+    WEBHOOK: WebhookConfig
+    UPDATE_WORKERS: int
 
 
 def get_sqlite_db_path() -> str:
@@ -17,6 +41,31 @@ def get_sqlite_db_path() -> str:
     return os.getenv("SQLITE_DB_PATH", "bot.db")
 
 
+def get_persistence_path() -> str:
+    """Get bot persistence (chat_data, bot_data) file path from ENV"""
+    return os.getenv("PERSISTENCE_PATH", "bot.pickle")
+
+
+def get_words_path() -> str:
+    """Get Buktopuha words file path from ENV"""
+    return os.getenv("WORDS_PATH", "words.txt")
+
+
+def get_speech_backend() -> str:
+    """Get speech recognition backend (google, vosk or fake) from ENV"""
+    return os.getenv("SPEECH_BACKEND", "google").strip().lower()
+
+
+def get_vosk_model_path() -> str:
+    """Get offline Vosk speech model directory from ENV"""
+    return os.getenv("VOSK_MODEL_PATH", "vosk-model")
+
+
+def get_persist_chat_memory() -> bool:
+    """Get whether Nyan's chat memory is kept in SQLite from PERSIST_CHAT_MEMORY ENV"""
+    return os.getenv("PERSIST_CHAT_MEMORY", "True").lower() == "true"
+
+
 def get_aoc_session() -> Optional[str]:
     """Get AOC session value ENV"""
     return os.getenv("AOC_SESSION", None)
@@ -50,6 +99,53 @@ def get_token() -> str:
     return token
 
 
+def get_enabled_skills() -> Optional[List[str]]:
+    """Get comma-separated names of enabled skills from SKILLS ENV, None for all"""
+    names = [n.strip() for n in os.getenv("SKILLS", "").split(",")]
+    return [n for n in names if n] or None
+
+
+def get_skills_settings() -> Mapping[str, Mapping[str, Any]]:
+    """Get per-skill settings from SKILLS_SETTINGS ENV, a JSON object like
+    {"towel_mode": {"quarantine_time": 30}}"""
+    error = ValueError("SKILLS_SETTINGS should map skill names to objects")
+    raw: Any = json.loads(os.getenv("SKILLS_SETTINGS", "") or "{}")
+    if not isinstance(raw, dict):
+        raise error
+    settings: Dict[str, Dict[str, Any]] = {}
+    for name, value in cast(Dict[str, Any], raw).items():
+        if not isinstance(value, dict):
+            raise error
+        settings[name] = cast(Dict[str, Any], value)
+    return settings
+
+
+def get_skill_settings(config: Config, name: str) -> Mapping[str, Any]:
+    """Settings of a skill parsed by get_config, empty if there are none"""
+    return config["SKILLS"]["SETTINGS"].get(name, {})
+
+
+def get_skills_config() -> SkillsConfig:
+    return {"ENABLED": get_enabled_skills(), "SETTINGS": get_skills_settings()}
+
+
+def get_webhook_config() -> WebhookConfig:
+    """Get webhook settings from WEBHOOK_* ENV"""
+    return {
+        "URL": os.getenv("WEBHOOK_URL", "").strip() or None,
+        "LISTEN": os.getenv("WEBHOOK_LISTEN", "0.0.0.0"),
+        "PORT": int(os.getenv("WEBHOOK_PORT", "8080")),
+        "PATH": os.getenv("WEBHOOK_PATH", "/telegram"),
+        "SECRET_TOKEN": os.getenv("WEBHOOK_SECRET_TOKEN", "").strip() or None,
+        "MAX_CONNECTIONS": int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40")),
+    }
+
+
+def get_update_workers() -> int:
+    """Get number of updates handled at once from UPDATE_WORKERS ENV"""
+    return int(os.getenv("UPDATE_WORKERS", "8"))
+
+
 def get_config() -> Config:
     config: Config = {
         "DEBUG": get_debug(),
@@ -58,6 +154,10 @@ def get_config() -> Config:
         "AOC_SESSION": get_aoc_session(),
         "GROUP_CHAT_ID": get_group_chat_id(),
         "SQLITE_DB_PATH": get_sqlite_db_path(),
+        "PERSISTENCE_PATH": get_persistence_path(),
         "SENTRY_DSN": os.getenv("SENTRY_DSN", None),
+        "SKILLS": get_skills_config(),
+        "WEBHOOK": get_webhook_config(),
+        "UPDATE_WORKERS": get_update_workers(),
     }
     return config
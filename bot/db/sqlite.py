@@ -2,7 +2,7 @@ import sqlite3
 import logging
 import json
 from datetime import datetime, timedelta
-from typing import Any, List, Dict, Optional
+from typing import Any, List, Dict, Optional, Set
 from config import get_sqlite_db_path
 
 logger = logging.getLogger(__name__)
@@ -23,6 +23,28 @@ def convert_datetime(s: bytes) -> Optional[datetime]:
 sqlite3.register_adapter(datetime, adapt_datetime)
 sqlite3.register_converter("DATETIME", convert_datetime)
 
+# PRAGMA user_version, bumped by migrations run once in _init_db
+SCHEMA_VERSION = 1
+
+# display name column for queries joining `users u`
+_DISPLAY_NAME = "COALESCE(u.display_name, 'unknown') AS display_name"
+
+
+def _user_names(
+    user_meta: Dict[str, Any],
+) -> tuple[Optional[str], Optional[str], Optional[str], str]:
+    """Get (username, first_name, last_name, username or fullname or unknown)"""
+    username, fname, lname = (
+        v if isinstance(v, str) and v else None
+        for v in (
+            user_meta.get("username"),
+            user_meta.get("first_name"),
+            user_meta.get("last_name"),
+        )
+    )
+    fullname = " ".join(part for part in (fname, lname) if part)
+    return username, fname, lname, username or fullname or "unknown"
+
 
 # pylint: disable=too-many-public-methods
 class BotDB:
@@ -32,6 +54,8 @@ class BotDB:
         else:
             self.db_path = db_path
         self._init_db()
+        # checked by the trusted filter on every message, kept in memory
+        self._trusted_ids: Set[int] = set(self.get_trusted_user_ids())
 
     def _get_conn(self) -> sqlite3.Connection:
         conn = sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES)
@@ -61,6 +85,54 @@ class BotDB:
                     updated_at DATETIME
                 )
             """)
+            # Buktopuha pre-generated questions
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS buktopuha_questions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    word TEXT,
+                    question TEXT,
+                    created_at DATETIME
+                )
+            """)
+            # Word banks shuffled cursors
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS word_bank_cursors (
+                    bank TEXT,
+                    level TEXT,
+                    size INTEGER,
+                    step INTEGER,
+                    "offset" INTEGER,
+                    position INTEGER,
+                    PRIMARY KEY (bank, level)
+                )
+            """)
+            # Chat memory (append-only spill of Nyan's memory)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chat_memory (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id INTEGER,
+                    datetime DATETIME,
+                    message TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS chat_memory_chat_id_datetime
+                ON chat_memory (chat_id, datetime)
+            """)
+            # Speech recognition results, last_used is a logical LRU clock
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS transcriptions (
+                    file_unique_id TEXT PRIMARY KEY,
+                    transcript TEXT,
+                    duration INTEGER,
+                    language TEXT,
+                    last_used INTEGER
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS transcriptions_last_used
+                ON transcriptions (last_used)
+            """)
             # Towel Quarantine
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS towel_quarantine (
@@ -112,8 +184,79 @@ class BotDB:
                     data TEXT
                 )
             """)
+            # Modes switched on or off per chat, absent means mode default
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chat_modes (
+                    chat_id INTEGER,
+                    mode TEXT,
+                    enabled BOOLEAN,
+                    PRIMARY KEY (chat_id, mode)
+                )
+            """)
+            # Users (denormalized names from skills' user meta)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    user_id INTEGER PRIMARY KEY,
+                    username TEXT,
+                    first_name TEXT,
+                    last_name TEXT,
+                    display_name TEXT NOT NULL,
+                    updated_at DATETIME
+                )
+            """)
+            self._migrate(conn)
             conn.commit()
 
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        version = int(conn.execute("PRAGMA user_version").fetchone()[0])
+        if version < 1:
+            self._backfill_users(conn)
+        if version < SCHEMA_VERSION:
+            logger.info("migrated database from version %d", version)
+            # PRAGMA takes no parameters
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION:d}")
+
+    @staticmethod
+    def _backfill_users(conn: sqlite3.Connection) -> None:
+        """Fill `users` from `meta` of rows stored before the table existed"""
+        rows = conn.execute("""
+            SELECT user_id, meta FROM roll_hussars
+            WHERE user_id NOT IN (SELECT user_id FROM users)
+            UNION ALL
+            SELECT user_id, meta FROM buktopuha_players
+            WHERE user_id NOT IN (SELECT user_id FROM users)
+            UNION ALL
+            SELECT user_id, meta FROM peninsula_users
+            WHERE user_id NOT IN (SELECT user_id FROM users)
+        """).fetchall()
+        if not rows:
+            return
+        logger.info("backfilling %d users from meta", len(rows))
+        now = datetime.now()
+        for row in rows:
+            meta: Dict[str, Any]
+            try:
+                meta = json.loads(row["meta"] or "{}")
+            except ValueError:
+                meta = {}
+            conn.execute(
+                "INSERT OR IGNORE INTO users (user_id, username, first_name, last_name, display_name, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (row["user_id"], *_user_names(meta), now),
+            )
+
+    # --- Users ---
+    def upsert_user(self, user_id: int, user_meta: Dict[str, Any]) -> None:
+        self.execute(
+            "INSERT INTO users (user_id, username, first_name, last_name, display_name, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET username = excluded.username, first_name = excluded.first_name, "
+            "last_name = excluded.last_name, display_name = excluded.display_name, updated_at = excluded.updated_at",
+            (user_id, *_user_names(user_meta), datetime.now()),
+        )
+
+    def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        row = self.fetchone("SELECT * FROM users WHERE user_id = ?", (user_id,))
+        return dict(row) if row else None
+
     # --- Trusted Users ---
     def get_trusted_user(self, user_id: int) -> Optional[Dict[str, Any]]:
         row = self.fetchone("SELECT * FROM trusted_users WHERE user_id = ?", (user_id,))
@@ -124,26 +267,32 @@ class BotDB:
             'INSERT OR REPLACE INTO trusted_users (user_id, "by", datetime) VALUES (?, ?, ?)',
             (user_id, admin_id, datetime.now()),
         )
+        self._trusted_ids.add(user_id)
 
     def untrust_user(self, user_id: int) -> None:
         self.execute("DELETE FROM trusted_users WHERE user_id = ?", (user_id,))
+        self._trusted_ids.discard(user_id)
+
+    def get_trusted_user_ids(self) -> List[int]:
+        rows = self.fetchall("SELECT user_id FROM trusted_users")
+        return [row["user_id"] for row in rows]
 
     def is_user_trusted(self, user_id: int | str) -> bool:
-        row = self.fetchone("SELECT 1 FROM trusted_users WHERE user_id = ?", (user_id,))
-        return row is not None
+        """Looked up in memory, the DB is only read at startup"""
+        try:
+            return int(user_id) in self._trusted_ids
+        except ValueError:
+            # not an id, can't be trusted
+            return False
 
     # --- Buktopuha ---
     def get_all_buktopuha_players(self) -> List[Dict[str, Any]]:
         rows = self.fetchall(
-            "SELECT * FROM buktopuha_players ORDER BY win_counter DESC"
+            "SELECT p.user_id AS _id, p.game_counter, p.win_counter, p.total_score, p.created_at, p.updated_at, "
+            f"{_DISPLAY_NAME} FROM buktopuha_players p LEFT JOIN users u ON u.user_id = p.user_id "
+            "ORDER BY p.win_counter DESC"
         )
-        res: List[Dict[str, Any]] = []
-        for r in rows:
-            d = dict(r)
-            d["_id"] = d.pop("user_id")
-            d["meta"] = json.loads(d["meta"])
-            res.append(d)
-        return res
+        return [dict(r) for r in rows]
 
     def find_buktopuha_player(self, user_id: int) -> Optional[Dict[str, Any]]:
         row = self.fetchone(
@@ -166,6 +315,7 @@ class BotDB:
             "INSERT INTO buktopuha_players (user_id, meta, game_counter, win_counter, total_score, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
             (user_id, json.dumps(user_meta), game_inc, win_inc, score, now, now),
         )
+        self.upsert_user(user_id, user_meta)
 
     def inc_buktopuha_game_counter(self, user_id: int) -> None:
         self.execute(
@@ -185,6 +335,127 @@ class BotDB:
     def remove_all_buktopuha_players(self) -> None:
         self.execute("DELETE FROM buktopuha_players")
 
+    def add_buktopuha_question(self, word: str, question: str) -> None:
+        self.execute(
+            "INSERT INTO buktopuha_questions (word, question, created_at) VALUES (?, ?, ?)",
+            (word, question, datetime.now()),
+        )
+
+    def pop_buktopuha_question(self) -> Optional[Dict[str, Any]]:
+        """Take the oldest pre-generated question out of the pool"""
+        row = self.fetchone(
+            "DELETE FROM buktopuha_questions WHERE id = (SELECT MIN(id) FROM buktopuha_questions) RETURNING word, question"
+        )
+        return dict(row) if row else None
+
+    def count_buktopuha_questions(self) -> int:
+        row = self.fetchone("SELECT COUNT(*) AS cnt FROM buktopuha_questions")
+        return row["cnt"] if row else 0
+
+    # --- Word Banks ---
+    def get_word_bank_cursor(self, bank: str, level: str) -> Optional[Dict[str, Any]]:
+        row = self.fetchone(
+            "SELECT * FROM word_bank_cursors WHERE bank = ? AND level = ?",
+            (bank, level),
+        )
+        return dict(row) if row else None
+
+    def set_word_bank_cursor(
+        self,
+        bank: str,
+        level: str,
+        *,
+        size: int,
+        step: int,
+        offset: int,
+        position: int,
+    ) -> None:
+        self.execute(
+            'INSERT OR REPLACE INTO word_bank_cursors (bank, level, size, step, "offset", position) VALUES (?, ?, ?, ?, ?, ?)',
+            (bank, level, size, step, offset, position),
+        )
+
+    # --- Chat Memory ---
+    def add_chat_message(
+        self,
+        chat_id: int,
+        dt: datetime,
+        message: str,
+        *,
+        keep: int,
+        since: datetime,
+    ) -> None:
+        """Append a message, the chat keeps only its last `keep` ones since `since`"""
+        with self._get_conn() as conn:
+            conn.execute(
+                "INSERT INTO chat_memory (chat_id, datetime, message) VALUES (?, ?, ?)",
+                (chat_id, dt, message),
+            )
+            conn.execute(
+                "DELETE FROM chat_memory WHERE chat_id = ? AND (datetime < ? OR id <= "
+                "(SELECT id FROM chat_memory WHERE chat_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?))",
+                (chat_id, since, chat_id, keep),
+            )
+
+    def get_chat_messages(self, since: datetime) -> List[Dict[str, Any]]:
+        rows = self.fetchall(
+            "SELECT chat_id, datetime, message FROM chat_memory WHERE datetime >= ? ORDER BY id",
+            (since,),
+        )
+        return [dict(r) for r in rows]
+
+    def delete_chat_messages(self, chat_id: int) -> None:
+        self.execute("DELETE FROM chat_memory WHERE chat_id = ?", (chat_id,))
+
+    def delete_chat_messages_before(self, before: datetime) -> None:
+        self.execute("DELETE FROM chat_memory WHERE datetime < ?", (before,))
+
+    # --- Chat Modes ---
+    def set_chat_mode(self, chat_id: int, mode: str, enabled: bool) -> None:
+        self.execute(
+            "INSERT OR REPLACE INTO chat_modes (chat_id, mode, enabled) VALUES (?, ?, ?)",
+            (chat_id, mode, enabled),
+        )
+
+    def get_chat_modes(self, mode: str) -> List[Dict[str, Any]]:
+        rows = self.fetchall(
+            "SELECT chat_id, enabled FROM chat_modes WHERE mode = ?", (mode,)
+        )
+        return [{"chat_id": r["chat_id"], "enabled": bool(r["enabled"])} for r in rows]
+
+    # --- Transcriptions ---
+    def get_transcription(self, file_unique_id: str) -> Optional[Dict[str, Any]]:
+        """Get cached transcription and mark it as the most recently used"""
+        row = self.fetchone(
+            "UPDATE transcriptions SET last_used = (SELECT MAX(last_used) + 1 FROM transcriptions) WHERE file_unique_id = ? RETURNING transcript, duration, language",
+            (file_unique_id,),
+        )
+        return dict(row) if row else None
+
+    def add_transcription(
+        self,
+        file_unique_id: str,
+        *,
+        transcript: str,
+        duration: int,
+        language: str,
+        max_entries: int,
+    ) -> None:
+        """Cache transcription, evicting least recently used beyond max_entries"""
+        with self._get_conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO transcriptions (file_unique_id, transcript, duration, language, last_used) VALUES (?, ?, ?, ?, (SELECT COALESCE(MAX(last_used), 0) + 1 FROM transcriptions))",
+                (file_unique_id, transcript, duration, language),
+            )
+            conn.execute(
+                "DELETE FROM transcriptions WHERE last_used <= (SELECT last_used FROM transcriptions ORDER BY last_used DESC LIMIT 1 OFFSET ?)",
+                (max_entries,),
+            )
+
+    def count_transcriptions(self) -> int:
+        row = self.fetchone("SELECT COUNT(*) AS cnt FROM transcriptions")
+        return row["cnt"] if row else 0
+
     # --- Towel Quarantine ---
     def add_quarantine_user(self, user_id: int, quarantine_time_min: int) -> None:
         if self.find_quarantine_user(user_id) is not None:
@@ -270,15 +541,11 @@ class BotDB:
     # --- Roll Hussars ---
     def get_all_hussars(self) -> List[Dict[str, Any]]:
         rows = self.fetchall(
-            "SELECT * FROM roll_hussars ORDER BY total_time_in_club DESC"
+            "SELECT h.user_id AS _id, h.shot_counter, h.miss_counter, h.dead_counter, h.total_time_in_club, "
+            f"h.first_shot, h.last_shot, {_DISPLAY_NAME} FROM roll_hussars h "
+            "LEFT JOIN users u ON u.user_id = h.user_id ORDER BY h.total_time_in_club DESC"
         )
-        res: List[Dict[str, Any]] = []
-        for r in rows:
-            d = dict(r)
-            d["_id"] = d.pop("user_id")
-            d["meta"] = json.loads(d["meta"])
-            res.append(d)
-        return res
+        return [dict(r) for r in rows]
 
     def find_hussar(self, user_id: int) -> Optional[Dict[str, Any]]:
         row = self.fetchone("SELECT * FROM roll_hussars WHERE user_id = ?", (user_id,))
@@ -295,6 +562,7 @@ class BotDB:
             "INSERT INTO roll_hussars (user_id, meta, shot_counter, miss_counter, dead_counter, total_time_in_club, first_shot, last_shot) VALUES (?, ?, 0, 0, 0, 0, ?, ?)",
             (user_id, json.dumps(user_meta), now, now),
         )
+        self.upsert_user(user_id, user_meta)
 
     def hussar_dead(self, user_id: int, mute_min: int) -> None:
         self.execute(
@@ -335,21 +603,18 @@ class BotDB:
     # --- Peninsula Users ---
     def get_best_peninsulas(self, n: int = 10) -> List[Dict[str, Any]]:
         rows = self.fetchall(
-            "SELECT * FROM peninsula_users ORDER BY user_id ASC LIMIT ?", (n,)
+            f"SELECT p.user_id AS _id, {_DISPLAY_NAME} FROM peninsula_users p "
+            "LEFT JOIN users u ON u.user_id = p.user_id ORDER BY p.user_id ASC LIMIT ?",
+            (n,),
         )
-        res: List[Dict[str, Any]] = []
-        for r in rows:
-            d = dict(r)
-            d["_id"] = d.pop("user_id")
-            d["meta"] = json.loads(d["meta"])
-            res.append(d)
-        return res
+        return [dict(r) for r in rows]
 
     def add_peninsula_user(self, user_id: int, user_meta: Dict[str, Any]) -> None:
         self.execute(
             "INSERT OR REPLACE INTO peninsula_users (user_id, meta) VALUES (?, ?)",
             (user_id, json.dumps(user_meta)),
         )
+        self.upsert_user(user_id, user_meta)
 
     # --- AOC Data ---
     def update_aoc_data(self, data: Dict[str, Any]) -> None:
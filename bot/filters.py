@@ -2,15 +2,23 @@ import re
 from typing import Optional, Union, Any
 
 from telegram import Message
+from telegram.constants import MessageType
 from telegram.ext.filters import MessageFilter
 
 from config import get_debug
 from db.sqlite import db
 
+UWU_REGEX = re.compile(r"\bu[wv]+u\b", re.IGNORECASE)
+
 
 class TrustedFilter(MessageFilter):
     """Messages only from trusted users"""
 
+    def __init__(self) -> None:
+        super().__init__()
+        # the environment isn't read again for every message
+        self.debug = get_debug()
+
     @property
     def name(self) -> str:
         return "Filter.trusted"
@@ -20,7 +28,7 @@ class TrustedFilter(MessageFilter):
         del name
 
     def filter(self, message: Message) -> Optional[Union[bool, dict[str, Any]]]:
-        if get_debug():
+        if self.debug:
             return True
         if message.from_user is None:
             return None
@@ -30,6 +38,9 @@ class TrustedFilter(MessageFilter):
 class UwuFilter(MessageFilter):
     """Regexp check for UwU"""
 
+    # lets the router skip the filter for non-text messages
+    message_types = frozenset([MessageType.TEXT])
+
     @property
     def name(self) -> str:
         return "Filters.uwu"
@@ -40,7 +51,7 @@ class UwuFilter(MessageFilter):
 
     def filter(self, message: Message) -> bool:
         if message.text:
-            return bool(re.search(r"\bu[wv]+u\b", message.text, re.IGNORECASE))
+            return UWU_REGEX.search(message.text) is not None
 
         return False
 
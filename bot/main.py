@@ -15,19 +15,34 @@ from typing import Any, cast
 os.environ["PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION"] = "python"
 
 import sentry_sdk  # noqa: E402
-from telegram.ext import ApplicationBuilder, ContextTypes  # noqa: E402
+from telegram import Update  # noqa: E402
+from telegram.ext import (  # noqa: E402
+    ApplicationBuilder,
+    ContextTypes,
+    PicklePersistence,
+)
 from telegram.request import HTTPXRequest  # noqa: E402
 
 from config import get_config  # noqa: E402
-from skills import skills, commands_list  # noqa: E402
+from permissions import admins_cache_handler  # noqa: E402
+from router import add_router  # noqa: E402
+from skills import active_skills, enable_skills, get_commands  # noqa: E402
 from typing_utils import App  # noqa: E402
+from update_processor import ChatOrderedUpdateProcessor  # noqa: E402
+from webhook import run_webhook  # noqa: E402
 
 logger = logging.getLogger(__name__)
 DEFAULT_GROUP = 0
+# Telegram defaults plus chat_member, which keeps admins cache fresh
+ALLOWED_UPDATES = [
+    t
+    for t in Update.ALL_TYPES
+    if t not in (Update.MESSAGE_REACTION, Update.MESSAGE_REACTION_COUNT)
+]
 
 
 async def _post_init(application: App) -> None:
-    await application.bot.set_my_commands(commands=commands_list)
+    await application.bot.set_my_commands(commands=get_commands(active_skills))
     try:
         bot_user = await application.bot.get_me()
         application.bot_data["bot_user_id"] = bot_user.id
@@ -64,17 +79,33 @@ def main():
         write_timeout=30,
         pool_timeout=5,
     )
+    # chat_data (roll barrels) survives restarts, mode states are kept in SQLite
+    persistence = PicklePersistence(filepath=conf["PERSISTENCE_PATH"])
     builder = cast(Any, ApplicationBuilder())
     application = (
-        builder.token(conf["TOKEN"]).post_init(_post_init).request(request).build()
+        builder.token(conf["TOKEN"])
+        .post_init(_post_init)
+        .request(request)
+        .persistence(persistence)
+        # chats are handled concurrently, updates of a chat in order
+        .concurrent_updates(ChatOrderedUpdateProcessor(conf["UPDATE_WORKERS"]))
+        .build()
     )
     application.add_error_handler(_error_handler)
+    application.add_handler(admins_cache_handler(), DEFAULT_GROUP)
 
-    for handler_group, skill in enumerate(skills, DEFAULT_GROUP + 1):
+    # disabled skills aren't even imported
+    enabled = enable_skills(conf["SKILLS"]["ENABLED"])
+    for handler_group, skill in enumerate(enabled, DEFAULT_GROUP + 1):
         skill["add_handlers"](application, handler_group)
+    # skill groups are kept, but checked only for updates they may handle
+    add_router(application)
 
     # let's go dude
-    application.run_polling(bootstrap_retries=-1)
+    if conf["WEBHOOK"]["URL"]:
+        run_webhook(application, conf["WEBHOOK"], ALLOWED_UPDATES)
+    else:
+        application.run_polling(bootstrap_retries=-1, allowed_updates=ALLOWED_UPDATES)
 
 
 if __name__ == "__main__":
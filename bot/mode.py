@@ -1,14 +1,17 @@
 import logging
 from functools import wraps
-from typing import Callable, List, Optional
+from typing import Any, Callable, Dict, Optional
 
 from telegram import Update, Message
 from telegram.error import BadRequest, NetworkError, TimedOut, TelegramError
 from telegram.ext import (
+    BaseHandler,
     ContextTypes,
 )
 
+from db.sqlite import db
 from handlers import ChatCommandHandler
+from router import get_router
 from typing_utils import App, JobQueueT, BaseHandlerT
 
 logger = logging.getLogger(__name__)
@@ -17,11 +20,91 @@ ON, OFF = True, False
 DEFAULT_GROUP = 0
 
 
+class ChatModes:
+    """Registry of all modes and their on/off state in all chats.
+
+    Every mode owns a bit. A chat keeps a mask of modes switched explicitly
+    and a mask of those switched ON, the rest fall back to mode defaults,
+    so a check is a couple of dict lookups and bit operations.
+    """
+
+    def __init__(self) -> None:
+        self.modes: Dict[str, "Mode"] = {}
+        self.defaults = 0
+        self._switched: Dict[int, int] = {}
+        self._on: Dict[int, int] = {}
+
+    def register(self, mode: "Mode") -> int:
+        if mode.name in self.modes:
+            raise ValueError(f"mode {mode.name} is already registered")
+        bit = 1 << len(self.modes)
+        self.modes[mode.name] = mode
+        if mode.default:
+            self.defaults |= bit
+        return bit
+
+    def is_on(self, chat_id: int, bit: int) -> bool:
+        if self._switched.get(chat_id, 0) & bit:
+            return bool(self._on.get(chat_id, 0) & bit)
+        return bool(self.defaults & bit)
+
+    def set(self, chat_id: int, bit: int, state: bool) -> None:
+        self._switched[chat_id] = self._switched.get(chat_id, 0) | bit
+        on = self._on.get(chat_id, 0)
+        self._on[chat_id] = on | bit if state else on & ~bit
+
+    def status_table(self) -> str:
+        """Modes by rows, defaults and chats with switched modes by columns"""
+        chats = sorted(self._switched)
+        rows = [["mode", "default", *(str(chat_id) for chat_id in chats)]]
+        for name, mode in sorted(self.modes.items()):
+            states = [mode.default, *(self.is_on(c, mode.bit) for c in chats)]
+            rows.append([name, *("ON" if state else "OFF" for state in states)])
+        widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+        return "\n".join(
+            "  ".join(cell.ljust(w) for cell, w in zip(row, widths)).rstrip()
+            for row in rows
+        )
+
+
+chat_modes = ChatModes()
+
+
+class GatedHandler(BaseHandler[Update, ContextTypes.DEFAULT_TYPE, Any]):
+    """Mode handler which stays registered, but skips chats where mode is OFF"""
+
+    def __init__(self, handler: BaseHandlerT, mode: "Mode"):
+        super().__init__(handler.callback, block=handler.block)
+        self.handler = handler
+        self.mode = mode
+
+    def check_update(self, update: object) -> Any:
+        if isinstance(update, Update):
+            chat = update.effective_chat
+            if chat is not None and not self.mode.is_enabled(chat.id):
+                return None
+        return self.handler.check_update(update)
+
+    async def handle_update(
+        self,
+        update: Any,
+        application: App,
+        check_result: Any,
+        context: ContextTypes.DEFAULT_TYPE,
+    ) -> Any:
+        return await self.handler.handle_update(
+            update, application, check_result, context
+        )
+
+
 class Mode:
-    """Todo: add docstring (no)"""
+    """Skill which can be switched on and off per chat by admins.
+
+    Mode handlers are registered once and gated by the chat state, see
+    `GatedHandler`. The state is kept in `chat_modes` and persisted in SQLite.
+    """
 
     _dp: App
-    _mode_handlers: List[BaseHandlerT] = []
 
     def __init__(
         self,
@@ -34,38 +117,42 @@ class Mode:
     ) -> None:
         self.name = mode_name
         self.default = default
-        self.chat_data_key = self._gen_chat_data_key(mode_name)
+        self.bit = chat_modes.register(self)
         self.pin_info_msg = pin_info_msg
         self.off_callback = off_callback
         self.on_callback = on_callback
 
         self.handlers_gr = DEFAULT_GROUP
+        # registered handler -> its gated wrapper
+        self._mode_handlers: Dict[BaseHandlerT, GatedHandler] = {}
 
-    @staticmethod
-    def _gen_chat_data_key(mode_name: str) -> str:
-        return f"is_{mode_name}_on".lower()
+    def is_enabled(self, chat_id: int) -> bool:
+        return chat_modes.is_on(chat_id, self.bit)
 
-    def _get_mode_state(self, context: ContextTypes.DEFAULT_TYPE) -> bool:
-        chat_data = context.chat_data
-        if chat_data is None:
+    def _get_mode_state(self, update: Update) -> bool:
+        chat = update.effective_chat
+        if chat is None:
             return self.default
-        if self.chat_data_key not in chat_data:
-            chat_data[self.chat_data_key] = self.default
+        return self.is_enabled(chat.id)
 
-        return chat_data[self.chat_data_key]
-
-    def _set_mode(self, state: bool, context: ContextTypes.DEFAULT_TYPE) -> None:
-        chat_data = context.chat_data
-        if chat_data is None:
-            return
-        chat_data[self.chat_data_key] = state
-        logger.info("new state: %s", state)
-        if state is ON:
-            self._add_mode_handlers()
-        elif state is OFF:
-            self._remove_mode_handlers()
-        else:
+    def _set_mode(self, state: bool, update: Update) -> None:
+        if state not in (ON, OFF):
             raise ValueError(f"wrong mode state. expect [True, False], got: {state}")
+        chat = update.effective_chat
+        if chat is None:
+            return
+        self.set_enabled(chat.id, state)
+
+    def set_enabled(self, chat_id: int, state: bool) -> None:
+        chat_modes.set(chat_id, self.bit, state)
+        db.set_chat_mode(chat_id, self.name, state)
+        logger.info("new %s state in %s: %s", self.name, chat_id, state)
+
+    def _load_states(self) -> None:
+        rows = db.get_chat_modes(self.name)
+        for row in rows:
+            chat_modes.set(row["chat_id"], self.bit, row["enabled"])
+        logger.info("loaded %s state of %d chats", self.name, len(rows))
 
     def _add_on_off_handlers(self) -> None:
         self._dp.add_handler(
@@ -73,6 +160,7 @@ class Mode:
                 f"{self.name}_on",
                 self._mode_on,
                 require_admin=True,
+                block=True,
             ),
             self.handlers_gr,
         )
@@ -81,29 +169,33 @@ class Mode:
                 f"{self.name}_off",
                 self._mode_off,
                 require_admin=True,
+                block=True,
             ),
             self.handlers_gr,
         )
         self._dp.add_handler(
-            ChatCommandHandler(f"{self.name}", self._mode_status),
+            ChatCommandHandler(f"{self.name}", self._mode_status, block=True),
             self.handlers_gr,
         )
 
-    def _remove_mode_handlers(self) -> None:
-        for h in self._mode_handlers:
-            self._dp.remove_handler(h, self.handlers_gr)
+    def add_handler(self, handler: BaseHandlerT) -> None:
+        gated = GatedHandler(handler, self)
+        self._mode_handlers[handler] = gated
+        # once routed, groups live in the router
+        (get_router(self._dp) or self._dp).add_handler(gated, self.handlers_gr)
 
-    def _add_mode_handlers(self) -> None:
-        for h in self._mode_handlers:
-            self._dp.add_handler(h, self.handlers_gr)
+    def remove_handler(self, handler: BaseHandlerT) -> None:
+        gated = self._mode_handlers.pop(handler, None)
+        if gated is not None:
+            (get_router(self._dp) or self._dp).remove_handler(gated, self.handlers_gr)
 
     async def _mode_on(
         self, update: Update, context: ContextTypes.DEFAULT_TYPE
     ) -> None:
         logger.info("%s switch to ON", self.name)
-        mode = self._get_mode_state(context)
+        mode = self._get_mode_state(update)
         if mode is OFF:
-            self._set_mode(ON, context)
+            self._set_mode(ON, update)
 
             if self.on_callback is not None:
                 try:
@@ -125,9 +217,9 @@ class Mode:
         self, update: Update, context: ContextTypes.DEFAULT_TYPE
     ) -> None:
         logger.info("%s switch to OFF", self.name)
-        mode = self._get_mode_state(context)
+        mode = self._get_mode_state(update)
         if mode is ON:
-            self._set_mode(OFF, context)
+            self._set_mode(OFF, update)
 
             if self.off_callback is not None:
                 try:
@@ -146,7 +238,7 @@ class Mode:
     async def _mode_status(
         self, update: Update, context: ContextTypes.DEFAULT_TYPE
     ) -> None:
-        status = "ON" if self._get_mode_state(context) is ON else "OFF"
+        status = "ON" if self._get_mode_state(update) is ON else "OFF"
         msg = f"{self.name} status is {status}"
         logger.info(msg)
         chat = update.effective_chat
@@ -161,24 +253,19 @@ class Mode:
             self.handlers_gr = handlers_group
 
             logger.info("adding users handlers...")
+            registered = set(app.handlers.get(self.handlers_gr, []))
             func(app, self.handlers_gr)
 
-            # if mode doesn't define any handlers
-            if self.handlers_gr in app.handlers:
-                self._mode_handlers = app.handlers[self.handlers_gr].copy()
+            # gate only the handlers func has just added
+            for h in app.handlers.get(self.handlers_gr, []).copy():
+                if h not in registered:
+                    app.remove_handler(h, self.handlers_gr)
+                    self.add_handler(h)
             logger.info(
                 "registered %d %s handlers", len(self._mode_handlers), self.name
             )
-
             self._add_on_off_handlers()
-            # todo:
-            #  https://github.com/vldc-hq/vldc-bot/issues/104
-            #  for some reason, if you don't put handlers remover here
-            #  mods with default=True do not get _on | _off command handlers
-            self._remove_mode_handlers()
-
-            if self.default is True:
-                self._add_mode_handlers()
+            self._load_states()
 
         return wrapper
 
@@ -228,4 +315,4 @@ def _remove_message_after(
     job_queue.run_once(_delete_message_job, seconds, data=message)
 
 
-__all__ = ["Mode", "cleanup_queue_update", "ON", "OFF"]
+__all__ = ["Mode", "chat_modes", "cleanup_queue_update", "ON", "OFF"]
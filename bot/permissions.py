@@ -1,15 +1,75 @@
+import asyncio
 import logging
-from typing import Set
+import time
+from functools import partial
+from typing import Any, Dict, FrozenSet, Optional, Set, Tuple
 
-from telegram import Update
+from telegram import Bot, Update
 from telegram.constants import ChatMemberStatus, ChatType
 from telegram.error import TelegramError
-from telegram.ext import ContextTypes
+from telegram.ext import ChatMemberHandler, ContextTypes
 
 logger = logging.getLogger(__name__)
 
 
 ADMIN_STATUSES: Set[str] = {ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER}
+# admins rarely change, and ChatMemberUpdated drops the cache when they do
+ADMINS_TTL = 10 * 60
+
+
+class AdminsCache:
+    """Admin ids per chat, fetched in bulk with getChatAdministrators.
+
+    Entries live for `ttl` seconds. Concurrent checks in a chat share one
+    request, failed requests are not cached.
+    """
+
+    def __init__(self, ttl: float = ADMINS_TTL):
+        self.ttl = ttl
+        self._admins: Dict[int, Tuple[float, FrozenSet[int]]] = {}
+        self._pending: Dict[int, asyncio.Task[Optional[FrozenSet[int]]]] = {}
+
+    async def get(self, bot: Bot, chat_id: int) -> Optional[FrozenSet[int]]:
+        """Admin ids of the chat, None if they can't be fetched"""
+        cached = self._admins.get(chat_id)
+        if cached is not None and time.monotonic() < cached[0]:
+            return cached[1]
+        pending = self._pending.get(chat_id)
+        if pending is None:
+            pending = asyncio.create_task(self._fetch(bot, chat_id))
+            pending.add_done_callback(partial(self._fetched, chat_id))
+            self._pending[chat_id] = pending
+        return await asyncio.shield(pending)
+
+    @staticmethod
+    async def _fetch(bot: Bot, chat_id: int) -> Optional[FrozenSet[int]]:
+        try:
+            members = await bot.get_chat_administrators(chat_id)
+        except TelegramError as err:
+            logger.warning("admins fetch failed: %s", err)
+            return None
+        return frozenset(m.user.id for m in members if m.status in ADMIN_STATUSES)
+
+    def _fetched(
+        self, chat_id: int, task: asyncio.Task[Optional[FrozenSet[int]]]
+    ) -> None:
+        # a fetch which raced with invalidation is not cached
+        if self._pending.get(chat_id) is not task:
+            return
+        del self._pending[chat_id]
+        if task.cancelled() or task.exception() is not None:
+            return
+        chat_admins = task.result()
+        if chat_admins is not None:
+            self._admins[chat_id] = (time.monotonic() + self.ttl, chat_admins)
+            logger.debug("cached %d admins of %s", len(chat_admins), chat_id)
+
+    def invalidate(self, chat_id: int) -> None:
+        self._admins.pop(chat_id, None)
+        self._pending.pop(chat_id, None)
+
+
+admins = AdminsCache()
 
 
 async def is_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
@@ -21,10 +81,21 @@ async def is_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     if chat.type == ChatType.PRIVATE:
         return True
 
-    try:
-        member = await context.bot.get_chat_member(chat.id, user.id)
-    except TelegramError as err:  # pragma: no cover - defensive
-        logger.warning("admin check failed: %s", err)
-        return False
+    chat_admins = await admins.get(context.bot, chat.id)
+    return chat_admins is not None and user.id in chat_admins
+
+
+async def _on_chat_member(update: Update, _context: ContextTypes.DEFAULT_TYPE) -> None:
+    if update.effective_chat is not None:
+        admins.invalidate(update.effective_chat.id)
+
+
+def admins_cache_handler() -> ChatMemberHandler[Any, Any]:
+    """Drops cached admins of a chat when someone's membership there changes.
 
-    return member.status in ADMIN_STATUSES
+    Telegram sends `chat_member` updates only when they are asked for in
+    allowed updates, and only to bots which are admins in the chat.
+    """
+    return ChatMemberHandler(
+        _on_chat_member, ChatMemberHandler.ANY_CHAT_MEMBER, block=False
+    )
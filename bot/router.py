@@ -0,0 +1,352 @@
+import copy
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union, cast
+
+from telegram import Message, MessageEntity, Update
+from telegram.constants import MessageType
+from telegram.ext import (
+    ApplicationHandlerStop,
+    BaseHandler,
+    CallbackQueryHandler,
+    ChatMemberHandler,
+    CommandHandler,
+    ContextTypes,
+    MessageHandler,
+    filters,
+)
+from telegram.ext.filters import BaseFilter
+from telegram.helpers import effective_message_type
+
+from typing_utils import App, BaseHandlerT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GROUP = 0
+
+# all message-like updates share one route, handlers tell them apart
+MESSAGE = "message"
+OTHER = "other"
+
+# filters whose result depends on the message type only
+TYPE_FILTERS: List[Tuple[BaseFilter, str]] = [
+    (filters.TEXT, MessageType.TEXT),
+    (filters.Dice.ALL, MessageType.DICE),
+    (filters.VOICE, MessageType.VOICE),
+    (filters.VIDEO_NOTE, MessageType.VIDEO_NOTE),
+    (filters.PHOTO, MessageType.PHOTO),
+    (filters.ANIMATION, MessageType.ANIMATION),
+    (filters.Sticker.ALL, MessageType.STICKER),
+    (filters.StatusUpdate.NEW_CHAT_MEMBERS, MessageType.NEW_CHAT_MEMBERS),
+]
+# filters which pass text messages only
+TEXT_FILTERS = (filters.Text, filters.Regex)
+# message types which are never status updates (new members, pins, etc.)
+CONTENT_TYPES = frozenset(
+    filter_type
+    for _, filter_type in TYPE_FILTERS
+    if filter_type != MessageType.NEW_CHAT_MEMBERS
+)
+
+# (update type, message type or "/command")
+Route = Tuple[str, str]
+# handlers which may handle a route, by group
+Table = List[Tuple[int, BaseHandlerT]]
+
+
+def specialize_filter(f: BaseFilter, message_type: str) -> Union[bool, BaseFilter]:
+    """Filter for messages of the type, resolved if known from the type alone.
+
+    True and False mean the filter passes or skips all such messages.
+    Custom filters declare the types they pass with a `message_types` attribute.
+    Parts of filters combined with `&`, `|` and `~` are specialized one by
+    one, so `filters.TEXT & group_filter` skips stickers without checking
+    the group. Other combinations (`^`) are kept as is.
+    """
+    if message_type.startswith("/"):
+        message_type = MessageType.TEXT
+    if f is filters.ALL:
+        return True
+    if f is filters.StatusUpdate.ALL:
+        if message_type == MessageType.NEW_CHAT_MEMBERS:
+            return True
+        if message_type in CONTENT_TYPES:
+            return False
+    for type_filter, filter_type in TYPE_FILTERS:
+        if f is type_filter:
+            return message_type == filter_type
+    combined = _specialize_combined(f, message_type)
+    if combined is not None:
+        return combined
+    declared: Optional[Iterable[str]] = getattr(f, "message_types", None)
+    if isinstance(f, TEXT_FILTERS):
+        declared = [MessageType.TEXT]
+    return False if declared is not None and message_type not in declared else f
+
+
+def _specialize_combined(
+    f: BaseFilter, message_type: str
+) -> Union[bool, BaseFilter, None]:
+    """Specialized `a & b`, `a | b` or `~a`, None for other filters.
+
+    PTB's combined filter classes are private, they are recognized by the
+    attributes keeping the parts.
+    """
+    inverted: object = getattr(f, "inv_filter", None)
+    if isinstance(inverted, BaseFilter):
+        part = specialize_filter(inverted, message_type)
+        if isinstance(part, bool):
+            return not part
+        return f if part is inverted else ~part
+
+    base: object = getattr(f, "base_filter", None)
+    and_filter: object = getattr(f, "and_filter", None)
+    or_filter: object = getattr(f, "or_filter", None)
+    if not isinstance(base, BaseFilter):
+        return None
+    if isinstance(and_filter, BaseFilter):
+        return _specialize_and(f, base, and_filter, message_type)
+    if isinstance(or_filter, BaseFilter):
+        return _specialize_or(f, base, or_filter, message_type)
+    return None
+
+
+def _specialize_and(
+    f: BaseFilter, base: BaseFilter, other: BaseFilter, message_type: str
+) -> Union[bool, BaseFilter]:
+    left = specialize_filter(base, message_type)
+    if left is False:
+        return False
+    right = specialize_filter(other, message_type)
+    if left is True or right is False:
+        return right
+    if right is True:
+        return left
+    return f if left is base and right is other else left & right
+
+
+def _specialize_or(
+    f: BaseFilter, base: BaseFilter, other: BaseFilter, message_type: str
+) -> Union[bool, BaseFilter]:
+    left = specialize_filter(base, message_type)
+    if left is True:
+        return True
+    right = specialize_filter(other, message_type)
+    if left is False or right is True:
+        return right
+    if right is False:
+        return left
+    return f if left is base and right is other else left | right
+
+
+def _unwrap(handler: BaseHandlerT) -> BaseHandlerT:
+    """Inner handler of wrappers like `mode.GatedHandler`"""
+    while isinstance(getattr(handler, "handler", None), BaseHandler):
+        handler = getattr(handler, "handler")
+    return handler
+
+
+def for_route(handler: BaseHandlerT, route: Route) -> Optional[BaseHandlerT]:
+    """Handler checking updates of the route, None if it surely skips them.
+
+    Message handlers get a copy with the filter specialized for the route.
+    Wrappers like `mode.GatedHandler` are copied around the inner handler.
+    """
+    inner: object = getattr(handler, "handler", None)
+    if not isinstance(inner, BaseHandler):
+        return _for_route(handler, route)
+    routed = for_route(cast(BaseHandlerT, inner), route)
+    if routed is None or routed is inner:
+        return None if routed is None else handler
+    wrapper = copy.copy(handler)
+    setattr(wrapper, "handler", routed)
+    return wrapper
+
+
+def _for_route(handler: BaseHandlerT, route: Route) -> Optional[BaseHandlerT]:
+    update_type, message_type = route
+    if isinstance(handler, CommandHandler):
+        command = message_type[1:] if message_type.startswith("/") else None
+        ok = update_type == MESSAGE and command in handler.commands
+    elif isinstance(handler, MessageHandler):
+        if update_type != MESSAGE:
+            return None
+        return _for_message_type(handler, message_type)
+    elif isinstance(handler, CallbackQueryHandler):
+        ok = update_type == Update.CALLBACK_QUERY
+    elif isinstance(handler, ChatMemberHandler):
+        ok = update_type in (Update.CHAT_MEMBER, Update.MY_CHAT_MEMBER)
+    else:
+        ok = True
+    return handler if ok else None
+
+
+def _for_message_type(
+    handler: MessageHandler[Any, Any], message_type: str
+) -> Optional[BaseHandlerT]:
+    f = specialize_filter(handler.filters, message_type)
+    if f is False:
+        return None
+    if f is handler.filters:
+        return handler
+    routed = copy.copy(handler)
+    routed.filters = filters.ALL if f is True else f
+    return routed
+
+
+async def _not_called(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Router runs callbacks of its handlers, see `Router.handle_update`"""
+
+
+class Router(BaseHandler[Update, ContextTypes.DEFAULT_TYPE, Any]):
+    """Dispatches updates to handler groups by a precomputed table.
+
+    PTB checks every handler of every group for every update. Router keeps
+    the same groups, but for a route (update type and message type or bot
+    command) checks only the handlers which may handle it, with filter parts
+    known for the route resolved, see `for_route`. Tables are built on the
+    first update of a route. One handler per group is run, in group order,
+    like `Application.process_update` does.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(_not_called, block=True)
+        self.handlers: Dict[int, List[BaseHandlerT]] = {}
+        self._commands: Set[str] = set()
+        self._tables: Dict[Route, Table] = {}
+
+    def add_handler(self, handler: BaseHandlerT, group: int = DEFAULT_GROUP) -> None:
+        self.handlers.setdefault(group, []).append(handler)
+        self._reset()
+
+    def remove_handler(self, handler: BaseHandlerT, group: int = DEFAULT_GROUP) -> None:
+        if handler in self.handlers.get(group, []):
+            self.handlers[group].remove(handler)
+            if not self.handlers[group]:
+                del self.handlers[group]
+            self._reset()
+
+    def _reset(self) -> None:
+        self._tables.clear()
+        self._commands.clear()
+        for handlers in self.handlers.values():
+            for h in handlers:
+                h = _unwrap(h)
+                if isinstance(h, CommandHandler):
+                    self._commands.update(h.commands)
+
+    def table(self, route: Route) -> Table:
+        """Handlers which may handle updates of the route, by group"""
+        table: Optional[Table] = self._tables.get(route)
+        if table is None:
+            table = []
+            for group, handlers in sorted(self.handlers.items()):
+                for handler in handlers:
+                    routed = for_route(handler, route)
+                    if routed is not None:
+                        table.append((group, routed))
+            self._tables[route] = table
+            logger.debug("route %s: %d handlers", route, len(table))
+        return table
+
+    def _route(self, update: object) -> Route:
+        if not isinstance(update, Update):
+            return OTHER, ""
+        message = (
+            update.message
+            or update.edited_message
+            or update.channel_post
+            or update.edited_channel_post
+            or update.business_message
+            or update.edited_business_message
+        )
+        if message is not None:
+            return MESSAGE, self._message_type(message)
+        for update_type in Update.ALL_TYPES:
+            if getattr(update, update_type) is not None:
+                return update_type, ""
+        return OTHER, ""
+
+    def _message_type(self, message: Message) -> str:
+        text = message.text
+        if text is None:
+            return effective_message_type(message) or ""
+        entities = message.entities
+        if (
+            entities
+            and entities[0].type == MessageEntity.BOT_COMMAND
+            and entities[0].offset == 0
+        ):
+            command = text[1 : entities[0].length].split("@")[0].lower()
+            if command in self._commands:
+                return "/" + command
+        return MessageType.TEXT
+
+    @staticmethod
+    def _next(
+        table: Table, start: int, group: Optional[int], update: object
+    ) -> Optional[Tuple[Table, int, Any]]:
+        """First matching handler from `start`, skipping the `group` handled"""
+        for i in range(start, len(table)):
+            handler_group, handler = table[i]
+            if handler_group == group:
+                continue
+            check = handler.check_update(update)
+            if check is not None and check is not False:
+                return table, i, check
+        return None
+
+    def check_update(self, update: object) -> Optional[Tuple[Table, int, Any]]:
+        # later groups are checked after earlier ones are handled, as in PTB
+        return self._next(self.table(self._route(update)), 0, None, update)
+
+    async def handle_update(
+        self,
+        update: Any,
+        application: App,
+        check_result: Any,
+        context: ContextTypes.DEFAULT_TYPE,
+    ) -> None:
+        match: Optional[Tuple[Table, int, Any]] = check_result
+        while match is not None:
+            table, i, check = match
+            group, handler = table[i]
+            coroutine = handler.handle_update(update, application, check, context)
+            if not handler.block:
+                application.create_task(
+                    coroutine,
+                    update=update,
+                    name=f"Router:process_update_non_blocking:{handler}",
+                )
+            else:
+                try:
+                    await coroutine
+                except ApplicationHandlerStop:
+                    raise
+                except Exception as exc:  # pylint: disable=broad-except
+                    if await application.process_error(update=update, error=exc):
+                        logger.debug("error handler stopped further handlers")
+                        return
+            match = self._next(table, i + 1, group, update)
+
+
+def get_router(app: App) -> Optional[Router]:
+    for handler in app.handlers.get(DEFAULT_GROUP, []):
+        if isinstance(handler, Router):
+            return handler
+    return None
+
+
+def add_router(app: App) -> Router:
+    """Move all registered handler groups into a single router"""
+    router = Router()
+    for group, handlers in list(app.handlers.items()):
+        for handler in list(handlers):
+            app.remove_handler(handler, group)
+            router.add_handler(handler, group)
+    app.add_handler(router, DEFAULT_GROUP)
+    logger.info(
+        "routing %d handlers of %d groups",
+        sum(len(h) for h in router.handlers.values()),
+        len(router.handlers),
+    )
+    return router
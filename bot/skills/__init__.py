@@ -1,41 +1,20 @@
+import importlib
 import logging
-from typing import List, Callable, Tuple, TypedDict
+from typing import List, Callable, Optional, Tuple, TypedDict
 
 from telegram import Update
 from telegram.ext import ContextTypes
 from handlers import ChatCommandHandler
 from mode import cleanup_queue_update
 from typing_utils import App, get_job_queue
-from skills.aoc_mode import add_aoc_mode
-from skills.at_least_70k import add_70k
-from skills.ban import add_ban
-from skills.banme import add_banme
-from skills.coc import add_coc
-from skills.core import add_core
-from skills.fools import add_fools_mode
-from skills.kozula import add_kozula
-from skills.length import add_length
-from skills.mute import add_mute
-from skills.nastya_mode import add_nastya_mode
-from skills.nya import add_nya
-from skills.pr import add_pr
-from skills.prism import add_prism
-from skills.roll import add_roll
-from skills.since_mode import add_since_mode
-from skills.smile_mode import add_smile_mode
-from skills.still import add_still
-from skills.towel_mode import add_towel_mode
-from skills.tree import add_tree
-from skills.trusted_mode import add_trusted_mode
-from skills.uwu import add_uwu
-from skills.buktopuha import add_buktopuha
-from skills.chat import add_chat_mode
 
 logger = logging.getLogger(__name__)
 VERSION = "0.13.0"
 
 
 class Skill(TypedDict):
+    # name of the skill in config
+    key: str
     name: str
     add_handlers: Callable[[App, int], None]
     hint: str
@@ -64,7 +43,8 @@ async def _version(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     result = await context.bot.send_message(
         chat_id,
-        f"~=~~=~=~=_ver.:{VERSION}_~=~=~=[,,_,,]:3\n\n" f"{_get_skills_hints(skills)}",
+        f"~=~~=~=~=_ver.:{VERSION}_~=~=~=[,,_,,]:3\n\n"
+        f"{get_skills_hints(active_skills)}",
     )
 
     job_queue = get_job_queue(context)
@@ -76,68 +56,124 @@ async def _version(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+def _lazy(target: str) -> Callable[[App, int], None]:
+    """`module.function` registering skill handlers, imported when called.
+
+    So skill modules, and SDKs they import, are loaded only for skills
+    which are registered.
+    """
+    module, add_handlers = target.rsplit(".", 1)
+
+    def add(app: App, handlers_group: int) -> None:
+        skill_module = importlib.import_module(f"skills.{module}")
+        getattr(skill_module, add_handlers)(app, handlers_group)
+
+    return add
+
+
 def _make_skill(
-    add_handlers: Callable[[App, int], None], name: str, hint: str
+    add_handlers: Callable[[App, int], None] | str,
+    name: str,
+    hint: str,
+    key: str = "",
 ) -> Skill:
-    return {"name": name, "add_handlers": add_handlers, "hint": hint}
+    """Skill from handlers registration, `module.function` ones are named by
+    the module"""
+    if isinstance(add_handlers, str):
+        key = key or add_handlers.rsplit(".", 1)[0]
+        add_handlers = _lazy(add_handlers)
+    return {"key": key, "name": name, "add_handlers": add_handlers, "hint": hint}
 
 
 skills: List[Skill] = [
     # commands
-    _make_skill(add_core, "😼 core", " core"),
-    _make_skill(_add_version, "😼 version", " show this message"),
-    _make_skill(add_still, "😻 still", "do u remember it?"),
-    _make_skill(add_uwu, "😾 uwu", " don't uwu!"),
-    _make_skill(add_mute, "🤭 mute", " mute user for N minutes"),
-    _make_skill(add_roll, "🔫 roll", " life is so cruel... isn't it?"),
-    _make_skill(add_banme, "⚔️ banme", " commit sudoku"),
-    _make_skill(add_tree, "🎄 tree", " advent of code time!"),
-    _make_skill(add_coc, "⛔🤬 coc", " VLDC/GDG VL Code of Conduct"),
-    _make_skill(add_70k, "🛠 more than 70k?", " try to hire!"),
-    _make_skill(add_pr, "💻 got sk1lzz?", " put them to use!"),
-    _make_skill(add_prism, "👁 smell like PRISM?", " nononono!"),
-    _make_skill(add_ban, "🔨 ban!", " ban! ban! ban!"),
-    _make_skill(add_nya, "😺 meow", " Simon says wat?"),
-    _make_skill(add_kozula, "💰 kozula", " Don't argue with kozula rate!"),
-    _make_skill(add_length, "🍆 length", " length of your instrument"),
-    _make_skill(add_buktopuha, "🤫 start BukToPuHa", " let's play a game"),
+    _make_skill("core.add_core", "😼 core", " core"),
+    _make_skill(_add_version, "😼 version", " show this message", key="version"),
+    _make_skill("still.add_still", "😻 still", "do u remember it?"),
+    _make_skill("uwu.add_uwu", "😾 uwu", " don't uwu!"),
+    _make_skill("mute.add_mute", "🤭 mute", " mute user for N minutes"),
+    _make_skill("roll.add_roll", "🔫 roll", " life is so cruel... isn't it?"),
+    _make_skill("banme.add_banme", "⚔️ banme", " commit sudoku"),
+    _make_skill("tree.add_tree", "🎄 tree", " advent of code time!"),
+    _make_skill("coc.add_coc", "⛔🤬 coc", " VLDC/GDG VL Code of Conduct"),
+    _make_skill("at_least_70k.add_70k", "🛠 more than 70k?", " try to hire!"),
+    _make_skill("pr.add_pr", "💻 got sk1lzz?", " put them to use!"),
+    _make_skill("prism.add_prism", "👁 smell like PRISM?", " nononono!"),
+    _make_skill("ban.add_ban", "🔨 ban!", " ban! ban! ban!"),
+    _make_skill("nya.add_nya", "😺 meow", " Simon says wat?"),
+    _make_skill("kozula.add_kozula", "💰 kozula", " Don't argue with kozula rate!"),
+    _make_skill("length.add_length", "🍆 length", " length of your instrument"),
+    _make_skill("buktopuha.add_buktopuha", "🤫 start BukToPuHa", " let's play a game"),
     # modes
-    _make_skill(add_trusted_mode, "👁‍🗨 in god we trust", " are you worthy hah?"),
-    _make_skill(add_aoc_mode, "🎄 AOC notifier", " kekV"),
-    _make_skill(add_smile_mode, "😼 smile mode", " allow only stickers in the chat"),
-    _make_skill(add_since_mode, "🛠 since mode", " under construction"),
-    _make_skill(add_towel_mode, "🧼 towel mode", " anti bot"),
-    _make_skill(add_fools_mode, "🙃 fools mode", " what? not again!"),
-    _make_skill(add_nastya_mode, "🤫 nastya mode", " stop. just stop"),
-    _make_skill(add_chat_mode, "😼 chat", " chat"),
+    _make_skill(
+        "trusted_mode.add_trusted_mode", "👁‍🗨 in god we trust", " are you worthy hah?"
+    ),
+    _make_skill("aoc_mode.add_aoc_mode", "🎄 AOC notifier", " kekV"),
+    _make_skill(
+        "smile_mode.add_smile_mode", "😼 smile mode", " allow only stickers in the chat"
+    ),
+    _make_skill("since_mode.add_since_mode", "🛠 since mode", " under construction"),
+    _make_skill("towel_mode.add_towel_mode", "🧼 towel mode", " anti bot"),
+    _make_skill("fools.add_fools_mode", "🙃 fools mode", " what? not again!"),
+    _make_skill("nastya_mode.add_nastya_mode", "🤫 nastya mode", " stop. just stop"),
+    _make_skill("chat.add_chat_mode", "😼 chat", " chat"),
 ]
 
-commands_list: List[Tuple[str, str]] = [
-    ("nya", "😼 Simon says wat?"),
-    ("mute", "😼 mute user for N minutes"),
-    ("unmute", "😼 unmute user"),
-    ("hussars", "😼 show hussars leaderboard"),
-    ("wipe_hussars", "😼 wipe all hussars history"),
-    ("trust", "😼 in god we trust"),
-    ("untrust", "😼 how dare you?!"),
-    ("pr", "got sk1lzz?"),
-    ("70k", "try to hire!"),
-    ("coc", "VLDC/GDG VL Code of Conduct"),
-    ("ban", "ban! ban! ban!"),
-    ("roll", "life is so cruel... isn't it?"),
-    ("tree", "advent of code time!"),
-    ("kozula", "💰 kozula: Don't argue with kozula rate!"),
-    ("still", "do u remember it?"),
-    ("banme", "commit sudoku"),
-    ("prism", "top N PRISM words with optional predicate"),
-    ("version", "show this message"),
-    ("gdpr_me", "wipe all my hussar history"),
-    ("length", "length of your instrument"),
-    ("longest", "size doesn't matter, or is it?"),
-    ("buktopuha", "let's play a game 🤡"),
-    ("znatoki", "top BuKToPuHa players"),
+# bot commands menu: command, description and the skill handling it
+commands_list: List[Tuple[str, str, str]] = [
+    ("nya", "😼 Simon says wat?", "nya"),
+    ("mute", "😼 mute user for N minutes", "mute"),
+    ("unmute", "😼 unmute user", "mute"),
+    ("hussars", "😼 show hussars leaderboard", "roll"),
+    ("wipe_hussars", "😼 wipe all hussars history", "roll"),
+    ("trust", "😼 in god we trust", "trusted_mode"),
+    ("untrust", "😼 how dare you?!", "trusted_mode"),
+    ("pr", "got sk1lzz?", "pr"),
+    ("70k", "try to hire!", "at_least_70k"),
+    ("coc", "VLDC/GDG VL Code of Conduct", "coc"),
+    ("ban", "ban! ban! ban!", "ban"),
+    ("roll", "life is so cruel... isn't it?", "roll"),
+    ("tree", "advent of code time!", "tree"),
+    ("kozula", "💰 kozula: Don't argue with kozula rate!", "kozula"),
+    ("still", "do u remember it?", "still"),
+    ("banme", "commit sudoku", "banme"),
+    ("prism", "top N PRISM words with optional predicate", "prism"),
+    ("version", "show this message", "version"),
+    ("modes", "which modes are ON in which chats", "core"),
+    ("gdpr_me", "wipe all my hussar history", "roll"),
+    ("length", "length of your instrument", "length"),
+    ("longest", "size doesn't matter, or is it?", "length"),
+    ("buktopuha", "let's play a game 🤡", "buktopuha"),
+    ("znatoki", "top BuKToPuHa players", "buktopuha"),
 ]
 
 
-def _get_skills_hints(skills_list: List[Skill]) -> str:
+def select_skills(enabled: Optional[List[str]]) -> List[Skill]:
+    """Skills named in `enabled`, in registration order, all if it's None"""
+    if enabled is None:
+        return list(skills)
+    unknown = set(enabled) - {s["key"] for s in skills}
+    if unknown:
+        logger.warning("unknown skills enabled: %s", ", ".join(sorted(unknown)))
+    return [s for s in skills if s["key"] in enabled]
+
+
+# skills registered in the bot, see `enable_skills`
+active_skills: List[Skill] = list(skills)
+
+
+def enable_skills(enabled: Optional[List[str]]) -> List[Skill]:
+    """Make only enabled skills active, they are to be registered by caller"""
+    active_skills[:] = select_skills(enabled)
+    logger.info("enabled skills: %s", ", ".join(s["key"] for s in active_skills))
+    return active_skills
+
+
+def get_commands(skills_list: List[Skill]) -> List[Tuple[str, str]]:
+    """Bot commands menu of the skills"""
+    keys = {s["key"] for s in skills_list}
+    return [(command, desc) for command, desc, key in commands_list if key in keys]
+
+
+def get_skills_hints(skills_list: List[Skill]) -> str:
     return "\n".join(f"{s['name']} – {s['hint']}" for s in skills_list)
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import os
 import random
@@ -6,13 +7,10 @@ from datetime import datetime, timedelta
 from random import randint
 from tempfile import gettempdir
 from threading import Lock
-from typing import Any, Optional, Mapping, IO
+from typing import Optional, IO
 from uuid import uuid4
 
-import openai
-from google import genai
-
-from config import get_group_chat_id
+from config import get_group_chat_id, get_words_path
 from tg_filters import group_chat_filter
 from db.sqlite import db
 from mode import cleanup_queue_update
@@ -23,27 +21,37 @@ from telegram.ext import (
     MessageHandler,
     ContextTypes,
     CommandHandler,
-    filters,
 )
 from permissions import is_admin
+from triggers import text_triggers
 from typing_utils import App, get_job_queue
+from utils.sdk import get_genai, get_openai
+from utils.word_bank import WordBank
 
 logger = logging.getLogger(__name__)
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
-genai_client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-
 
 MEME_REGEX = re.compile(r"\/[вb][иu][kк][tт][оo][pр][иu][hн][aа]", re.IGNORECASE)
+MEME_TRIGGER = "buktopuha"
+# the word of a running game, registered per chat
+ANSWER_TRIGGER = "buktopuha_answer"
 GAME_TIME_SEC = 30
+# Pre-generated questions pool
+POOL_SIZE = 20
+POOL_LOW_WATER = 5
+POOL_REFILL_INTERVAL = 10 * 60
+MAX_QUESTION_LEN = 300
 
 
 class Buktopuha:
-    def __init__(self):
+    def __init__(self, chat_id: Optional[int] = None):
         self.the_lock = Lock()
+        self.chat_id = chat_id
         self.word = ""
-        self.started_at = None
-        self.last_game_at = None
+        # compiled once per game, None when no game is running
+        self.matcher: Optional[re.Pattern[str]] = None
+        self.started_at: Optional[datetime] = None
+        self.last_game_at: Optional[datetime] = None
 
     def get_word(self) -> str:
         with self.the_lock:
@@ -63,13 +71,22 @@ class Buktopuha:
     def start(self, word: str):
         with self.the_lock:
             self.word = word
+            # word boundary only at the start: "wombats" still guesses "wombat"
+            self.matcher = (
+                re.compile(rf"\b{re.escape(word)}", re.IGNORECASE) if word else None
+            )
             self.started_at = datetime.now()
             self.last_game_at = self.started_at
+            if self.chat_id is not None and self.matcher is not None:
+                text_triggers.add(ANSWER_TRIGGER, self.matcher, self.chat_id)
 
     def stop(self):
         with self.the_lock:
             self.word = ""
+            self.matcher = None
             self.started_at = None
+            if self.chat_id is not None:
+                text_triggers.remove(ANSWER_TRIGGER, self.chat_id)
 
     def hint1(self, chat_id: int, orig_word: str):
         async def _f(context: ContextTypes.DEFAULT_TYPE):
@@ -80,7 +97,7 @@ class Buktopuha:
             if word != orig_word:
                 return
             char = word[randint(0, len(word) - 1)]
-            masked = re.sub(f"[^{char}]", "*", word)
+            masked = "".join(c if c == char else "*" for c in word)
             result = await context.bot.send_message(
                 chat_id,
                 f"First hint: {masked}",
@@ -135,49 +152,53 @@ class Buktopuha:
         return _f
 
     def check_for_answer(self, text: str) -> bool:
-        word = self.get_word()
-        return word != "" and text.lower().find(word) >= 0
+        # single attribute read, no lock and no allocations if game is not running
+        matcher = self.matcher
+        return matcher is not None and matcher.search(text) is not None
 
 
 def add_buktopuha(app: App, handlers_group: int):
-    global wordlist
-    try:
-        with open("/app/words.txt", "rt", encoding="utf8") as fi:
-            wordlist = fi.read().splitlines()
-    except:  # noqa: E722
-        logger.error("failed to read wordlist!")
+    global word_bank
+    word_bank = WordBank("buktopuha", get_words_path())
 
     logger.info("registering buktopuha handlers")
     group_filter = group_chat_filter()
+    text_triggers.add(MEME_TRIGGER, MEME_REGEX)
 
     app.add_handler(
         CommandHandler(
             "znatoki",
             show_nerds,
-            block=False,
         ),
         group=handlers_group,
     )
     app.add_handler(
         # limit to groups to avoid API abuse
         MessageHandler(
-            group_filter & filters.Regex(MEME_REGEX),
+            group_filter & text_triggers.filter(MEME_TRIGGER),
             start_buktopuha,
-            block=False,
         ),
         group=handlers_group,
     )
     app.add_handler(
         MessageHandler(
-            group_filter & filters.TEXT & ~filters.StatusUpdate.ALL,
+            group_filter & text_triggers.filter(ANSWER_TRIGGER),
             check_for_answer,
-            block=False,
         ),
         group=handlers_group,
     )
 
+    # keep questions pool filled
+    if app.job_queue is not None:
+        app.job_queue.run_repeating(
+            question_pool.refill, interval=POOL_REFILL_INTERVAL, first=1
+        )
+    else:
+        logger.warning("job_queue missing; buktopuha questions pool is disabled")
+
 
-wordlist: list[str] = [
+# used if words file is missing or empty
+fallback_words: list[str] = [
     "babirusa",
     "gerenuk",
     "pangolin",
@@ -188,7 +209,29 @@ wordlist: list[str] = [
     "wombat",
 ]
 
-game = Buktopuha()
+word_bank: Optional[WordBank] = None
+
+
+def _random_word() -> str:
+    word = word_bank.sample() if word_bank is not None else None
+    return word or random.choice(fallback_words)
+
+
+class Games(dict[int, Buktopuha]):
+    """Every chat plays its own game, with its own hint and end jobs"""
+
+    def __missing__(self, chat_id: int) -> Buktopuha:
+        game = self[chat_id] = Buktopuha(chat_id)
+        return game
+
+
+games = Games()
+
+GAME_JOBS = ["hint1", "hint2", "end"]
+
+
+def _job_name(job: str, chat_id: int, word: str) -> str:
+    return f"{job}-{chat_id}-{word}"
 
 
 def stop_jobs(update: Update, context: ContextTypes.DEFAULT_TYPE, names: list[str]):
@@ -205,6 +248,10 @@ async def check_for_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     if update.effective_chat is None or update.message is None:
         return
+    # don't create games for chats just chatting
+    game = games.get(update.effective_chat.id)
+    if game is None:
+        return
     text = update.effective_message.text or ""
     if not text:
         return
@@ -237,7 +284,11 @@ async def check_for_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_to_message_id=update.message.message_id,
         )
         game.stop()
-        stop_jobs(update, context, [f"{j}-{word}" for j in ["hint1", "hint2", "end"]])
+        stop_jobs(
+            update,
+            context,
+            [_job_name(j, update.effective_chat.id, word) for j in GAME_JOBS],
+        )
 
         # Felix Felicis
         if random.random() < 0.1:
@@ -265,9 +316,31 @@ async def check_for_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
         else:
             db.inc_buktopuha_win(user_id=user.id, score=score)
+            db.upsert_user(user_id=user.id, user_meta=user.to_dict())
+
+
+def _get_prompt(word: str) -> str:
+    return f"""You are a facilitator of an online quiz game.
+    Your task is to make engaging and tricky quiz questions.
+    You should try to make your question fun and interesting, but keep your wording simple and short (less than 15 words).
+    Keep in mind that for part of the audience English is not a native language.
+    You can use historical references or examples to explain the word.
+    For expample good quiz question for word "horse" can be:
+    Wooden statue of this animal helped to end the siege of Troy.
+
+    Please write a quiz question for the word '{word}' using single sentence without mentioning the word itself."""
 
 
-def generate_question(prompt: str, word: str) -> str:
+def _mask_question(model: str, text: str, word: str) -> Optional[str]:
+    """Hide the word in model answer, None if the answer isn't a usable question"""
+    question = re.sub(re.escape(word), "***", text, flags=re.IGNORECASE)
+    question = question.strip().strip('"')
+    if not question or len(question) > MAX_QUESTION_LEN:
+        return None
+    return f"{model}: {question}"
+
+
+def generate_question(prompt: str, word: str) -> Optional[str]:
     openai_models = [
         "o4-mini",
         "gpt-5-mini",
@@ -281,31 +354,70 @@ def generate_question(prompt: str, word: str) -> str:
     if random.random() < 0.5:
         model = random.choice(openai_models)
         try:
-            response = openai.chat.completions.create(
+            response = get_openai().chat.completions.create(
                 model=model,
                 messages=[{"role": "system", "content": prompt}],
             )
             rs = response.choices[0].message.content or ""
-            return f"{model}: " + re.sub(
-                word, "***", rs, flags=re.IGNORECASE
-            ).strip().strip('"')
+            return _mask_question(model, rs, word)
         except Exception as exc:  # pylint: disable=broad-except
             logger.warning("openai question failed: %s", exc)
-            return f"Guess the word. It has {len(word)} letters."
+            return None
     else:
         model = random.choice(google_models)
         try:
-            resp = genai_client.models.generate_content(
+            resp = get_genai().models.generate_content(
                 model=model,
                 contents=prompt,
             )
             resp_text = resp.text or ""
-            return f"{model}: " + re.sub(
-                word, "***", resp_text, flags=re.IGNORECASE
-            ).strip().strip('"')
+            return _mask_question(model, resp_text, word)
         except Exception as exc:  # pylint: disable=broad-except
             logger.warning("genai question failed: %s", exc)
-            return f"Guess the word. It has {len(word)} letters."
+            return None
+
+
+class QuestionPool:
+    """Pre-generated (word, question) pairs stored in SQLite, so a game start
+    doesn't wait for GenAI. Refilled in background up to `size` once it drops
+    below `low_water`."""
+
+    def __init__(self, size: int = POOL_SIZE, low_water: int = POOL_LOW_WATER):
+        self.size = size
+        self.low_water = low_water
+        self._refilling = False
+
+    def pop(self) -> Optional[tuple[str, str]]:
+        row = db.pop_buktopuha_question()
+        if row is None:
+            return None
+        return row["word"], row["question"]
+
+    def needs_refill(self) -> bool:
+        return not self._refilling and db.count_buktopuha_questions() < self.low_water
+
+    async def refill(self, _context: ContextTypes.DEFAULT_TYPE) -> None:
+        if word_bank is not None:
+            await word_bank.refresh()
+        if not self.needs_refill():
+            return
+        self._refilling = True
+        try:
+            missing = self.size - db.count_buktopuha_questions()
+            logger.info("refilling buktopuha questions pool with %d questions", missing)
+            for _ in range(missing):
+                word = _random_word()
+                question = await asyncio.to_thread(
+                    generate_question, _get_prompt(word), word
+                )
+                if question is None:
+                    continue
+                db.add_buktopuha_question(word, question)
+        finally:
+            self._refilling = False
+
+
+question_pool = QuestionPool()
 
 
 async def start_buktopuha(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -318,6 +430,8 @@ async def start_buktopuha(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     result: Optional[Message] = None
+    chat_id = update.effective_chat.id
+    game = games[chat_id]
 
     if not game.can_start():
         result = await context.bot.send_message(
@@ -333,32 +447,16 @@ async def start_buktopuha(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await mute_user_for_time(update, context, user, timedelta(minutes=1))
         return
 
-    word = random.choice(wordlist)
-    prompt = f"""You are a facilitator of an online quiz game.
-    Your task is to make engaging and tricky quiz questions.
-    You should try to make your question fun and interesting, but keep your wording simple and short (less than 15 words).
-    Keep in mind that for part of the audience English is not a native language.
-    You can use historical references or examples to explain the word.
-    For expample good quiz question for word "horse" can be:
-    Wooden statue of this animal helped to end the siege of Troy.
-
-    Please write a quiz question for the word '{word}' using single sentence without mentioning the word itself."""
-    try:
-        question = generate_question(prompt, word)
-    except:  # pylint: disable=bare-except # noqa: E722
-        logger.error("Error calling GenAI model", exc_info=True)
-        result = await context.bot.send_message(
-            update.effective_chat.id,
-            "Sorry, my GenAI brain is dizzy 😵‍💫 Try in a minute!",
-        )
-        cleanup_queue_update(
-            get_job_queue(context),
-            update.message,
-            result,
-            10,
-        )
-        game.start("")  # set last_game time, to dissallow immediate reattempts
-        return
+    job_queue = get_job_queue(context)
+    pooled = question_pool.pop()
+    if pooled is None:
+        logger.warning("buktopuha questions pool is empty")
+        word = _random_word()
+        question = f"Guess the word. It has {len(word)} letters."
+    else:
+        word, question = pooled
+    if job_queue is not None and question_pool.needs_refill():
+        job_queue.run_once(question_pool.refill, 0)
 
     msg = question
     if game.since_last_game() > timedelta(minutes=120):
@@ -369,24 +467,23 @@ async def start_buktopuha(update: Update, context: ContextTypes.DEFAULT_TYPE):
         msg,
     )
     game.start(word)
-    job_queue = get_job_queue(context)
     if job_queue is None:
         logger.warning("job_queue missing; skipping hints")
     else:
         job_queue.run_once(
-            game.hint1(update.effective_chat.id, word),
+            game.hint1(chat_id, word),
             10,
-            name=f"hint1-{word}",
+            name=_job_name("hint1", chat_id, word),
         )
         job_queue.run_once(
-            game.hint2(update.effective_chat.id, word),
+            game.hint2(chat_id, word),
             20,
-            name=f"hint2-{word}",
+            name=_job_name("hint2", chat_id, word),
         )
         job_queue.run_once(
-            game.end(update.effective_chat.id, word),
+            game.end(chat_id, word),
             30,
-            name=f"end-{word}",
+            name=_job_name("end", chat_id, word),
         )
 
     existing_user = db.find_buktopuha_player(user_id=user.id)
@@ -394,6 +491,7 @@ async def start_buktopuha(update: Update, context: ContextTypes.DEFAULT_TYPE):
         db.add_buktopuha_player(user_id=user.id, user_meta=user.to_dict(), score=0)
     else:
         db.inc_buktopuha_game_counter(user_id=user.id)
+        db.upsert_user(user_id=user.id, user_meta=user.to_dict())
 
 
 def _is_group_chat(update: Update) -> bool:
@@ -447,7 +545,7 @@ async def show_nerds(update: Update, context: ContextTypes.DEFAULT_TYPE):
     znatoki_length = len(znatoki)
 
     for znatok in znatoki:
-        username = _get_username(znatok)
+        username = znatok["display_name"]
         board += (
             f"{str(znatok['total_score']).ljust(12)} "
             f"| {str(znatok['game_counter']).ljust(9)} "
@@ -489,19 +587,6 @@ async def show_nerds(update: Update, context: ContextTypes.DEFAULT_TYPE):
     os.remove(board_image_path)
 
 
-def _get_username(h: Mapping[str, Any]) -> str:
-    """Get username or fullname or unknown"""
-    m = h["meta"]
-    username = m.get("username")
-    fname = m.get("first_name")
-    lname = m.get("last_name")
-    username = username if isinstance(username, str) else None
-    fname = fname if isinstance(fname, str) else None
-    lname = lname if isinstance(lname, str) else None
-    fullname_parts = [part for part in (fname, lname) if part]
-    return username or " ".join(fullname_parts) or "unknown"
-
-
 JPEG = "JPEG"
 EXTENSION = ".jpg"
 COLOR = "white"
@@ -1,23 +1,21 @@
+import asyncio
 import random
-import re
 import logging
+import time
+from array import array
 from collections import deque
 from datetime import datetime, timedelta
-from threading import Lock
-from typing import Any, cast
+from typing import Any, Optional, TypedDict, cast
 
-from config import get_config
+from config import get_config, get_persist_chat_memory, get_skill_settings
+from db.sqlite import db
 from mode import Mode, ON
 from telegram import Update
 from telegram.ext import MessageHandler, ContextTypes, filters
 from tg_filters import group_chat_filter
 from typing_utils import App
-
-from google import genai
-from google.genai import types
-
-# Expects GEMINI_API_KEY env variable to be set
-client = genai.Client()
+from utils import prosody
+from utils.sdk import get_genai
 
 # Max number of messages to keep in memory.
 MAX_MESSAGES = 100
@@ -29,8 +27,14 @@ SLEEP_INTERVAL = 60 * 60
 POEMS_PER_DAY = 2
 # Number of attempts to generate a valid poem
 MAX_TRIES = 10
+# Number of poem candidates generated in parallel
+PARALLEL_CANDIDATES = 3
+# Max time to write a poem, seconds
+POEM_DEADLINE = 60
 # Min number of messages in the memory to consider writing a poem
 MIN_MESSAGES = 5
+# Examples of pirozhki for the prompt
+PIROZHKI_PATH = "pirozhki.txt"
 
 
 logger = logging.getLogger(__name__)
@@ -38,42 +42,91 @@ logger = logging.getLogger(__name__)
 mode = Mode(mode_name="chat_mode", default=ON)
 
 
+class PoemStats(TypedDict):
+    attempts: int
+    latency: float
+    success: bool
+
+
 class Nyan:
-    def __init__(self):
-        self.memory: deque[tuple[datetime, str]] = deque(maxlen=MAX_MESSAGES)
-        self.lock = Lock()
+    """Nyan remembers up to MAX_MESSAGES of the last MAX_AGE per chat.
+
+    Every chat has its own ring buffer ordered by time, so expired messages are
+    dropped from its head and recall touches only messages in the window.
+    With `persist` (PERSIST_CHAT_MEMORY by default) messages are also appended
+    to SQLite, trimmed to the same window, and restored on start.
+    """
+
+    def __init__(self, persist: Optional[bool] = None):
+        self.memory: dict[int, deque[tuple[datetime, str]]] = {}
+        self.persist = get_persist_chat_memory() if persist is None else persist
+        # SQLite runs in threads, the FIFO lock keeps writes in message order
+        self._db_lock = asyncio.Lock()
+        # stats of the last write_a_poem call
+        self.poem_stats: Optional[PoemStats] = None
+
+    def restore(self) -> None:
+        if not self.persist:
+            return
+        since = datetime.now() - MAX_AGE
+        db.delete_chat_messages_before(since)
+        for row in db.get_chat_messages(since):
+            self.remember(row["chat_id"], row["message"], row["datetime"])
+        logger.info("restored memory of %d chats", len(self.memory))
+
+    def remember(
+        self, chat_id: int, message: str, dt: Optional[datetime] = None
+    ) -> None:
+        chat_memory = self.memory.get(chat_id)
+        if chat_memory is None:
+            chat_memory = self.memory[chat_id] = deque(maxlen=MAX_MESSAGES)
+        chat_memory.append((dt or datetime.now(), message))
 
-    def registerMessage(
+    async def registerMessage(
         self, update: Update, context: ContextTypes.DEFAULT_TYPE
     ) -> None:
         if update.message is None:
             return
-        if update.effective_user is None:
+        if update.effective_user is None or update.effective_chat is None:
             return
         text = update.message.text
         if not text:
             return
         if text.startswith("/"):
             return
-        with self.lock:
-            self.memory.append(
-                (
-                    datetime.now(),
-                    f"{update.effective_user.full_name}: {text}",
-                ),
-            )
+        now = datetime.now()
+        message = f"{update.effective_user.full_name}: {text}"
+        chat_id = update.effective_chat.id
+        self.remember(chat_id, message, now)
+        if self.persist:
+            async with self._db_lock:
+                await asyncio.to_thread(
+                    db.add_chat_message,
+                    chat_id,
+                    now,
+                    message,
+                    keep=MAX_MESSAGES,
+                    since=now - MAX_AGE,
+                )
 
-    def forget(self) -> None:
-        with self.lock:
-            self.memory.clear()
-
-    def write_a_poem(self) -> str:
-        log: list[str] = []
-        with self.lock:
-            for dt, message in self.memory:
-                if datetime.now() - dt > MAX_AGE:
-                    continue
-                log.append(message)
+    def recall(self, chat_id: int) -> list[str]:
+        """Messages of the last MAX_AGE, oldest first"""
+        chat_memory = self.memory.get(chat_id)
+        if not chat_memory:
+            return []
+        expired = datetime.now() - MAX_AGE
+        while chat_memory and chat_memory[0][0] < expired:
+            chat_memory.popleft()
+        return [message for _, message in chat_memory]
+
+    async def forget(self, chat_id: int) -> None:
+        self.memory.pop(chat_id, None)
+        if self.persist:
+            async with self._db_lock:
+                await asyncio.to_thread(db.delete_chat_messages, chat_id)
+
+    async def write_a_poem(self, chat_id: int) -> str:
+        log = self.recall(chat_id)
         if len(log) < MIN_MESSAGES:
             logger.info("not writing poem since only have %d messages", len(log))
             return ""
@@ -89,100 +142,154 @@ class Nyan:
 
 {get_examples(5)}"""
 
-        theme = summarize("\n".join(log))
-        messages: list[Any] = [
-            f"""Пожалуйста, прошу, умоляю, напиши лучший пирожок! Ровно 4 строки, не больше не меньше.
+        started = time.monotonic()
+        attempts = 0
+        poem = ""
+        pending: set[asyncio.Task[str]] = set()
+        try:
+            async with asyncio.timeout(POEM_DEADLINE):
+                theme = await summarize("\n".join(log))
+                messages: list[Any] = [
+                    f"""Пожалуйста, прошу, умоляю, напиши лучший пирожок! Ровно 4 строки, не больше не меньше.
 Этот пирожок должен стать легендой среди пирожков, он должен быть максимально гениальным, максимально смешным,
 смешнее, чем весь юмор на планете Земля, он должен быть словно пирожок-Хеопс среди пирожков-рабов,
 вся надежда будущего Земли кроется в этом пирожке, за этим пирожком прилетят будущие инопланетные цивилизации за много тысяч световых лет,
 это должен быть пирожок-бог!
 Тема пирожка:
 {theme}."""
-        ]
-
-        for _ in range(MAX_TRIES):
-            try:
-
-                response = client.models.generate_content(
-                    model="gemini-3-flash-preview",
-                    contents=messages,
-                    config=types.GenerateContentConfig(system_instruction=prompt),
-                )
-
-                text = response.text or ""
-                err = check_pirozhok(text)
-                if err == "":
-                    return text
+                ]
+
+                # keep PARALLEL_CANDIDATES generations in flight, every new one
+                # gets feedback on all the failed candidates so far
+                while not poem:
+                    while len(pending) < PARALLEL_CANDIDATES and attempts < MAX_TRIES:
+                        attempts += 1
+                        pending.add(
+                            asyncio.create_task(
+                                _write_candidate(prompt, list(messages))
+                            )
+                        )
+                    if not pending:
+                        break
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    poem = _pick_poem(done, messages)
+        except TimeoutError:
+            logger.warning("poem generation took longer than %ds", POEM_DEADLINE)
+        finally:
+            for task in pending:
+                task.cancel()
+
+        self.poem_stats = {
+            "attempts": attempts,
+            "latency": time.monotonic() - started,
+            "success": poem != "",
+        }
+        logger.info("poem stats: %s", self.poem_stats)
+        return poem
+
+
+def _pick_poem(done: set[asyncio.Task[str]], messages: list[Any]) -> str:
+    """Return first valid poem of finished candidates, add feedback for the rest"""
+    for task in done:
+        try:
+            text = task.result()
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning("poem generation failed: %s", e)
+            continue
+        err = check_pirozhok(text)
+        if err == "":
+            return text
+        messages.append(f"{err}\n Попробуй ещё раз.")
+    return ""
 
-                messages.append(f"{err}\n Попробуй ещё раз.")
-            except Exception as e:  # pylint: disable=broad-except
-                logger.warning("poem generation failed: %s", e)
-                continue
 
-        return ""
+async def _write_candidate(prompt: str, messages: list[Any]) -> str:
+    response = await get_genai().aio.models.generate_content(
+        model="gemini-3-flash-preview",
+        contents=messages,
+        config={"system_instruction": prompt},
+    )
+    return response.text or ""
 
 
 nyan = Nyan()
 
 
 def check_pirozhok(pirozhok: str) -> str:
-    syllables = [9, 8, 9, 8]
-
-    for w in [w.strip() for w in pirozhok.split()]:
-        if len(re.findall(r"[^абвгдеёжзийклмнопрстуфхцчшщъыьэюя]", w, re.I)) > 0:
-            return f"Слово {w} содержит не кириллические символы. Попробуй заменить или транслитерировать. Например вместо gpt используй жэпэтэ"
+    return "\n".join(prosody.check_pirozhok(pirozhok))
+
+
+class PirozhkiIndex:
+    """Valid pirozhki, formatted once and packed into a single string.
+
+    Poem i is `text[offsets[i]:offsets[i + 1]]`.
+    """
+
+    def __init__(self, path: str = PIROZHKI_PATH):
+        parts: list[str] = []
+        self.offsets = array("I", [0])
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        formatted = format_pirozhok(line)
+                    except ValueError:
+                        # Some pirozhki do not match
+                        continue
+                    parts.append(formatted)
+                    self.offsets.append(self.offsets[-1] + len(formatted))
+        except OSError as err:
+            logger.error("failed to read pirozhki: %s", err)
+        self.text = "".join(parts)
+        logger.info("indexed %d pirozhki", len(self))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def sample(self, n: int) -> list[str]:
+        offsets = self.offsets
+        return [
+            self.text[offsets[i] : offsets[i + 1]]
+            for i in random.sample(range(len(self)), min(n, len(self)))
+        ]
 
-    lines = pirozhok.splitlines()
 
-    if len(lines) != 4:
-        return "Пирожок должен состоять из 4 строк."
+_pirozhki: PirozhkiIndex | None = None
 
-    for i, l, s in zip(range(4), lines, syllables):
-        cnt = len(re.findall(r"[аеёиоуыэюя]", l, re.I))
-        if cnt != s:
-            return f"В строке {i + 1} ({l}) должно быть {s} слогов, а не {cnt}. Количество слогов в строках должно соответствовать формуле пирожка (9-8-9-8)."
 
-    return ""
+def get_pirozhki() -> PirozhkiIndex:
+    global _pirozhki
+    if _pirozhki is None:
+        _pirozhki = PirozhkiIndex()
+    return _pirozhki
 
 
 def get_examples(n: int = 10) -> str:
-    with open("pirozhki.txt", "r", encoding="utf-8") as f:
-        examples = f.read().splitlines()
-
-        poems: list[str] = []
-        while len(poems) < n:
-            pirozhok = random.choice(examples)
-            try:
-                formatted = format_pirozhok(pirozhok)
-                poems.append(formatted)
-            except ValueError:
-                # Some pirozhki do not match
-                pass
-
-        return "\n\n".join(poems)
+    return "\n\n".join(get_pirozhki().sample(n))
 
 
 def format_pirozhok(pirozhok: str) -> str:
-    syllables = [9, 8, 9, 8]
     words = pirozhok.split()
     if len(words) == 0:
         raise ValueError("Пирожок не содержит ни одного слова.")
     lines: list[str] = []
+    i = 0
 
-    for s in syllables:
+    for s in prosody.PIROZHOK_SYLLABLES:
         cnt = 0
-        line: list[str] = []
-        while cnt < s:
-            word = words.pop(0)
-            cnt += len(re.findall(r"[аеёиоуыэюя]", word, re.I))
-            line.append(word)
+        start = i
+        while cnt < s and i < len(words):
+            cnt += prosody.count_syllables(words[i])
+            i += 1
         if cnt != s:
             raise ValueError(
                 "Количество слогов в строках должно соответствовать формуле пирожка (9-8-9-8)."
             )
-        lines.append(" ".join(line))
+        lines.append(" ".join(words[start:i]))
 
-    if len(lines) != 4:
+    if i != len(words):
         raise ValueError("Пирожок должен состоять из 4 строк.")
 
     return "\n".join(lines)
@@ -191,6 +298,8 @@ def format_pirozhok(pirozhok: str) -> str:
 @mode.add
 def add_chat_mode(app: App, handlers_group: int):
     logger.info("registering chat handlers")
+    get_pirozhki()
+    nyan.restore()
     group_filter = group_chat_filter()
     app.add_handler(
         MessageHandler(
@@ -202,13 +311,15 @@ def add_chat_mode(app: App, handlers_group: int):
     )
 
     # Muse visits Nyan at most twice a day.
-    group_chat_id = get_config()["GROUP_CHAT_ID"]
+    conf = get_config()
+    group_chat_id = conf["GROUP_CHAT_ID"]
     if group_chat_id and app.job_queue is not None:
+        poems = get_skill_settings(conf, "chat").get("poems_per_day", POEMS_PER_DAY)
         app.job_queue.run_repeating(
             muse_visit,
             interval=SLEEP_INTERVAL,
             first=SLEEP_INTERVAL,
-            data={"chat_id": group_chat_id},
+            data={"chat_id": group_chat_id, "poems_per_day": poems},
         )
     else:
         logger.warning("CHAT_ID is empty; chat_mode muse job is disabled")
@@ -221,48 +332,52 @@ async def nyan_listen(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     if bot_user_id and user.id == bot_user_id:
         return
-    nyan.registerMessage(update, context)
+    await nyan.registerMessage(update, context)
 
 
 async def muse_visit(context: ContextTypes.DEFAULT_TYPE):
+    if context.job is None:
+        logger.warning("muse job missing; skipping")
+        return
+    job_data = context.job.data
+    if not isinstance(job_data, dict):
+        logger.warning("muse job data missing or invalid; skipping")
+        return
+    job_data = cast(dict[str, Any], job_data)
+    chat_id = job_data.get("chat_id")
+    if not isinstance(chat_id, (int, str)) or not chat_id:
+        logger.warning("muse job data missing chat_id; skipping")
+        return
+
     # We want nyan to be visited by muse at random times, but
     # about POEMS_PER_DAY times per day.
     secondsInDay = 24 * 60 * 60
-    inspirationRate = float(POEMS_PER_DAY) / float(secondsInDay / SLEEP_INTERVAL)
+    poems = job_data.get("poems_per_day", POEMS_PER_DAY)
+    inspirationRate = float(poems) / float(secondsInDay / SLEEP_INTERVAL)
     if random.random() > inspirationRate:
         logger.info("checked for inspiration but it did not come")
         return
 
     try:
-        message = nyan.write_a_poem()
+        # CHAT_ID could be a username, memory is kept by numeric id
+        chat = await context.bot.get_chat(chat_id=chat_id)
+        message = await nyan.write_a_poem(chat.id)
         if message != "":
-            if context.job is None:
-                logger.warning("muse job missing; skipping")
-                return
-            job_data = context.job.data
-            if not isinstance(job_data, dict):
-                logger.warning("muse job data missing or invalid; skipping")
-                return
-            job_data = cast(dict[str, Any], job_data)
-            chat_id = job_data.get("chat_id")
-            if not isinstance(chat_id, (int, str)) or not chat_id:
-                logger.warning("muse job data missing chat_id; skipping")
-                return
-            await context.bot.send_message(chat_id=chat_id, text=message)
+            await context.bot.send_message(chat_id=chat.id, text=message)
             # Forget messages we already wrote about.
-            nyan.forget()
+            await nyan.forget(chat.id)
     except Exception as e:  # pylint: disable=broad-except
         logger.error("inspiration failed: %s", e)
 
 
-def summarize(log: str) -> str:
+async def summarize(log: str) -> str:
     try:
-        response = client.models.generate_content(
+        response = await get_genai().aio.models.generate_content(
             model="gemini-3-flash-preview",
             contents=f"Дай выжимку из следующего текста на русском языке в одном предложении, без форматирования.\n {log}",
-            config=types.GenerateContentConfig(
-                system_instruction="Ты языковая модель, специализирующаяся на суммаризации текста. Ты всегда выдаёшь чёткую выжимку в одном предложении на русском языке без форматирования."
-            ),
+            config={
+                "system_instruction": "Ты языковая модель, специализирующаяся на суммаризации текста. Ты всегда выдаёшь чёткую выжимку в одном предложении на русском языке без форматирования."
+            },
         )
     except Exception as exc:  # pylint: disable=broad-except
         logger.warning("summary failed: %s", exc)
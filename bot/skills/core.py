@@ -5,6 +5,7 @@ from telegram.ext import ContextTypes
 from typing_utils import App
 
 from handlers import ChatCommandHandler
+from mode import chat_modes
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +14,10 @@ def add_core(app: App, core_handlers_group: int):
     logger.info("register smile-mode handlers")
     app.add_handler(ChatCommandHandler("start", start), group=core_handlers_group)
     app.add_handler(ChatCommandHandler("help", help_), group=core_handlers_group)
+    app.add_handler(
+        ChatCommandHandler("modes", modes, require_admin=True),
+        group=core_handlers_group,
+    )
 
 
 async def start(update: Update, _: ContextTypes.DEFAULT_TYPE):
@@ -23,6 +28,13 @@ async def start(update: Update, _: ContextTypes.DEFAULT_TYPE):
     )
 
 
+async def modes(update: Update, _: ContextTypes.DEFAULT_TYPE):
+    """Which modes are ON in which chats"""
+    if update.message is None:
+        return
+    await update.message.reply_text(chat_modes.status_table())
+
+
 async def help_(update: Update, _: ContextTypes.DEFAULT_TYPE):
     """List of ALL commands"""
     if update.message is None:
@@ -36,6 +48,9 @@ async def help_(update: Update, _: ContextTypes.DEFAULT_TYPE):
         "\n"
         "Version: just version\n"
         "`/version` – show current version of the bot\n"
+        "\n"
+        "Modes: which modes are ON in which chats\n"
+        "`/modes` – show modes status table\n"
         "\n\n"
         "Skills for all:\n\n"
         "SinceMode: when the last time we ware discuss this topic?\n"
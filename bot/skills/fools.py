@@ -1,6 +1,6 @@
 import logging
 import os
-from typing import Any, Callable, cast
+from typing import Callable
 from telegram import Update, User
 from telegram.error import BadRequest, TelegramError
 from telegram.ext import MessageHandler, ContextTypes, filters
@@ -8,21 +8,19 @@ from telegram.ext import MessageHandler, ContextTypes, filters
 from tg_filters import group_chat_filter
 from mode import Mode, OFF
 from typing_utils import App
+from utils.sdk import has_module, optional_module
 
 logger = logging.getLogger(__name__)
 
-try:
-    from google.cloud import translate
-except Exception as exc:  # pylint: disable=broad-except
-    translate = None
-    logger.warning("google translate unavailable; fools mode disabled: %s", exc)
+TRANSLATE_MODULE = "google.cloud.translate"
 
 mode = Mode(mode_name="fools_mode", default=OFF)
 
 
 @mode.add
 def add_fools_mode(app: App, handlers_group: int):
-    if translate is None:
+    # the client itself is imported on the first translation
+    if not has_module(TRANSLATE_MODULE):
         logger.warning("fools mode disabled: google translate not available")
         return
     logger.info("registering fools handlers")
@@ -75,13 +73,14 @@ async def mesaĝa_traduko(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 def f(text: str, lingvo: str) -> str:
+    translate = optional_module(TRANSLATE_MODULE)
     if translate is None:
         raise RuntimeError("google translate is not available")
     project_id = os.getenv("GOOGLE_PROJECT_ID")
     if not project_id:
         raise RuntimeError("GOOGLE_PROJECT_ID is not set")
 
-    client = cast(Any, translate.TranslationServiceClient())
+    client = translate.TranslationServiceClient()
 
     parent = client.common_location_path(project_id, "global")
 
@@ -1,5 +1,5 @@
 import logging
-from typing import Optional, TypedDict, Any, Mapping
+from typing import Optional, TypedDict
 
 from telegram import Update, User, Message
 from telegram.ext import ContextTypes
@@ -14,7 +14,7 @@ logger = logging.getLogger(__name__)
 
 class PeninsulaDataType(TypedDict):
     _id: int
-    meta: dict[str, Any]
+    display_name: str
 
 
 def add_length(app: App, handlers_group: int):
@@ -36,19 +36,6 @@ def add_length(app: App, handlers_group: int):
     )
 
 
-def _get_username(h: Mapping[str, Any]) -> str:
-    """Get username or fullname or unknown."""
-    m = h.get("meta", {})
-    username = m.get("username")
-    fname = m.get("first_name")
-    lname = m.get("last_name")
-    username = username if isinstance(username, str) else None
-    fname = fname if isinstance(fname, str) else None
-    lname = lname if isinstance(lname, str) else None
-    fullname_parts = [part for part in (fname, lname) if part]
-    return username or " ".join(fullname_parts) or "unknown"
-
-
 async def _length(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user: User | None = update.effective_user
     if user is None:
@@ -79,7 +66,7 @@ async def _longest(update: Update, context: ContextTypes.DEFAULT_TYPE):
     n = 1
 
     for col in db.get_best_peninsulas(10):
-        username = _get_username(col)
+        username = col["display_name"]
         message += f"{n} → {username}\n"
 
         n += 1
@@ -50,7 +50,7 @@ async def handle_nastya_mode(update: Update, context: ContextTypes.DEFAULT_TYPE)
     message_type = message.voice or message.video_note
     if message_type is None:
         return
-    message_text = _compose_message_text(user, message_type)
+    message_text = await _compose_message_text(user, message_type)
     if message_text is None:
         return
 
@@ -68,7 +68,7 @@ def _get_duration_seconds(duration: int | float | timedelta) -> int:
     return int(duration)
 
 
-def _compose_message_text(user: User, message_type: Any) -> str | None:
+async def _compose_message_text(user: User, message_type: Any) -> str | None:
     duration_seconds = _get_duration_seconds(message_type.duration)
     if duration_seconds > MAX_DURATION:
         return f"🤫🤫🤫 @{user.username}! Слишком много наговорил..."
@@ -79,7 +79,9 @@ def _compose_message_text(user: User, message_type: Any) -> str | None:
     recognized_text = None
 
     try:
-        recognized_text = get_recognized_text(file_id)
+        recognized_text = await get_recognized_text(
+            file_id, message_type.file_unique_id, duration_seconds
+        )
     except (AttributeError, ValueError, RuntimeError) as err:
         logger.exception("failed to recognize speech: %s", err)
 
@@ -4,8 +4,7 @@ import re
 from datetime import datetime, timedelta
 from random import randint
 from tempfile import gettempdir
-from threading import Lock
-from typing import List, Optional, Tuple, Mapping, Any, IO, TypedDict, cast
+from typing import Any, IO, MutableMapping, Optional, Tuple, TypedDict, cast
 from uuid import uuid4
 
 from PIL import Image, ImageDraw, ImageFont
@@ -25,6 +24,7 @@ from handlers import ChatCommandHandler
 from mode import cleanup_queue_update
 from skills.mute import mute_user_for_time
 from permissions import is_admin
+from triggers import text_triggers
 from typing_utils import App, get_job_queue
 
 logger = logging.getLogger(__name__)
@@ -39,8 +39,8 @@ MEME_REGEX = re.compile(r"\/[rрp][оo0][1lл]{2}", re.IGNORECASE)
 
 
 class HussarRecord(TypedDict):
-    user_id: int
-    meta: dict[str, Any]
+    _id: int
+    display_name: str
     shot_counter: int
     miss_counter: int
     dead_counter: int
@@ -51,15 +51,17 @@ class HussarRecord(TypedDict):
 
 def add_roll(app: App, handlers_group: int):
     logger.info("registering roll handlers")
+    text_triggers.add("roll", MEME_REGEX)
     app.add_handler(MessageHandler(filters.Dice.ALL, roll), group=handlers_group)
     app.add_handler(
-        MessageHandler(filters.Regex(MEME_REGEX), roll, block=False),
+        MessageHandler(text_triggers.filter("roll"), roll),
         group=handlers_group,
     )
     app.add_handler(
         ChatCommandHandler(
             "gdpr_me",
             satisfy_GDPR,
+            block=True,
         ),
         group=handlers_group,
     )
@@ -67,7 +69,6 @@ def add_roll(app: App, handlers_group: int):
         CommandHandler(
             "hussars",
             show_hussars,
-            block=False,
         ),
         group=handlers_group,
     )
@@ -76,6 +77,7 @@ def add_roll(app: App, handlers_group: int):
             "htop",
             show_active_hussars,
             require_admin=True,
+            block=True,
         ),
         group=handlers_group,
     )
@@ -84,26 +86,33 @@ def add_roll(app: App, handlers_group: int):
             "wipe_hussars",
             wipe_hussars,
             require_admin=True,
+            block=True,
         ),
         group=handlers_group,
     )
 
 
-barrel_lock = Lock()
+# Barrel is kept in chat_data as (bullets bitmask, position of the next chamber),
+# so it's tiny to persist and every chat has its own one.
+Barrel = Tuple[int, int]
 
 
-def _reload(context: ContextTypes.DEFAULT_TYPE) -> List[bool]:
-    empty, bullet = False, True
-    barrel: List[bool] = [empty] * NUM_BULLETS
-    lucky_number = randint(0, NUM_BULLETS - 1)
-    barrel[lucky_number] = bullet
-    chat_data = context.chat_data
-    if chat_data is not None:
-        chat_data["barrel"] = barrel
-
+def _reload(chat_data: MutableMapping[Any, Any]) -> Barrel:
+    barrel: Barrel = (1 << randint(0, NUM_BULLETS - 1), 0)
+    chat_data["barrel"] = barrel
     return barrel
 
 
+def _get_barrel(chat_data: MutableMapping[Any, Any]) -> Barrel:
+    barrel = chat_data.get("barrel")
+    if not isinstance(barrel, tuple):  # missing, or a list of bools before bitmasks
+        return _reload(chat_data)
+    bullets, position = cast(Barrel, barrel)
+    if not 0 <= position < NUM_BULLETS:
+        return _reload(chat_data)
+    return bullets, position
+
+
 def get_miss_string(shots_remain: int) -> str:
     s = ["😕", "😟", "😥", "😫", "😱"]
     misses = ["🔘"] * (NUM_BULLETS - shots_remain)
@@ -117,39 +126,26 @@ def get_mute_minutes(shots_remain: int) -> int:
     return MUTE_MINUTES * (NUM_BULLETS - shots_remain)
 
 
-def _shot(context: ContextTypes.DEFAULT_TYPE) -> Tuple[bool, int]:
-    with barrel_lock:
-        chat_data = context.chat_data
-        if chat_data is None:
-            return False, NUM_BULLETS
-        barrel = chat_data.get("barrel")
-        if barrel is None or len(barrel) == 0:
-            barrel = _reload(context)
-
-        logger.debug("barrel before shot: %s", barrel)
-
-        fate = barrel.pop()
-        chat_data["barrel"] = barrel
-        shots_remained = len(barrel)  # number before reload
-        if fate:
-            _reload(context)
+def shoot(context: ContextTypes.DEFAULT_TYPE) -> Tuple[bool, int]:
+    # no locks here: there is no await between reading and writing the barrel,
+    # so concurrent rolls in the same chat can't interleave on the event loop
+    chat_data = context.chat_data
+    if chat_data is None:
+        return False, NUM_BULLETS
+    bullets, position = _get_barrel(chat_data)
+    logger.debug("barrel before shot: %s", format(bullets, f"0{NUM_BULLETS}b"))
+
+    fate = bool(bullets >> position & 1)
+    position += 1
+    shots_remained = NUM_BULLETS - position  # number before reload
+    if fate or shots_remained == 0:
+        _reload(chat_data)
+    else:
+        chat_data["barrel"] = (bullets, position)
 
     return fate, shots_remained
 
 
-def _get_username(h: Mapping[str, Any]) -> str:
-    """Get username or fullname or unknown"""
-    m = h["meta"]
-    username = m.get("username")
-    fname = m.get("first_name")
-    lname = m.get("last_name")
-    username = username if isinstance(username, str) else None
-    fname = fname if isinstance(fname, str) else None
-    lname = lname if isinstance(lname, str) else None
-    fullname_parts = [part for part in (fname, lname) if part]
-    return username or " ".join(fullname_parts) or "unknown"
-
-
 JPEG = "JPEG"
 EXTENSION = ".jpg"
 COLOR = "white"
@@ -256,7 +252,7 @@ async def show_hussars(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     hussars_length = len(hussars)
 
     for hussar in hussars:
-        username = _get_username(hussar)
+        username = hussar["display_name"]
         board += (
             f"{str(timedelta(seconds=hussar['total_time_in_club'])).ljust(18)} "
             f"| {str(hussar['shot_counter']).ljust(8)} "
@@ -326,7 +322,7 @@ async def show_active_hussars(
         message = "Right meow in da club ☠️:\n"
 
         for hussar in restricted_hussars:
-            name = _get_username(hussar)
+            name = hussar["display_name"]
             magia_nombro = sum([ord(c) for c in name])
             emoji = chr(ord("😀") + magia_nombro % 75)
             message += f"{emoji} {name} \n"
@@ -355,8 +351,11 @@ async def roll(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     existing_user = db.find_hussar(user_id=user.id)
     if existing_user is None:
         db.add_hussar(user_id=user.id, user_meta=user.to_dict())
+    else:
+        # names change, leaderboards show the current one
+        db.upsert_user(user_id=user.id, user_meta=user.to_dict())
 
-    is_shot, shots_remained = _shot(context)
+    is_shot, shots_remained = shoot(context)
     shot_result = "he is dead!" if is_shot else "miss!"
     logger.info(
         "user: %s[%s] is rolling and... %s", user.full_name, user.id, shot_result
@@ -1,11 +1,10 @@
 import os
 import logging
 from datetime import datetime
+from functools import partial
 from random import choice
 from typing import Dict, Any, cast
 
-import openai
-from google import genai
 from telegram import Update, User, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.error import BadRequest
 from telegram.ext import (
@@ -15,10 +14,11 @@ from telegram.ext import (
     filters,
 )
 
-from config import get_config
+from config import get_config, get_skill_settings
 from db.sqlite import db as sqlite_db
 from mode import Mode
 from typing_utils import App
+from utils.sdk import get_genai, get_openai
 
 MAGIC_NUMBER = "42"
 QUARANTINE_TIME = 60
@@ -38,11 +38,9 @@ I_AM_BOT = [
 
 logger = logging.getLogger(__name__)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-openai.api_key = OPENAI_API_KEY
 OPENAI_ENABLED = bool(OPENAI_API_KEY)
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-genai_client = genai.Client(api_key=GEMINI_API_KEY) if GEMINI_API_KEY else None
 GEMINI_ENABLED = bool(GEMINI_API_KEY)
 
 
@@ -73,11 +71,16 @@ async def _delete_user_rel_messages(
 @mode.add
 def add_towel_mode(app: App, handlers_group: int):
     logger.info("registering towel-mode handlers")
+    conf = get_config()
+    quarantine_time = get_skill_settings(conf, "towel_mode").get(
+        "quarantine_time", QUARANTINE_TIME
+    )
 
     # catch all new users and drop the towel
     app.add_handler(
         MessageHandler(
-            filters.StatusUpdate.NEW_CHAT_MEMBERS, catch_new_user, block=False
+            filters.StatusUpdate.NEW_CHAT_MEMBERS,
+            partial(catch_new_user, quarantine_time=quarantine_time),
         ),
         group=handlers_group,
     )
@@ -87,18 +90,15 @@ def add_towel_mode(app: App, handlers_group: int):
         MessageHandler(
             filters.ChatType.GROUPS & ~filters.StatusUpdate.ALL,
             catch_reply,
-            block=False,
         ),
         group=handlers_group,
     )
 
     # "i am a bot button"
-    app.add_handler(
-        CallbackQueryHandler(i_am_a_bot_btn, block=False), group=handlers_group
-    )
+    app.add_handler(CallbackQueryHandler(i_am_a_bot_btn), group=handlers_group)
 
     # ban quarantine users, if time is gone
-    group_chat_id = get_config()["GROUP_CHAT_ID"]
+    group_chat_id = conf["GROUP_CHAT_ID"]
     if group_chat_id and app.job_queue is not None:
         app.job_queue.run_repeating(
             ban_user,
@@ -110,9 +110,14 @@ def add_towel_mode(app: App, handlers_group: int):
         logger.warning("CHAT_ID is empty; towel_mode ban job is disabled")
 
 
-async def quarantine_user(user: User, chat_id: int, context: ContextTypes.DEFAULT_TYPE):
+async def quarantine_user(
+    user: User,
+    chat_id: int,
+    context: ContextTypes.DEFAULT_TYPE,
+    quarantine_time: int = QUARANTINE_TIME,
+):
     logger.info("put %s in quarantine", user)
-    sqlite_db.add_quarantine_user(user.id, QUARANTINE_TIME)
+    sqlite_db.add_quarantine_user(user.id, quarantine_time)
 
     markup = InlineKeyboardMarkup(
         [[InlineKeyboardButton(choice(I_AM_BOT), callback_data=MAGIC_NUMBER)]]
@@ -124,7 +129,7 @@ async def quarantine_user(user: User, chat_id: int, context: ContextTypes.DEFAUL
             f"{user.name} НЕ нажимай на кнопку ниже, чтобы доказать, что ты не бот.\n"
             "Просто ответь (reply) на это сообщение, кратко написав о себе (у нас так принято).\n"
             "Я буду удалять твои сообщения, пока ты не сделаешь это.\n"
-            f"А коли не сделаешь, через {QUARANTINE_TIME} минут выкину из чата.\n"
+            f"А коли не сделаешь, через {quarantine_time} минут выкину из чата.\n"
             "Ничего личного, просто боты одолели.\n",
             reply_markup=markup,
         )
@@ -154,11 +159,15 @@ async def quarantine_user(user: User, chat_id: int, context: ContextTypes.DEFAUL
         )
 
 
-async def catch_new_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def catch_new_user(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    quarantine_time: int = QUARANTINE_TIME,
+):
     if update.message is None or update.effective_chat is None:
         return
     for user in update.message.new_chat_members:
-        await quarantine_user(user, update.effective_chat.id, context)
+        await quarantine_user(user, update.effective_chat.id, context, quarantine_time)
 
 
 async def catch_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -240,9 +249,9 @@ Answer with a single word: spam or legit."""
     verdict = None
 
     # Try Gemini first
-    if GEMINI_ENABLED and genai_client is not None:
+    if GEMINI_ENABLED:
         try:
-            gemini_resp = genai_client.models.generate_content(
+            gemini_resp = get_genai().models.generate_content(
                 model="gemini-3-flash-preview",
                 contents=f"{prompt}\n\nUser message: {text}",
             )
@@ -254,7 +263,7 @@ Answer with a single word: spam or legit."""
     # Fallback to OpenAI if Gemini failed or is disabled
     if verdict is None and OPENAI_ENABLED:
         try:
-            openai_resp = openai.chat.completions.create(
+            openai_resp = get_openai().chat.completions.create(
                 model="gpt-5-nano",
                 messages=[
                     {"role": "system", "content": prompt},
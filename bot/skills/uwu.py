@@ -5,7 +5,8 @@ from typing import Any
 from telegram import Update
 from telegram.ext import Application, MessageHandler, ContextTypes
 
-from filters import uwu_filter
+from filters import UWU_REGEX
+from triggers import text_triggers
 
 logger = logging.getLogger(__name__)
 
@@ -16,7 +17,11 @@ App = Application[Any, Any, Any, Any, Any, Any]
 
 def add_uwu(app: App, handlers_group: int):
     logger.info("register uwu handlers")
-    app.add_handler(MessageHandler(uwu_filter, uwu, block=False), group=handlers_group)
+    text_triggers.add("uwu", UWU_REGEX)
+    app.add_handler(
+        MessageHandler(text_triggers.filter("uwu"), uwu, block=False),
+        group=handlers_group,
+    )
 
 
 async def uwu(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -0,0 +1,13 @@
+"""Opt-in benchmarks: slow and machine dependent, so skipped by default.
+
+Run them with `make benchmark`, results are printed.
+"""
+
+import os
+from unittest import skipUnless
+
+BENCHMARK_ENV = "BENCHMARK"
+
+benchmark = skipUnless(
+    os.getenv(BENCHMARK_ENV), f"set {BENCHMARK_ENV}=1 to run benchmarks"
+)
@@ -0,0 +1,121 @@
+import os
+import re
+import shutil
+import tempfile
+import time
+from typing import Any, List, Optional
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import patch
+
+from db.sqlite import BotDB
+from skills import buktopuha
+from skills.buktopuha import Buktopuha, QuestionPool
+from tests.benchmark import benchmark
+
+MESSAGES = [
+    "hey folks, anyone tried the new rust release?",
+    "нян, как дела?",
+    "I think it's a capybara, or maybe not",
+    "lol",
+    "the answer is definitely wombats!",
+]
+
+
+def _messages_per_sec(game: Buktopuha, messages: List[str]) -> float:
+    started = time.perf_counter()
+    for text in messages:
+        game.check_for_answer(text)
+    return len(messages) / (time.perf_counter() - started)
+
+
+class BuktopuhaTestCase(TestCase):
+    def test_check_for_answer(self):
+        game = Buktopuha()
+        self.assertFalse(game.check_for_answer("wombat"))
+
+        game.start("wombat")
+        self.assertTrue(game.check_for_answer("Is it a WOMBAT?"))
+        self.assertTrue(game.check_for_answer("wombats"))
+        self.assertFalse(game.check_for_answer("notawombat"))
+
+        game.stop()
+        self.assertFalse(game.check_for_answer("wombat"))
+
+    def test_check_for_answer_escapes_word(self):
+        game = Buktopuha()
+        game.start("c++")
+        self.assertTrue(game.check_for_answer("c++ obviously"))
+        self.assertFalse(game.check_for_answer("cc"))
+
+    def test_matcher_is_compiled_once_per_game(self):
+        game = Buktopuha()
+        with patch.object(buktopuha.re, "compile", wraps=re.compile) as compile_:
+            for text in MESSAGES:
+                game.check_for_answer(text)
+            self.assertEqual(compile_.call_count, 0)
+
+            game.start("wombat")
+            answers = [game.check_for_answer(text) for text in MESSAGES * 10]
+            self.assertEqual(compile_.call_count, 1)
+        self.assertEqual(answers, [False, False, False, False, True] * 10)
+
+    @benchmark
+    def test_check_for_answer_benchmark(self):
+        messages = MESSAGES * 2000
+        game = Buktopuha()
+        idle = _messages_per_sec(game, messages)
+        game.start("wombat")
+        active = _messages_per_sec(game, messages)
+        print(f"\ncheck_for_answer: idle {idle:,.0f} msg/s, active {active:,.0f} msg/s")
+
+
+class QuestionPoolTestCase(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db = BotDB(db_path=os.path.join(self.dir, "test_bot.db"))
+        self.words = iter(
+            ["cat", "wombat", "capybara", "armadillo", "platypus", "quokka", "numbat"]
+        )
+        self.patches = [
+            patch.object(buktopuha, "db", self.db),
+            patch.object(buktopuha, "_random_word", lambda: next(self.words)),
+            patch.object(buktopuha, "generate_question", self._generate_question),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.dir)
+
+    @staticmethod
+    def _generate_question(_prompt: str, word: str) -> Optional[str]:
+        # GenAI failures are skipped
+        return None if word == "capybara" else f"what is {word}?"
+
+    async def test_refill_up_to_size(self):
+        pool = QuestionPool(size=4, low_water=2)
+        context: Any = None
+        self.assertTrue(pool.needs_refill())
+        await pool.refill(context)
+        self.assertEqual(self.db.count_buktopuha_questions(), 3)
+        self.assertFalse(pool.needs_refill())
+
+        self.assertEqual(pool.pop(), ("cat", "what is cat?"))
+        self.assertFalse(pool.needs_refill())
+        self.assertEqual(pool.pop(), ("wombat", "what is wombat?"))
+        self.assertTrue(pool.needs_refill())
+
+        await pool.refill(context)
+        self.assertEqual(self.db.count_buktopuha_questions(), 4)
+        self.assertEqual(pool.pop(), ("armadillo", "what is armadillo?"))
+
+    async def test_no_concurrent_refills(self):
+        pool = QuestionPool(size=2, low_water=1)
+        context: Any = None
+        with patch.object(pool, "_refilling", True):
+            self.assertFalse(pool.needs_refill())
+            await pool.refill(context)
+        self.assertEqual(self.db.count_buktopuha_questions(), 0)
+        self.assertIsNone(pool.pop())
@@ -0,0 +1,194 @@
+import asyncio
+import os
+import tempfile
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Any, List
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import patch
+
+from db.sqlite import BotDB
+from skills import chat
+from skills.chat import Nyan, PirozhkiIndex, format_pirozhok
+
+PIROZHOK = (
+    "сперва любви искала с принцем потом богатого купца "
+    "затем хотя бы папу детям теперь того кто даст воды"
+)
+
+
+class PirozhkiTestCase(TestCase):
+    def test_format_pirozhok(self):
+        self.assertEqual(
+            format_pirozhok(PIROZHOK),
+            "сперва любви искала с принцем\n"
+            "потом богатого купца\n"
+            "затем хотя бы папу детям\n"
+            "теперь того кто даст воды",
+        )
+        with self.assertRaises(ValueError):
+            format_pirozhok("слишком короткий пирожок")
+        with self.assertRaises(ValueError):
+            format_pirozhok(f"{PIROZHOK} и ещё")
+
+    def test_index_keeps_only_valid(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+            f.write(f"{PIROZHOK}\nне пирожок\n\n{PIROZHOK}\n")
+        try:
+            index = PirozhkiIndex(f.name)
+        finally:
+            os.remove(f.name)
+
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.sample(10), [format_pirozhok(PIROZHOK)] * 2)
+        self.assertEqual(len(index.sample(1)), 1)
+
+
+def _update(chat_id: int, text: str) -> Any:
+    return SimpleNamespace(
+        message=SimpleNamespace(text=text),
+        effective_user=SimpleNamespace(full_name="user"),
+        effective_chat=SimpleNamespace(id=chat_id),
+    )
+
+
+class NyanMemoryTestCase(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.db_path = "test_chat_memory.db"
+        self.db = BotDB(db_path=self.db_path)
+        self.db_patch = patch.object(chat, "db", self.db)
+        self.db_patch.start()
+
+    def tearDown(self):
+        self.db_patch.stop()
+        os.remove(self.db_path)
+
+    async def test_recall_per_chat(self):
+        nyan = Nyan(persist=False)
+        nyan.remember(1, "old", datetime.now() - chat.MAX_AGE - timedelta(minutes=1))
+        nyan.remember(1, "new")
+        nyan.remember(2, "other chat")
+        self.assertEqual(nyan.recall(1), ["new"])
+        self.assertEqual(nyan.recall(2), ["other chat"])
+        self.assertEqual(nyan.recall(3), [])
+
+        await nyan.forget(1)
+        self.assertEqual(nyan.recall(1), [])
+        self.assertEqual(nyan.recall(2), ["other chat"])
+
+    def test_ring_buffer_is_bounded(self):
+        nyan = Nyan(persist=False)
+        for i in range(chat.MAX_MESSAGES + 10):
+            nyan.remember(1, str(i))
+        recalled = nyan.recall(1)
+        self.assertEqual(len(recalled), chat.MAX_MESSAGES)
+        self.assertEqual(recalled[-1], str(chat.MAX_MESSAGES + 9))
+
+    async def test_persisted_window(self):
+        nyan = Nyan(persist=True)
+        context: Any = None
+        old = datetime.now() - chat.MAX_AGE - timedelta(minutes=1)
+        self.db.add_chat_message(1, old, "user: old", keep=10, since=old)
+        with patch.object(chat, "MAX_MESSAGES", 3):
+            await asyncio.gather(
+                *(nyan.registerMessage(_update(1, str(i)), context) for i in range(5)),
+                nyan.registerMessage(_update(2, "hi"), context),
+            )
+        rows = self.db.get_chat_messages(old - timedelta(days=1))
+        # trimmed on write to the last messages within MAX_AGE, in order
+        self.assertEqual(
+            [(r["chat_id"], r["message"]) for r in rows],
+            [(1, "user: 2"), (1, "user: 3"), (1, "user: 4"), (2, "user: hi")],
+        )
+
+    async def test_restore(self):
+        now = datetime.now()
+        since = now - chat.MAX_AGE * 2
+        self.db.add_chat_message(
+            1, now - chat.MAX_AGE - timedelta(minutes=1), "old", keep=10, since=since
+        )
+        self.db.add_chat_message(1, now, "hello", keep=10, since=since)
+        self.db.add_chat_message(2, now, "hi", keep=10, since=since)
+
+        nyan = Nyan(persist=True)
+        nyan.restore()
+        self.assertEqual(nyan.recall(1), ["hello"])
+        self.assertEqual(nyan.recall(2), ["hi"])
+
+        await nyan.forget(2)
+        restored = Nyan(persist=True)
+        restored.restore()
+        self.assertEqual(restored.recall(2), [])
+        self.assertEqual(len(self.db.get_chat_messages(since)), 1)
+
+
+class FakeModels:
+    def __init__(self, answers: List[str], delay: float = 0):
+        self.answers = answers
+        self.delay = delay
+        self.calls = 0
+
+    async def generate_content(self, **kwargs: Any) -> Any:
+        # summary is requested with a plain text, poems with a conversation
+        if isinstance(kwargs["contents"], str):
+            return SimpleNamespace(text="тема")
+        answer = self.answers[self.calls % len(self.answers)]
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return SimpleNamespace(text=answer)
+
+
+def _no_examples(n: int) -> str:
+    del n
+    return ""
+
+
+class WriteAPoemTestCase(IsolatedAsyncioTestCase):
+    def _nyan(self) -> Nyan:
+        nyan = Nyan(persist=False)
+        for i in range(chat.MIN_MESSAGES):
+            nyan.remember(1, f"user: message {i}")
+        return nyan
+
+    def _client(self, models: FakeModels) -> Any:
+        client = SimpleNamespace(aio=SimpleNamespace(models=models))
+        return lambda: client
+
+    async def test_first_valid_candidate_wins(self):
+        models = FakeModels(["не пирожок", format_pirozhok(PIROZHOK)])
+        nyan = self._nyan()
+        with (
+            patch.object(chat, "get_genai", self._client(models)),
+            patch.object(chat, "get_examples", _no_examples),
+        ):
+            poem = await nyan.write_a_poem(1)
+
+        self.assertEqual(poem, format_pirozhok(PIROZHOK))
+        self.assertIsNotNone(nyan.poem_stats)
+        if nyan.poem_stats:
+            self.assertTrue(nyan.poem_stats["success"])
+            self.assertLessEqual(nyan.poem_stats["attempts"], chat.MAX_TRIES)
+
+    async def test_max_tries(self):
+        models = FakeModels(["не пирожок"])
+        nyan = self._nyan()
+        with (
+            patch.object(chat, "get_genai", self._client(models)),
+            patch.object(chat, "get_examples", _no_examples),
+        ):
+            self.assertEqual(await nyan.write_a_poem(1), "")
+        self.assertEqual(models.calls, chat.MAX_TRIES)
+
+    async def test_deadline(self):
+        models = FakeModels([format_pirozhok(PIROZHOK)], delay=10)
+        nyan = self._nyan()
+        with (
+            patch.object(chat, "get_genai", self._client(models)),
+            patch.object(chat, "get_examples", _no_examples),
+            patch.object(chat, "POEM_DEADLINE", 0.1),
+        ):
+            self.assertEqual(await nyan.write_a_poem(1), "")
+        self.assertIsNotNone(nyan.poem_stats)
+        if nyan.poem_stats:
+            self.assertFalse(nyan.poem_stats["success"])
+            self.assertLess(nyan.poem_stats["latency"], 1)
@@ -0,0 +1,6 @@
+import os
+
+# skills read these at import time
+os.environ.setdefault("TOKEN", "test-token")
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
@@ -1,7 +1,9 @@
 import os
 from unittest import TestCase
 
-from config import get_config, Config
+from unittest.mock import patch
+
+from config import get_config, get_skill_settings, Config
 
 
 class ConfigTestCase(TestCase):
@@ -21,3 +23,23 @@ class ConfigTestCase(TestCase):
         self.assertEqual(c["DEBUG"], True)
         self.assertEqual(c["GROUP_CHAT_ID"], self.env_chat_id)
         self.assertEqual(c["TOKEN"], self.env_token)
+
+    def test_skills_config(self):
+        self.assertIsNone(get_config()["SKILLS"]["ENABLED"])
+        env = {
+            "SKILLS": " core, roll ,,",
+            "SKILLS_SETTINGS": '{"towel_mode": {"quarantine_time": 5}}',
+        }
+        with patch.dict(os.environ, env):
+            conf = get_config()
+            skills = conf["SKILLS"]
+            self.assertEqual(skills["ENABLED"], ["core", "roll"])
+            self.assertEqual(skills["SETTINGS"]["towel_mode"]["quarantine_time"], 5)
+            self.assertEqual(
+                get_skill_settings(conf, "towel_mode"), {"quarantine_time": 5}
+            )
+            self.assertEqual(get_skill_settings(conf, "roll"), {})
+
+        with patch.dict(os.environ, {"SKILLS_SETTINGS": '{"roll": 1}'}):
+            with self.assertRaises(ValueError):
+                get_config()
@@ -0,0 +1,158 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from typing import Any
+from unittest import TestCase
+from unittest.mock import patch
+
+from telegram import Chat, Message, Update, User
+from telegram.ext import ApplicationBuilder, MessageHandler, filters
+
+import mode as mode_module
+from db.sqlite import BotDB
+from mode import ChatModes, GatedHandler, Mode
+from typing_utils import App
+
+GROUP = 1
+
+
+def _update(chat_id: int, text: str = "hello") -> Update:
+    message = Message(
+        message_id=1,
+        date=datetime.now(),
+        chat=Chat(id=chat_id, type=Chat.SUPERGROUP),
+        from_user=User(id=1, first_name="user", is_bot=False),
+        text=text,
+    )
+    return Update(update_id=1, message=message)
+
+
+async def _noop(*_args: Any) -> None:
+    pass
+
+
+def _add_handlers(app: App, handlers_group: int) -> None:
+    app.add_handler(MessageHandler(filters.TEXT, _noop), group=handlers_group)
+
+
+class ChatModesTestCase(TestCase):
+    def setUp(self):
+        self.modes = ChatModes()
+        self.patch = patch.object(mode_module, "chat_modes", self.modes)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+
+    def test_defaults_and_switches(self):
+        on_bit = Mode("on_mode", default=True).bit
+        off_bit = Mode("off_mode", default=False).bit
+
+        self.assertTrue(self.modes.is_on(1, on_bit))
+        self.assertFalse(self.modes.is_on(1, off_bit))
+
+        self.modes.set(1, on_bit, False)
+        self.modes.set(1, off_bit, True)
+        self.assertFalse(self.modes.is_on(1, on_bit))
+        self.assertTrue(self.modes.is_on(1, off_bit))
+        # other chats keep defaults
+        self.assertTrue(self.modes.is_on(2, on_bit))
+        self.assertFalse(self.modes.is_on(2, off_bit))
+
+        # a mode registered later gets its default in switched chats too
+        late_bit = Mode("late_mode", default=True).bit
+        self.assertTrue(self.modes.is_on(1, late_bit))
+
+    def test_registry(self):
+        mode = Mode("test_mode")
+        self.assertIs(self.modes.modes["test_mode"], mode)
+        with self.assertRaises(ValueError):
+            Mode("test_mode")
+
+    def test_status_table(self):
+        towel = Mode("towel_mode", default=True)
+        Mode("smile_mode", default=False)
+        self.modes.set(-100, towel.bit, False)
+        self.assertEqual(
+            self.modes.status_table(),
+            "mode        default  -100\n"
+            "smile_mode  OFF      OFF\n"
+            "towel_mode  ON       OFF",
+        )
+
+
+class ModeGatingTestCase(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db = BotDB(db_path=os.path.join(self.dir, "test_bot.db"))
+        self.modes = ChatModes()
+        self.patches = [
+            patch.object(mode_module, "db", self.db),
+            patch.object(mode_module, "chat_modes", self.modes),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.dir)
+
+    def _app(self, mode: Mode) -> App:
+        app: App = ApplicationBuilder().token("1:test").build()
+        mode.add(_add_handlers)(app, GROUP)
+        return app
+
+    def _handles(self, app: App, update: Update) -> bool:
+        return any(
+            isinstance(h, GatedHandler) and h.check_update(update)
+            for h in app.handlers[GROUP]
+        )
+
+    def test_handlers_stay_registered(self):
+        mode = Mode("test_mode", default=False)
+        app = self._app(mode)
+        handlers = list(app.handlers[GROUP])
+        self.assertEqual(sum(isinstance(h, GatedHandler) for h in handlers), 1)
+        self.assertFalse(self._handles(app, _update(1)))
+
+        mode.set_enabled(1, True)
+        self.assertTrue(self._handles(app, _update(1)))
+        # switching in one chat doesn't affect another one
+        self.assertFalse(self._handles(app, _update(2)))
+        self.assertEqual(list(app.handlers[GROUP]), handlers)
+
+    def test_handlers_registry(self):
+        app: App = ApplicationBuilder().token("1:test").build()
+        other = MessageHandler(filters.ALL, _noop)
+        app.add_handler(other, group=GROUP)
+        mode = Mode("test_mode")
+        mode.add(_add_handlers)(app, GROUP)
+        # handlers of others in the same group are left as is
+        self.assertIs(app.handlers[GROUP][0], other)
+        self.assertIsInstance(app.handlers[GROUP][1], GatedHandler)
+
+        extra = MessageHandler(filters.PHOTO, _noop)
+        mode.add_handler(extra)
+        self.assertEqual(len(app.handlers[GROUP]), 6)
+        mode.remove_handler(extra)
+        mode.remove_handler(extra)
+        self.assertEqual(len(app.handlers[GROUP]), 5)
+
+    def test_state_is_persisted(self):
+        mode = Mode("test_mode", default=True)
+        self._app(mode)
+        mode.set_enabled(1, False)
+        self.assertEqual(
+            self.db.get_chat_modes("test_mode"), [{"chat_id": 1, "enabled": False}]
+        )
+
+        # on restart the state is loaded from db at registration
+        self.modes = ChatModes()
+        with patch.object(mode_module, "chat_modes", self.modes):
+            restarted = Mode("test_mode", default=True)
+            app = self._app(restarted)
+            self.assertFalse(restarted.is_enabled(1))
+            self.assertTrue(restarted.is_enabled(2))
+            self.assertFalse(self._handles(app, _update(1)))
@@ -0,0 +1,109 @@
+import asyncio
+from collections import Counter
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, List
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from telegram import (
+    Chat,
+    ChatMemberMember,
+    ChatMemberOwner,
+    ChatMemberUpdated,
+    Message,
+    Update,
+    User,
+)
+from telegram.error import TimedOut
+
+import permissions
+from permissions import AdminsCache, admins_cache_handler, is_admin
+
+CHAT = Chat(id=-100, type=Chat.SUPERGROUP)
+ADMIN = User(id=1, first_name="admin", is_bot=False)
+USER = User(id=2, first_name="user", is_bot=False)
+
+
+def _update(user: User, chat: Chat = CHAT) -> Update:
+    message = Message(
+        message_id=1, date=datetime.now(), chat=chat, from_user=user, text="/top"
+    )
+    return Update(update_id=1, message=message)
+
+
+class FakeBot:
+    """Counts Bot API calls, ADMIN is the only admin"""
+
+    def __init__(self) -> None:
+        self.calls: Counter[str] = Counter()
+        self.errors: List[Exception] = []
+
+    async def get_chat_administrators(self, _chat_id: int) -> List[Any]:
+        self.calls["getChatAdministrators"] += 1
+        await asyncio.sleep(0)
+        if self.errors:
+            raise self.errors.pop()
+        return [ChatMemberOwner(user=ADMIN, is_anonymous=False)]
+
+
+class AdminsCacheTestCase(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.bot = FakeBot()
+        self.context = SimpleNamespace(bot=self.bot)
+        self.admins = AdminsCache()
+        self.patch = patch.object(permissions, "admins", self.admins)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+
+    async def _check(self, user: User) -> bool:
+        return await is_admin(_update(user), self.context)  # type: ignore[arg-type]
+
+    async def test_cache_hit_skips_api(self):
+        self.assertTrue(await self._check(ADMIN))
+        self.assertEqual(self.bot.calls, {"getChatAdministrators": 1})
+        for i in range(10):
+            # both admins and members are answered from the cached list
+            self.assertEqual(await self._check(ADMIN if i % 2 else USER), bool(i % 2))
+            self.assertEqual(self.bot.calls, {"getChatAdministrators": 1})
+
+    async def test_private_chat(self):
+        private = Chat(id=2, type=Chat.PRIVATE)
+        self.assertTrue(await is_admin(_update(USER, private), self.context))  # type: ignore[arg-type]
+        self.assertEqual(sum(self.bot.calls.values()), 0)
+
+    async def test_concurrent_checks_share_request(self):
+        results = await asyncio.gather(*(self._check(ADMIN) for _ in range(10)))
+        self.assertTrue(all(results))
+        self.assertEqual(self.bot.calls["getChatAdministrators"], 1)
+
+    async def test_ttl(self):
+        self.admins.ttl = 0
+        await self._check(ADMIN)
+        await self._check(ADMIN)
+        self.assertEqual(self.bot.calls["getChatAdministrators"], 2)
+
+    async def test_failures_are_not_cached(self):
+        self.bot.errors.append(TimedOut())
+        self.assertFalse(await self._check(ADMIN))
+        self.assertTrue(await self._check(ADMIN))
+        self.assertEqual(self.bot.calls["getChatAdministrators"], 2)
+
+    async def test_chat_member_update_invalidates(self):
+        await self._check(USER)
+        promoted = ChatMemberUpdated(
+            chat=CHAT,
+            from_user=ADMIN,
+            date=datetime.now(),
+            old_chat_member=ChatMemberMember(user=USER),
+            new_chat_member=ChatMemberOwner(user=USER, is_anonymous=False),
+        )
+        update = Update(update_id=2, chat_member=promoted)
+        handler = admins_cache_handler()
+        self.assertTrue(handler.check_update(update))
+        await handler.callback(update, self.context)  # type: ignore[arg-type]
+
+        await self._check(USER)
+        self.assertEqual(self.bot.calls["getChatAdministrators"], 2)
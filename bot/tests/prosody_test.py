@@ -0,0 +1,33 @@
+from unittest import TestCase
+
+from utils.prosody import check_pirozhok, count_syllables, is_cyrillic
+
+PIROZHOK = (
+    "сперва любви искала с принцем\n"
+    "потом богатого купца\n"
+    "затем хотя бы папу детям\n"
+    "теперь того кто даст воды"
+)
+
+
+class ProsodyTestCase(TestCase):
+    def test_count_syllables(self):
+        self.assertEqual(count_syllables("сперва любви искала с принцем"), 9)
+        self.assertEqual(count_syllables("ЁЛКА Ёлка"), 4)
+        self.assertEqual(count_syllables("gpt"), 0)
+
+    def test_is_cyrillic(self):
+        self.assertTrue(is_cyrillic("Ёжик"))
+        self.assertFalse(is_cyrillic("жэпэтэ,"))
+        self.assertFalse(is_cyrillic("gpt"))
+
+    def test_check_pirozhok(self):
+        self.assertEqual(check_pirozhok(PIROZHOK), [])
+
+    def test_check_pirozhok_reports_all_errors(self):
+        errors = check_pirozhok("сперва любви gpt\nпотом богатого купца")
+        self.assertEqual(len(errors), 4)
+        self.assertIn("4 строк", errors[0])
+        self.assertIn("gpt", errors[1])
+        self.assertIn("В строке 1", errors[2])
+        self.assertIn("9-8-9-8", errors[3])
@@ -0,0 +1,175 @@
+import os
+import shutil
+import tempfile
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from db.sqlite import BotDB
+from utils import recognition
+from utils.recognition import OGG_OPUS, TRANSCODED, get_opus_format, get_recognized_text
+from utils.recognizers import FakeRecognizer, Recognizer
+
+
+class TranscriptionCacheTestCase(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db = BotDB(db_path=os.path.join(self.dir, "test_bot.db"))
+        self.calls = 0
+        self.patches = [
+            patch.object(recognition, "db", self.db),
+            patch.object(recognition, "_recognize", self._recognize),
+            patch.object(recognition, "get_recognizer", FakeRecognizer),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.dir)
+
+    async def _recognize(self, _recognizer: Recognizer, file_id: str) -> Optional[str]:
+        self.calls += 1
+        return None if file_id == "silence" else f"said {file_id}"
+
+    async def test_repeated_media_is_recognized_once(self):
+        self.assertEqual(await get_recognized_text("id1", "unique", 3), "said id1")
+        # forwarded media has a new file_id but the same file_unique_id
+        self.assertEqual(await get_recognized_text("id2", "unique", 3), "said id1")
+        self.assertEqual(self.calls, 1)
+
+        cached = self.db.get_transcription("unique")
+        self.assertIsNotNone(cached)
+        if cached:
+            self.assertEqual(cached["duration"], 3)
+            self.assertEqual(cached["language"], FakeRecognizer.language)
+
+    async def test_failures_are_not_cached(self):
+        self.assertIsNone(await get_recognized_text("silence", "unique"))
+        self.assertIsNone(await get_recognized_text("silence", "unique"))
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.db.count_transcriptions(), 0)
+
+    async def test_recognizer_unavailable(self):
+        with patch.object(recognition, "get_recognizer", lambda: None):
+            self.assertIsNone(await get_recognized_text("id1", "unique"))
+        self.assertEqual(self.calls, 0)
+
+    async def test_without_unique_id(self):
+        await get_recognized_text("id1")
+        await get_recognized_text("id1")
+        self.assertEqual(self.calls, 2)
+
+
+def _ogg_opus(sample_rate: int = 48000, channels: int = 1) -> bytes:
+    head = (
+        b"OpusHead"
+        + bytes([1, channels])
+        + (312).to_bytes(2, "little")
+        + sample_rate.to_bytes(4, "little")
+        + bytes(3)
+    )
+    page = b"OggS" + bytes(22) + bytes([1, len(head)])
+    return page + head + b"audio packets"
+
+
+class FakeTranscoder:
+    def __init__(self):
+        self.jobs = 0
+        self.error: Optional[Exception] = None
+
+    async def transcode(self, chunks: AsyncIterator[bytes], *args: str) -> bytes:
+        self.jobs += 1
+        if self.error is not None:
+            raise self.error
+        data = b"".join([chunk async for chunk in chunks])
+        return b"pcm:" + data[:4]
+
+
+class PayloadTestCase(IsolatedAsyncioTestCase):
+    """Voice and video notes are downloaded from a local stand-in for the Bot API"""
+
+    async def asyncSetUp(self):
+        # file_id -> (file_path, content)
+        self.files: Dict[str, Tuple[str, bytes]] = {
+            "voice": ("voice/file_1.oga", _ogg_opus()),
+            "vorbis": ("voice/file_3.oga", b"OggS vorbis"),
+            "video": ("video/file_2.mp4", b"mp4"),
+        }
+        app = web.Application()
+        app.router.add_get(f"/bot{recognition.TOKEN}/getFile", self._get_file)
+        app.router.add_get(f"/file/bot{recognition.TOKEN}/{{path:.+}}", self._download)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.recognizer = FakeRecognizer()
+        self.transcoder = FakeTranscoder()
+        self.patches: List[Any] = [
+            patch.object(recognition, "TG_API_URL", str(self.server.make_url(""))),
+            patch.object(recognition, "transcoder", self.transcoder),
+            patch.object(recognition, "get_recognizer", lambda: self.recognizer),
+        ]
+        for p in self.patches:
+            p.start()
+
+    async def asyncTearDown(self):
+        for p in self.patches:
+            p.stop()
+        await self.server.close()
+
+    async def _get_file(self, request: web.Request) -> web.Response:
+        file_path, _ = self.files[request.query["file_id"]]
+        return web.json_response({"ok": True, "result": {"file_path": file_path}})
+
+    async def _download(self, request: web.Request) -> web.Response:
+        path = request.match_info["path"]
+        content = next(c for p, c in self.files.values() if p == path)
+        return web.Response(body=content)
+
+    def test_opus_format(self):
+        self.assertEqual(get_opus_format(_ogg_opus()), (48000, 1))
+        self.assertEqual(get_opus_format(_ogg_opus(16000, 2)), (16000, 2))
+        # unsupported input rate, opus is decoded at 48kHz
+        self.assertEqual(get_opus_format(_ogg_opus(44100)), (48000, 1))
+        self.assertIsNone(get_opus_format(b"OggS" + bytes(40)))
+        self.assertIsNone(get_opus_format(b"ID3"))
+
+    async def test_voice_is_sent_as_is(self):
+        self.recognizer = FakeRecognizer(supports_opus=True)
+        requests = recognition.stats[OGG_OPUS]["requests"]
+        text = await get_recognized_text("voice")
+        self.assertEqual(text, self.recognizer.recognize_opus(_ogg_opus(), 48000, 1))
+        self.assertEqual(recognition.stats[OGG_OPUS]["requests"], requests + 1)
+        self.assertEqual(self.transcoder.jobs, 0)
+
+    async def test_transcoding_fallback(self):
+        cases = [
+            (False, "voice", b"pcm:OggS"),
+            (True, "vorbis", b"pcm:OggS"),
+            (True, "video", b"pcm:mp4"),
+        ]
+        requests = recognition.stats[TRANSCODED]["requests"]
+        for supports_opus, file_id, expected in cases:
+            self.recognizer = FakeRecognizer(supports_opus=supports_opus)
+            text = await get_recognized_text(file_id)
+            self.assertEqual(text, self.recognizer.recognize(expected))
+        self.assertEqual(recognition.stats[TRANSCODED]["requests"], requests + 3)
+        self.assertEqual(self.transcoder.jobs, 3)
+
+    async def test_download_failure(self):
+        self.assertIsNone(await get_recognized_text("missing"))
+        self.assertEqual(self.transcoder.jobs, 0)
+
+    async def test_transcoding_errors(self):
+        for error in [
+            FileNotFoundError("ffmpeg"),
+            TimeoutError(),
+            aiohttp.ClientPayloadError("truncated"),
+        ]:
+            self.transcoder.error = error
+            self.assertIsNone(await get_recognized_text("video"))
+        self.assertEqual(self.transcoder.jobs, 3)
@@ -0,0 +1,116 @@
+import math
+import time
+import tracemalloc
+from array import array
+from typing import List, Optional, Tuple
+from unittest import TestCase
+from unittest.mock import patch
+
+from config import get_vosk_model_path
+from utils import recognizers
+from utils.recognizers import (
+    FAKE,
+    GOOGLE,
+    VOSK,
+    FakeRecognizer,
+    Recognizer,
+    VoskRecognizer,
+    create_recognizer,
+)
+from tests.benchmark import benchmark
+
+# benchmark clip durations, seconds
+CLIP_SECONDS = [1, 5, 15]
+
+Measurement = Tuple[int, bytes, Optional[str], float, int]
+
+
+def _clip(seconds: float, sample_rate: int) -> bytes:
+    """Deterministic warbling tone, mono LINEAR16"""
+    samples = array(
+        "h",
+        (
+            int(
+                8000
+                * math.sin(
+                    2 * math.pi * (200 + 100 * math.sin(i / 800)) * i / sample_rate
+                )
+            )
+            for i in range(int(seconds * sample_rate))
+        ),
+    )
+    return samples.tobytes()
+
+
+def _benchmark(recognizer: Recognizer) -> List[Measurement]:
+    """(clip seconds, clip, transcript, real-time factor, peak python memory)"""
+    results: List[Measurement] = []
+    for seconds in CLIP_SECONDS:
+        clip = _clip(seconds, recognizer.sample_rate)
+        tracemalloc.start()
+        started = time.perf_counter()
+        text = recognizer.recognize(clip)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results.append((seconds, clip, text, elapsed / seconds, peak))
+    return results
+
+
+class RecognizersTestCase(TestCase):
+    def test_fake_is_deterministic(self):
+        recognizer = FakeRecognizer()
+        clip = _clip(2, recognizer.sample_rate)
+        text = recognizer.recognize(clip)
+        self.assertIsNotNone(text)
+        self.assertEqual(text, FakeRecognizer().recognize(clip))
+        self.assertTrue(str(text).startswith("2.0s "))
+        self.assertNotEqual(text, recognizer.recognize(_clip(3, 16000)))
+        self.assertIsNone(recognizer.recognize(bytes(32000)))
+
+    def test_create_recognizer(self):
+        self.assertIsInstance(create_recognizer(FAKE), FakeRecognizer)
+        self.assertIsNone(create_recognizer("nope"))
+        with patch.object(recognizers, "optional_module", return_value=None):
+            self.assertIsNone(create_recognizer(VOSK, "vosk-model"))
+        with patch.dict("os.environ", {"GOOGLE_APPLICATION_CREDENTIALS": ""}):
+            self.assertIsNone(create_recognizer(GOOGLE))
+
+    def test_recognizer_is_abstract(self):
+        with self.assertRaises(TypeError):
+            Recognizer()  # type: ignore[abstract] # pylint: disable=abstract-class-instantiated
+
+    def test_vosk_without_library(self):
+        with patch.object(recognizers, "optional_module", return_value=None):
+            with self.assertRaises(RuntimeError):
+                VoskRecognizer("vosk-model")
+
+    def test_benchmark(self):
+        recognizer = FakeRecognizer()
+        for seconds, clip, text, _, peak in _benchmark(recognizer):
+            self.assertEqual(text, recognizer.recognize(clip))
+            self.assertTrue(str(text).startswith(f"{seconds:.1f}s "))
+            # the samples are copied at most once
+            self.assertLess(peak, 2 * len(clip))
+
+    @benchmark
+    def test_benchmark_backends(self):
+        # real backends need models or credentials, unconfigured ones are listed
+        backends = {
+            FAKE: create_recognizer(FAKE),
+            VOSK: create_recognizer(VOSK, get_vosk_model_path()),
+            GOOGLE: create_recognizer(GOOGLE),
+        }
+        rows = [f"\n{'backend':<8} {'clip':>5} {'RTF':>8} {'peak memory':>12}"]
+        for name, recognizer in backends.items():
+            if recognizer is None:
+                rows.append(f"{name:<8} not configured")
+                continue
+            for seconds, _, _, rtf, peak in _benchmark(recognizer):
+                rows.append(
+                    f"{name:<8} {seconds:>4}s {rtf:>8.4f} {peak / 1024:>8,.0f} KiB"
+                )
+                # local models must keep up with speech
+                if name == VOSK:
+                    self.assertLess(rtf, 1, f"{seconds}s clip")
+        print("\n".join(rows))
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import shutil
+import tempfile
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Any, Dict, List
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import AsyncMock, patch
+
+from db.sqlite import BotDB
+from skills import roll
+from skills.roll import NUM_BULLETS, shoot
+
+
+async def _send_message(*args: Any, **kwargs: Any) -> None:
+    del args, kwargs
+
+
+# plain namespaces instead of mocks: thousands of them are created per test
+def _context(chat_data: Dict[str, Any]) -> Any:
+    bot = SimpleNamespace(send_message=_send_message)
+    return SimpleNamespace(chat_data=chat_data, job_queue=None, bot=bot)
+
+
+def _update(chat_id: int, user_id: int, username: str = "hussar") -> Any:
+    user = SimpleNamespace(
+        id=user_id,
+        full_name=f"hussar {user_id}",
+        to_dict=lambda: {"id": user_id, "username": username},
+    )
+    return SimpleNamespace(
+        message=SimpleNamespace(reply_to_message=None),
+        effective_chat=SimpleNamespace(id=chat_id),
+        effective_user=user,
+    )
+
+
+class ShotTestCase(TestCase):
+    def test_one_bullet_per_barrel(self):
+        chat_data: Dict[str, Any] = {}
+        context = _context(chat_data)
+        for _ in range(100):
+            shots: List[bool] = []
+            while True:
+                fate, shots_remained = shoot(context)
+                shots.append(fate)
+                self.assertEqual(shots_remained, NUM_BULLETS - len(shots))
+                if fate:
+                    break
+            self.assertLessEqual(len(shots), NUM_BULLETS)
+            self.assertEqual(chat_data["barrel"][1], 0)
+
+    def test_broken_barrel_is_reloaded(self):
+        chat_data: Dict[str, Any] = {"barrel": [False, True, False]}
+        shoot(_context(chat_data))
+        self.assertIsInstance(chat_data["barrel"], tuple)
+
+
+class RollStressTestCase(IsolatedAsyncioTestCase):
+    CHATS = 50
+    ROLLS = 5000
+
+    async def test_concurrent_rolls_across_chats(self):
+        chats: Dict[int, Dict[str, Any]] = defaultdict(dict)
+        fates: Dict[int, List[bool]] = defaultdict(list)
+
+        def _tracked_shot(context: Any):
+            fate, shots_remained = shoot(context)
+            fates[context.chat_data["chat_id"]].append(fate)
+            return fate, shots_remained
+
+        async def _roll(i: int) -> None:
+            chat_id = i % self.CHATS
+            chats[chat_id]["chat_id"] = chat_id
+            await asyncio.sleep(0)
+            await roll.roll(_update(chat_id, i), _context(chats[chat_id]))
+
+        with (
+            patch.object(roll, "db"),
+            patch.object(roll, "mute_user_for_time", AsyncMock()),
+            patch.object(roll, "shoot", _tracked_shot),
+        ):
+            await asyncio.gather(*(_roll(i) for i in range(self.ROLLS)))
+
+        self.assertEqual(sum(len(f) for f in fates.values()), self.ROLLS)
+        for chat_fates in fates.values():
+            misses_in_a_row = 0
+            for fate in chat_fates:
+                misses_in_a_row = 0 if fate else misses_in_a_row + 1
+                self.assertLess(misses_in_a_row, NUM_BULLETS)
+
+
+class RollUsersTestCase(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db = BotDB(db_path=os.path.join(self.dir, "test_bot.db"))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    async def test_name_is_updated(self):
+        with (
+            patch.object(roll, "db", self.db),
+            patch.object(roll, "mute_user_for_time", AsyncMock()),
+        ):
+            await roll.roll(_update(1, 7, "old_name"), _context({}))
+            await roll.roll(_update(1, 7, "new_name"), _context({}))
+
+        user = self.db.get_user(7)
+        self.assertIsNotNone(user)
+        if user:
+            self.assertEqual(user["display_name"], "new_name")
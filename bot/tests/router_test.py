@@ -0,0 +1,324 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Tuple
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import AsyncMock, patch
+
+from telegram import Bot, Update
+from telegram.constants import MessageType
+from telegram.ext import (
+    ApplicationBuilder,
+    ApplicationHandlerStop,
+    CallbackQueryHandler,
+    CommandHandler,
+    MessageHandler,
+    filters,
+)
+
+from filters import uwu_filter
+from router import MESSAGE, add_router, get_router, specialize_filter
+from tests.benchmark import benchmark
+from typing_utils import App
+
+# corpus replays per benchmark run
+ROUNDS = 200
+
+USER = {"id": 2, "is_bot": False, "first_name": "user"}
+# getMe reply, the only API call made
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "bot", "username": "bot"}
+CHAT = {"id": -100, "type": "supergroup", "title": "chat"}
+
+
+def _message(update_id: int, **fields: Any) -> Dict[str, Any]:
+    message = {"message_id": update_id, "date": 0, "chat": CHAT, "from": USER}
+    return {"update_id": update_id, "message": {**message, **fields}}
+
+
+def _text(update_id: int, text: str) -> Dict[str, Any]:
+    if not text.startswith("/"):
+        return _message(update_id, text=text)
+    command = {"type": "bot_command", "offset": 0, "length": len(text.split()[0])}
+    return _message(update_id, text=text, entities=[command])
+
+
+def _corpus() -> List[Dict[str, Any]]:
+    """Chat-like mix of updates, mostly plain text"""
+    texts = [
+        "hello",
+        "how are you doing?",
+        "uwu",
+        "let's /roll",
+        "/roll",
+        "/help",
+        "/still",
+        "/since",
+        "/version@bot",
+        "/unknown",
+        "/znatoki",
+    ] + ["just chatting"] * 9
+    updates = [_text(i, text) for i, text in enumerate(texts)]
+    file = {"file_id": "f", "file_unique_id": "u"}
+    updates += [
+        _message(
+            100,
+            sticker={
+                **file,
+                "width": 1,
+                "height": 1,
+                "is_animated": False,
+                "is_video": False,
+                "type": "regular",
+            },
+        ),
+        _message(101, voice={**file, "duration": 1}),
+        _message(102, dice={"emoji": "🎲", "value": 3}),
+        _message(103, new_chat_members=[{**USER, "id": 3}]),
+        {
+            "update_id": 104,
+            "edited_message": {
+                **_text(104, "edited")["message"],
+                "edit_date": 1,
+            },
+        },
+        {
+            "update_id": 105,
+            "callback_query": {
+                "id": "1",
+                "from": USER,
+                "chat_instance": "1",
+                "data": "button",
+            },
+        },
+    ]
+    return updates
+
+
+async def _noop(*_args: Any) -> None:
+    pass
+
+
+class SpecializeFilterTestCase(TestCase):
+    def test_specialize_filter(self):
+        text, sticker = MessageType.TEXT, MessageType.STICKER
+        self.assertIs(specialize_filter(filters.ALL, sticker), True)
+        self.assertIs(specialize_filter(filters.TEXT, text), True)
+        self.assertIs(specialize_filter(filters.TEXT, sticker), False)
+        self.assertIs(specialize_filter(filters.TEXT, "/help"), True)
+        self.assertIs(specialize_filter(uwu_filter, sticker), False)
+        self.assertIs(specialize_filter(uwu_filter, text), uwu_filter)
+
+        regex = filters.Regex("a")
+        self.assertIs(specialize_filter(regex, text), regex)
+        self.assertIs(specialize_filter(regex, sticker), False)
+
+    def test_specialize_combined(self):
+        text, sticker = MessageType.TEXT, MessageType.STICKER
+        voice = (filters.VOICE | filters.VIDEO_NOTE) & ~filters.StatusUpdate.ALL
+        self.assertIs(specialize_filter(voice, MessageType.VOICE), True)
+        self.assertIs(specialize_filter(voice, text), False)
+
+        smile = ~filters.Sticker.ALL & ~filters.ANIMATION
+        self.assertIs(specialize_filter(smile, sticker), False)
+        self.assertIs(specialize_filter(smile, text), True)
+
+        groups = filters.ChatType.GROUPS
+        group_text = filters.TEXT & groups & ~filters.StatusUpdate.ALL
+        self.assertIs(specialize_filter(group_text, sticker), False)
+        self.assertIs(specialize_filter(group_text, text), groups)
+        self.assertIs(specialize_filter(uwu_filter & groups, sticker), False)
+
+        # unresolved parts are kept, the rest is dropped
+        uwu_or_groups = uwu_filter | groups
+        self.assertIs(specialize_filter(uwu_or_groups, text), uwu_or_groups)
+        either = filters.Sticker.ALL | groups
+        self.assertIs(specialize_filter(either, sticker), True)
+        self.assertIs(specialize_filter(either, text), groups)
+        not_groups = ~groups
+        self.assertIs(specialize_filter(not_groups, text), not_groups)
+        members = filters.StatusUpdate.ALL & groups
+        self.assertIs(specialize_filter(members, MessageType.NEW_CHAT_MEMBERS), groups)
+
+
+class RouterTestCase(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.calls: List[str] = []
+        self.app: App = ApplicationBuilder().token("1:test").build()
+        self.errors: List[BaseException] = []
+
+        async def on_error(_update: object, context: Any) -> None:
+            self.errors.append(context.error)
+
+        self.app.add_error_handler(on_error)
+        self.api = patch.object(Bot, "_post", AsyncMock(return_value=BOT_USER))
+        self.api.start()
+        await self.app.initialize()
+
+    async def asyncTearDown(self):
+        await self.app.shutdown()
+        self.api.stop()
+
+    def _handler(self, name: str, handler_filter: Any = filters.TEXT, **kw: Any):
+        async def callback(*_args: Any) -> None:
+            self.calls.append(name)
+            if name == "stop":
+                raise ApplicationHandlerStop()
+            if name == "broken":
+                raise ValueError(name)
+
+        return MessageHandler(handler_filter, callback, **kw)
+
+    async def _process(self, data: Dict[str, Any]) -> List[str]:
+        self.calls.clear()
+        await self.app.process_update(Update.de_json(data, self.app.bot))
+        return list(self.calls)
+
+    async def test_one_handler_per_group(self):
+        self.app.add_handler(self._handler("sticker", filters.Sticker.ALL), 1)
+        self.app.add_handler(self._handler("text1"), 1)
+        self.app.add_handler(self._handler("text2"), 1)
+        self.app.add_handler(self._handler("broken"), 2)
+        self.app.add_handler(self._handler("any", filters.ALL), 3)
+        self.app.add_handler(CommandHandler("cmd", _noop), 4)
+        router = add_router(self.app)
+        self.assertIs(get_router(self.app), router)
+        self.assertEqual(list(self.app.handlers), [0])
+
+        # errors are reported, next groups are handled still
+        self.assertEqual(
+            await self._process(_text(1, "hi")), ["text1", "broken", "any"]
+        )
+        self.assertEqual(len(self.errors), 1)
+        self.assertEqual(
+            await self._process(_text(2, "/cmd")), ["text1", "broken", "any"]
+        )
+
+        photo = [{"file_id": "f", "file_unique_id": "u", "width": 1, "height": 1}]
+        self.assertEqual(await self._process(_message(3, photo=photo)), ["any"])
+        # text handlers are skipped without being checked
+        self.assertEqual(
+            [h.callback for _, h in router.table((MESSAGE, MessageType.PHOTO))],
+            [h.callback for h in router.handlers[3]],
+        )
+
+    async def test_stop_and_non_blocking(self):
+        self.app.add_handler(self._handler("first", block=False), 1)
+        self.app.add_handler(self._handler("stop"), 2)
+        self.app.add_handler(self._handler("never"), 3)
+        self.app.add_handler(CallbackQueryHandler(_noop), 3)
+        add_router(self.app)
+
+        await self.app.start()
+        await self._process(_text(1, "hi"))
+        await self.app.stop()
+        self.assertEqual(self.calls, ["stop", "first"])
+
+    async def test_handlers_changes(self):
+        router = add_router(self.app)
+        handler = self._handler("late")
+        router.add_handler(handler, 5)
+        self.assertEqual(await self._process(_text(1, "hi")), ["late"])
+        router.remove_handler(handler, 5)
+        router.remove_handler(handler, 5)
+        self.assertEqual(await self._process(_text(1, "hi")), [])
+        self.assertEqual(router.handlers, {})
+
+
+class SkillsRoutingTestCase(IsolatedAsyncioTestCase):
+    """All skills behind the router vs a group per skill"""
+
+    async def asyncSetUp(self):
+        # pylint: disable=import-outside-toplevel
+        from skills import skills
+
+        self.api = patch.object(Bot, "_post", AsyncMock(return_value=BOT_USER))
+        self.api.start()
+        self.calls: List[Tuple[int, int]] = []
+        self.apps: List[App] = []
+        for _ in range(2):
+            app: App = ApplicationBuilder().token("1:test").job_queue(None).build()
+            for group, skill in enumerate(skills, 1):
+                skill["add_handlers"](app, group)
+            self._record(app)
+            await app.initialize()
+            await app.start()
+            self.apps.append(app)
+        self.baseline, self.routed = self.apps[0], self.apps[1]
+        add_router(self.routed)
+
+    async def asyncTearDown(self):
+        for app in self.apps:
+            await app.stop()
+            await app.shutdown()
+        self.api.stop()
+
+    def _record(self, app: App) -> None:
+        """Replace callbacks of all handlers with recording no-ops"""
+        for group, handlers in app.handlers.items():
+            for i, handler in enumerate(handlers):
+
+                async def callback(
+                    *_args: Any, label: Tuple[int, int] = (group, i)
+                ) -> None:
+                    self.calls.append(label)
+
+                handler.callback = callback
+                getattr(handler, "handler", handler).callback = callback
+
+    async def _handled(self, app: App, data: Dict[str, Any]) -> List[Tuple[int, int]]:
+        self.calls.clear()
+        await app.process_update(Update.de_json(data, app.bot))
+        # let non-blocking handlers run
+        for _ in range(3):
+            await asyncio.sleep(0)
+        return sorted(self.calls)
+
+    async def test_same_handlers(self):
+        for data in _corpus():
+            handled = await self._handled(self.baseline, data)
+            self.assertEqual(await self._handled(self.routed, data), handled, data)
+
+    async def test_tables_skip_handlers(self):
+        router = get_router(self.routed)
+        self.assertIsNotNone(router)
+        if router is None:
+            return
+        total = sum(len(handlers) for handlers in router.handlers.values())
+        for route in [
+            (MESSAGE, MessageType.STICKER),
+            (MESSAGE, MessageType.TEXT),
+            (Update.CALLBACK_QUERY, ""),
+        ]:
+            self.assertLess(len(router.table(route)), total, route)
+        # text-only skills are dropped from other message types
+        self.assertLess(
+            len(router.table((MESSAGE, MessageType.STICKER))),
+            len(router.table((MESSAGE, MessageType.TEXT))),
+        )
+        for _, handler in router.table((Update.CALLBACK_QUERY, "")):
+            self.assertNotIsInstance(
+                getattr(handler, "handler", handler), MessageHandler
+            )
+
+    async def _updates_per_sec(self, app: App, updates: List[Update]) -> float:
+        started = time.perf_counter()
+        for _ in range(ROUNDS):
+            for update in updates:
+                await app.process_update(update)
+            # let non-blocking handlers run
+            await asyncio.sleep(0)
+        return ROUNDS * len(updates) / (time.perf_counter() - started)
+
+    @benchmark
+    async def test_process_update_benchmark(self):
+        # debug mode of the test loop slows down tasks a lot
+        asyncio.get_running_loop().set_debug(False)
+        results: Dict[str, float] = {}
+        for name, app in [("group per skill", self.baseline), ("routed", self.routed)]:
+            updates = [Update.de_json(data, app.bot) for data in _corpus()]
+            results[name] = await self._updates_per_sec(app, updates)
+        print(
+            "\nprocess_update: "
+            + ", ".join(
+                f"{name} {rate:,.0f} updates/s" for name, rate in results.items()
+            )
+        )
@@ -0,0 +1,44 @@
+from unittest import TestCase
+
+from telegram.ext import ApplicationBuilder
+
+import skills as skills_module
+from skills import (
+    commands_list,
+    get_skills_hints,
+    enable_skills,
+    get_commands,
+    select_skills,
+    skills,
+)
+from typing_utils import App
+
+
+class SkillsConfigTestCase(TestCase):
+    def tearDown(self):
+        enable_skills(None)
+
+    def test_select_skills(self):
+        self.assertEqual(select_skills(None), skills)
+        # registration order is kept, unknown names are skipped
+        selected = select_skills(["roll", "core", "nope"])
+        self.assertEqual([s["key"] for s in selected], ["core", "roll"])
+        self.assertEqual(len({s["key"] for s in skills}), len(skills))
+
+    def test_enabled_skills_only(self):
+        active = enable_skills(["version", "roll"])
+        self.assertIs(active, skills_module.active_skills)
+        self.assertEqual(get_skills_hints(active).count("\n"), 1)
+        self.assertEqual(
+            [c for c, _ in get_commands(active)],
+            ["hussars", "wipe_hussars", "roll", "version", "gdpr_me"],
+        )
+
+        app: App = ApplicationBuilder().token("1:test").job_queue(None).build()
+        for group, skill in enumerate(active, 1):
+            skill["add_handlers"](app, group)
+        self.assertEqual(list(app.handlers), [1, 2])
+
+    def test_all_commands_have_skills(self):
+        commands = get_commands(skills)
+        self.assertEqual(len(commands), len(commands_list))
@@ -2,6 +2,7 @@ import os
 import unittest
 from datetime import datetime
 from typing import Any, Dict, List, Optional
+from unittest.mock import patch
 from db.sqlite import BotDB
 
 
@@ -31,6 +32,19 @@ class TestBotDB(unittest.TestCase):
         self.db.untrust_user(user_id)
         self.assertFalse(self.db.is_user_trusted(user_id))
 
+    def test_trusted_users_in_memory(self):
+        self.db.trust_user(123, 456)
+        self.db.trust_user(789, 456)
+        self.db.untrust_user(789)
+
+        # loaded at startup, then checks don't touch the DB
+        db = BotDB(db_path=self.db_path)
+        with patch.object(db, "_get_conn", side_effect=AssertionError):
+            self.assertTrue(db.is_user_trusted(123))
+            self.assertTrue(db.is_user_trusted("123"))
+            self.assertFalse(db.is_user_trusted(789))
+            self.assertFalse(db.is_user_trusted("@user"))
+
     def test_buktopuha(self):
         user_id = 1
         user_meta = {"id": 1, "first_name": "Test"}
@@ -63,6 +77,16 @@ class TestBotDB(unittest.TestCase):
         self.db.remove_buktopuha_player(user_id)
         self.assertIsNone(self.db.find_buktopuha_player(user_id))
 
+    def test_buktopuha_questions(self):
+        self.assertIsNone(self.db.pop_buktopuha_question())
+        self.db.add_buktopuha_question("wombat", "model: cube poop?")
+        self.db.add_buktopuha_question("axolotl", "model: smiling salamander?")
+        self.assertEqual(self.db.count_buktopuha_questions(), 2)
+
+        question: Optional[Dict[str, Any]] = self.db.pop_buktopuha_question()
+        self.assertEqual(question, {"word": "wombat", "question": "model: cube poop?"})
+        self.assertEqual(self.db.count_buktopuha_questions(), 1)
+
     def test_towel_quarantine(self):
         user_id = 789
         self.db.add_quarantine_user(user_id, quarantine_time_min=60)
@@ -141,13 +165,50 @@ class TestBotDB(unittest.TestCase):
 
     def test_peninsula_users(self):
         user_id = 3
-        user_meta = {"id": 3, "name": "Peninsula"}
+        user_meta = {"id": 3, "first_name": "Peninsula"}
         self.db.add_peninsula_user(user_id, user_meta)
 
         users: List[Dict[str, Any]] = self.db.get_best_peninsulas(n=10)
         self.assertEqual(len(users), 1)
         self.assertEqual(users[0]["_id"], user_id)
-        self.assertEqual(users[0]["meta"], user_meta)
+        self.assertEqual(users[0]["display_name"], "Peninsula")
+
+    def test_users(self):
+        user_id = 4
+        self.db.add_hussar(user_id, {"id": 4, "first_name": "Jon", "last_name": "Doe"})
+        user: Optional[Dict[str, Any]] = self.db.get_user(user_id)
+        self.assertIsNotNone(user)
+        if user:
+            self.assertEqual(user["display_name"], "Jon Doe")
+
+        self.db.add_peninsula_user(user_id, {"id": 4, "username": "jondoe"})
+        user = self.db.get_user(user_id)
+        self.assertIsNotNone(user)
+        if user:
+            self.assertEqual(user["username"], "jondoe")
+            self.assertEqual(user["first_name"], None)
+            self.assertEqual(user["display_name"], "jondoe")
+
+        hussars: List[Dict[str, Any]] = self.db.get_all_hussars()
+        self.assertEqual(hussars[0]["display_name"], "jondoe")
+
+    def test_users_backfill(self):
+        self.db.add_hussar(5, {"id": 5, "username": "old_hussar"})
+        self.db.add_buktopuha_player(6, {"id": 6}, score=1)
+        self.db.execute("DELETE FROM users")
+
+        # the database is migrated already, rows are not scanned again
+        self.assertIsNone(BotDB(db_path=self.db_path).get_user(5))
+
+        # as if it was created before the users table
+        self.db.execute("PRAGMA user_version = 0")
+        backfilled = BotDB(db_path=self.db_path)
+        user: Optional[Dict[str, Any]] = backfilled.get_user(5)
+        self.assertIsNotNone(user)
+        if user:
+            self.assertEqual(user["display_name"], "old_hussar")
+        players: List[Dict[str, Any]] = backfilled.get_all_buktopuha_players()
+        self.assertEqual(players[0]["display_name"], "unknown")
 
     def test_aoc_data(self):
         data = {"members": {"1": {"name": "AOC User"}}}
@@ -159,6 +220,30 @@ class TestBotDB(unittest.TestCase):
         self.db.remove_all_aoc_data()
         self.assertIsNone(self.db.get_aoc_data())
 
+    def test_transcriptions_lru(self):
+        def add(file_unique_id: str) -> None:
+            self.db.add_transcription(
+                file_unique_id,
+                transcript=f"text {file_unique_id}",
+                duration=3,
+                language="ru-RU",
+                max_entries=2,
+            )
+
+        self.assertIsNone(self.db.get_transcription("a"))
+        add("a")
+        add("b")
+        # touching "a" makes "b" the least recently used one
+        cached: Optional[Dict[str, Any]] = self.db.get_transcription("a")
+        self.assertEqual(
+            cached, {"transcript": "text a", "duration": 3, "language": "ru-RU"}
+        )
+        add("c")
+        self.assertEqual(self.db.count_transcriptions(), 2)
+        self.assertIsNone(self.db.get_transcription("b"))
+        self.assertIsNotNone(self.db.get_transcription("a"))
+        self.assertIsNotNone(self.db.get_transcription("c"))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,94 @@
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict
+from unittest import TestCase
+
+from tests.benchmark import benchmark
+
+# SDKs skills used to import at startup, with their submodules and versions
+HEAVY_MODULES = [
+    "openai",
+    "google.genai",
+    "google.cloud.speech",
+    "google.cloud.translate",
+]
+
+# bot startup as in main.main, up to the first getUpdates;
+# modules passed as arguments are imported first, as skills used to
+STARTUP = """
+import asyncio, json, os, sys, time
+from unittest.mock import AsyncMock, patch
+
+started = time.perf_counter()
+for module in sys.argv[1:]:
+    __import__(module)
+
+def loaded():
+    return sorted(
+        name for name in sys.modules
+        if any(name.startswith(m) for m in %r)
+    )
+
+import skills
+after_import = loaded()
+
+from telegram import Bot
+from telegram.ext import ApplicationBuilder
+import main
+from permissions import admins_cache_handler
+from router import add_router
+
+app = ApplicationBuilder().token("1:test").build()
+app.add_handler(admins_cache_handler(), main.DEFAULT_GROUP)
+for group, skill in enumerate(skills.skills, main.DEFAULT_GROUP + 1):
+    skill["add_handlers"](app, group)
+add_router(app)
+bot_user = {"id": 1, "is_bot": True, "first_name": "bot", "username": "bot"}
+with patch.object(Bot, "_post", AsyncMock(return_value=bot_user)):
+    asyncio.run(app.initialize())
+
+seconds = time.perf_counter() - started
+# peak RSS of this process, ru_maxrss would count the forking test runner
+rss_kib = None
+if os.path.exists("/proc/self/status"):
+    with open("/proc/self/status") as f:
+        rss_kib = next(int(l.split()[1]) for l in f if l.startswith("VmHWM:"))
+print(json.dumps({
+    "import": after_import,
+    "startup": loaded(),
+    "seconds": seconds,
+    "rss_kib": rss_kib,
+}))
+""" % (HEAVY_MODULES,)
+
+
+def _startup(*preload: str) -> Dict[str, Any]:
+    out = subprocess.run(
+        [sys.executable, "-c", STARTUP, *preload],
+        capture_output=True,
+        check=True,
+        env={**os.environ, "TOKEN": "1:test"},
+        text=True,
+        timeout=120,
+    ).stdout
+    return dict(json.loads(out.splitlines()[-1]))
+
+
+class StartupTestCase(TestCase):
+    def test_heavy_sdks_are_lazy(self):
+        loaded = _startup()
+        self.assertEqual(loaded["import"], [])
+        self.assertEqual(loaded["startup"], [])
+
+    @benchmark
+    def test_startup_benchmark(self):
+        lazy = _startup()
+        # what startup paid when skills imported SDKs eagerly
+        eager = _startup(*HEAVY_MODULES)
+        rows = [f"\n{'SDKs':<6} {'first poll':>10} {'max RSS':>10}"]
+        for name, run in [("eager", eager), ("lazy", lazy)]:
+            rss = f"{run['rss_kib'] / 1024:,.0f} MiB" if run["rss_kib"] else "n/a"
+            rows.append(f"{name:<6} {run['seconds']:>9.2f}s {rss:>10}")
+        print("\n".join(rows))
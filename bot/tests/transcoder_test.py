@@ -0,0 +1,154 @@
+import asyncio
+import os
+import shutil
+import stat
+import tempfile
+from typing import AsyncIterator, List, Optional
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from utils import recognition, transcoder
+from utils.recognition import pcm_output_args
+from utils.transcoder import TranscodeError, Transcoder, run_ffmpeg
+
+# stands in for ffmpeg: echoes stdin to stdout, fails if asked to
+FAKE_FFMPEG = """#!/bin/sh
+for arg in "$@"; do
+    if [ "$arg" = "--fail" ]; then
+        echo "broken input" >&2
+        exit 1
+    fi
+done
+exec cat
+"""
+
+
+async def _chunks(parts: List[bytes]) -> AsyncIterator[bytes]:
+    for part in parts:
+        yield part
+
+
+class RunFfmpegTestCase(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        ffmpeg = os.path.join(self.dir, "ffmpeg")
+        with open(ffmpeg, "w", encoding="utf8") as f:
+            f.write(FAKE_FFMPEG)
+        os.chmod(ffmpeg, os.stat(ffmpeg).st_mode | stat.S_IEXEC)
+        self.ffmpeg_patch = patch.object(transcoder, "FFMPEG", ffmpeg)
+        self.ffmpeg_patch.start()
+        self.pool = Transcoder()
+
+    async def asyncTearDown(self):
+        await self.pool.close()
+
+    def tearDown(self):
+        self.ffmpeg_patch.stop()
+        shutil.rmtree(self.dir)
+
+    async def test_streams_through_pipes(self):
+        # larger than a pipe buffer, so stdin and stdout must be served together
+        parts = [bytes([i]) * recognition.CHUNK_SIZE for i in range(32)]
+        out = await self.pool.transcode(_chunks(parts), *pcm_output_args(16000))
+        self.assertEqual(out, b"".join(parts))
+        self.assertEqual(self.pool.stats["bytes_in"], len(out or b""))
+        self.assertEqual(self.pool.stats["bytes_out"], len(out or b""))
+
+    async def test_ffmpeg_failure(self):
+        self.assertIsNone(await run_ffmpeg(_chunks([b"data"]), "--fail"))
+
+    async def test_download_failure(self):
+        async def broken() -> AsyncIterator[bytes]:
+            yield b"data"
+            raise TimeoutError()
+
+        self.assertIsNone(
+            await self.pool.transcode(broken(), "-vn", *pcm_output_args(16000))
+        )
+        self.assertEqual(self.pool.stats["failed"], 1)
+
+
+class TranscoderTestCase(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.active = 0
+        self.max_active = 0
+        self.delay = 0.01
+
+    async def _fake_ffmpeg(
+        self, chunks: AsyncIterator[bytes], *args: str
+    ) -> Optional[bytes]:
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            out = b"".join([chunk async for chunk in chunks])
+            await asyncio.sleep(self.delay)
+            return out + "".join(args).encode()
+        finally:
+            self.active -= 1
+
+    async def test_bounded_concurrency(self):
+        pool = Transcoder(workers=2, queue_size=3)
+        with patch.object(transcoder, "run_ffmpeg", self._fake_ffmpeg):
+            results = await asyncio.gather(
+                *(pool.transcode(_chunks([b"%d" % i]), "!") for i in range(10))
+            )
+        await pool.close()
+
+        self.assertEqual(results, [b"%d!" % i for i in range(10)])
+        self.assertEqual(self.max_active, 2)
+        self.assertLessEqual(pool.stats["max_queue_depth"], 3)
+        self.assertEqual(pool.stats["jobs"], 10)
+        self.assertEqual(pool.stats["bytes_in"], 10)
+        self.assertEqual(pool.stats["bytes_out"], 20)
+
+    async def test_backpressure(self):
+        pool = Transcoder(workers=1, queue_size=1)
+        self.delay = 10
+        with patch.object(transcoder, "run_ffmpeg", self._fake_ffmpeg):
+            submitted = [
+                asyncio.create_task(pool.transcode(_chunks([b"x"]))) for _ in range(3)
+            ]
+            await asyncio.sleep(0.05)
+            # one job is running, one is queued, the last one waits for a slot
+            self.assertEqual(self.active, 1)
+            self.assertEqual(pool.queue_depth, 1)
+            for task in submitted:
+                task.cancel()
+        await pool.close()
+
+    async def test_job_timeout(self):
+        pool = Transcoder(workers=1, job_timeout=0.05)
+        self.delay = 10
+        with patch.object(transcoder, "run_ffmpeg", self._fake_ffmpeg):
+            with self.assertRaises(TranscodeError):
+                await pool.transcode(_chunks([b"x"]))
+        await pool.close()
+
+        self.assertEqual(self.active, 0)
+        self.assertEqual(pool.stats["timed_out"], 1)
+        self.assertEqual(pool.stats["failed"], 1)
+
+    async def test_queue_full(self):
+        pool = Transcoder(workers=1, queue_size=1, queue_timeout=0.05)
+        self.delay = 10
+        with patch.object(transcoder, "run_ffmpeg", self._fake_ffmpeg):
+            running, queued, *waiting = [
+                asyncio.create_task(pool.transcode(_chunks([b"x"]))) for _ in range(4)
+            ]
+            # one job is running, one is queued, the rest give up waiting
+            for task in waiting:
+                with self.assertRaises(TranscodeError):
+                    await task
+            self.assertFalse(running.done() or queued.done())
+            running.cancel()
+            queued.cancel()
+        await pool.close()
+        self.assertEqual(pool.stats["rejected"], 2)
+
+    async def test_ffmpeg_missing(self):
+        pool = Transcoder(workers=1)
+        with patch.object(transcoder, "FFMPEG", "/nonexistent/ffmpeg"):
+            with self.assertRaises(TranscodeError):
+                await pool.transcode(_chunks([b"x"]))
+        await pool.close()
+        self.assertEqual(pool.stats["failed"], 1)
@@ -0,0 +1,146 @@
+import os
+import re
+import time
+from datetime import datetime
+from typing import Callable, FrozenSet, List
+from unittest import TestCase
+from unittest.mock import patch
+
+from telegram import Chat, Message
+
+from filters import UWU_REGEX
+from skills import buktopuha, roll
+from skills.buktopuha import ANSWER_TRIGGER, Games
+from tests.benchmark import benchmark
+from triggers import TextTriggers, first_chars
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "pirozhki.txt")
+# chat messages with triggers, mixed into the replayed corpus
+TRIGGERED = ["/roll", "uwu", "/buktopuha go", "is it a wombat?"]
+
+
+def _message(text: str, chat_id: int = 1) -> Message:
+    chat = Chat(id=chat_id, type=Chat.SUPERGROUP)
+    return Message(message_id=1, date=datetime.now(), chat=chat, text=text)
+
+
+# what each skill matched on its own before the combined scan
+PATTERNS = {
+    "roll": roll.MEME_REGEX,
+    "buktopuha": buktopuha.MEME_REGEX,
+    "uwu": UWU_REGEX,
+    ANSWER_TRIGGER: re.compile(r"\bwombat", re.IGNORECASE),
+}
+
+
+def _corpus() -> List[str]:
+    """Lines of the chat corpus, empty if it is missing"""
+    if not os.path.exists(CORPUS_PATH):
+        return []
+    with open(CORPUS_PATH, encoding="utf8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def _separate_scan(text: str) -> FrozenSet[str]:
+    return frozenset(name for name, p in PATTERNS.items() if p.search(text))
+
+
+def _messages_per_sec(scan: Callable[[str], object], corpus: List[str]) -> float:
+    started = time.perf_counter()
+    for text in corpus:
+        scan(text)
+    return len(corpus) / (time.perf_counter() - started)
+
+
+def _skills_triggers() -> TextTriggers:
+    skills = TextTriggers()
+    skills.add("roll", roll.MEME_REGEX)
+    skills.add("buktopuha", buktopuha.MEME_REGEX)
+    skills.add("uwu", UWU_REGEX)
+    skills.add(ANSWER_TRIGGER, re.compile(r"\bwombat", re.IGNORECASE), 1)
+    return skills
+
+
+class TextTriggersTestCase(TestCase):
+    def test_scan(self):
+        t = _skills_triggers()
+        self.assertEqual(t.scan("hello there"), frozenset())
+        self.assertEqual(t.scan("/ROLL or uwu?"), {"roll", "uwu"})
+        # other chats don't see answers of the game
+        self.assertEqual(t.scan("wombat uwu", 1), {ANSWER_TRIGGER, "uwu"})
+        self.assertEqual(t.scan("wombat uwu", 2), {"uwu"})
+
+        t.remove(ANSWER_TRIGGER, 1)
+        t.remove(ANSWER_TRIGGER, 1)
+        self.assertEqual(t.scan("wombat", 1), frozenset())
+
+    def test_overlaps_and_flags(self):
+        t = TextTriggers()
+        t.add("short", re.compile("a"))
+        t.add("long", re.compile(r"\bAB", re.IGNORECASE))
+        # both start at the same position, the first alternative wins the scan
+        self.assertEqual(t.scan("ab"), {"short", "long"})
+        # flags of patterns are kept apart
+        self.assertEqual(t.scan("AB"), {"long"})
+        self.assertEqual(t.scan("xab"), {"short"})
+
+        # the first element is optional, matches don't start with it
+        t.add("optional", re.compile("[xy]?b"))
+        self.assertEqual(t.scan("b"), {"optional"})
+        t.add("kelvin", re.compile("k", re.IGNORECASE))
+        self.assertEqual(t.scan("\u212a"), {"kelvin"})
+
+        with self.assertRaises(ValueError):
+            t.add("groups", re.compile("(a)"))
+
+    def test_skills_patterns_are_prefiltered(self):
+        for pattern in (roll.MEME_REGEX, buktopuha.MEME_REGEX, UWU_REGEX):
+            self.assertIsNotNone(first_chars(pattern), pattern)
+        self.assertEqual(first_chars(re.compile(r"\b" + re.escape("c++"))), "c")
+
+    def test_scan_once_per_message(self):
+        t = _skills_triggers()
+        roll_filter, uwu_filter = t.filter("roll"), t.filter("uwu")
+        message = _message("/roll uwu")
+        with patch.object(t, "scan", wraps=t.scan) as scan:
+            self.assertTrue(roll_filter.filter(message))
+            self.assertTrue(uwu_filter.filter(message))
+            self.assertEqual(scan.call_count, 1)
+
+            # triggers changed since the scan
+            t.remove("uwu")
+            self.assertFalse(uwu_filter.filter(message))
+            self.assertEqual(scan.call_count, 2)
+
+    def test_game_answer_trigger(self):
+        t = TextTriggers()
+        with patch.object(buktopuha, "text_triggers", t):
+            game = Games()[1]
+            game.start("wombat")
+            self.assertEqual(t.match(_message("WOMBATS!", 1)), {ANSWER_TRIGGER})
+            self.assertEqual(t.match(_message("wombats", 2)), frozenset())
+            game.stop()
+            self.assertEqual(t.match(_message("wombats", 1)), frozenset())
+
+    def test_matches_separate_scans(self):
+        skills = _skills_triggers()
+        for text in TRIGGERED + _corpus():
+            self.assertEqual(skills.scan(text, 1), _separate_scan(text), text)
+        self.assertEqual(
+            [len(skills.scan(text, 1)) for text in TRIGGERED], [1, 1, 1, 1]
+        )
+
+    @benchmark
+    def test_scan_benchmark(self):
+        corpus = _corpus()
+        if not corpus:
+            self.skipTest("no chat corpus")
+        # replayed chat with a trigger in every 100 messages
+        corpus += TRIGGERED * (len(corpus) // 100)
+        skills = _skills_triggers()
+        separate = _messages_per_sec(_separate_scan, corpus)
+        combined = _messages_per_sec(lambda text: skills.scan(text, 1), corpus)
+        print(
+            f"\ntext triggers on {len(corpus)} messages: separate scans "
+            f"{separate:,.0f} msg/s, combined {combined:,.0f} msg/s"
+        )
@@ -0,0 +1,196 @@
+import asyncio
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, patch
+
+from telegram import Bot, Update
+from telegram.ext import ApplicationBuilder, MessageHandler, PollHandler, filters
+
+from router import add_router
+from skills import skills
+from tests.benchmark import benchmark
+from typing_utils import App
+from update_processor import ChatOrderedUpdateProcessor
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "bot", "username": "bot"}
+CHATS = 10
+UPDATES_PER_CHAT = 20
+WORKERS = 4
+# updates of a chat in a row
+BURST = 5
+# handler time, like a Bot API call
+HANDLER_SECONDS = 0.005
+
+
+def _update(update_id: int, chat_id: int) -> Dict[str, Any]:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "group", "title": "chat"},
+            "text": f"{update_id}",
+        },
+    }
+
+
+class ChatOrderedUpdateProcessorTestCase(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        asyncio.get_running_loop().set_debug(False)
+        self.api = patch.object(Bot, "_post", AsyncMock(return_value=BOT_USER))
+        self.api.start()
+        self.handled: List[Tuple[int, int]] = []
+        self.running = 0
+        self.max_running = 0
+        # updates being handled by chat
+        self.in_flight: Counter[int] = Counter()
+        self.max_chats_in_flight = 0
+        self.max_per_chat = 0
+
+    async def asyncTearDown(self):
+        self.api.stop()
+
+    async def _callback(self, update: Update, _context: Any) -> None:
+        assert update.effective_chat is not None
+        chat_id = update.effective_chat.id
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        self.in_flight[chat_id] += 1
+        self.max_chats_in_flight = max(self.max_chats_in_flight, len(self.in_flight))
+        self.max_per_chat = max(self.max_per_chat, self.in_flight[chat_id])
+        # later updates of a chat may finish sooner if they race
+        await asyncio.sleep(random.uniform(0, 2 * HANDLER_SECONDS))
+        self.in_flight[chat_id] -= 1
+        if not self.in_flight[chat_id]:
+            del self.in_flight[chat_id]
+        self.running -= 1
+        self.handled.append((chat_id, update.update_id))
+
+    def _app(self, processor: Any) -> App:
+        builder = ApplicationBuilder().token("1:test").job_queue(None)
+        if processor is not None:
+            builder = builder.concurrent_updates(processor)
+        app: App = builder.build()
+        app.add_handler(MessageHandler(filters.ALL, self._callback))
+        return app
+
+    async def _run(self, app: App, updates: List[Dict[str, Any]]) -> float:
+        """Seconds to handle the updates"""
+        async with app:
+            await app.start()
+            for data in updates:
+                await app.update_queue.put(Update.de_json(data, app.bot))
+            start = time.perf_counter()
+            await app.update_queue.join()
+            seconds = time.perf_counter() - start
+            await app.stop()
+        return seconds
+
+    @staticmethod
+    def _updates() -> List[Dict[str, Any]]:
+        # chats take turns with bursts of updates
+        return [
+            _update(i, -(i // BURST % CHATS) - 1)
+            for i in range(CHATS * UPDATES_PER_CHAT)
+        ]
+
+    async def test_order_within_chat(self):
+        updates = self._updates()
+        await self._run(self._app(ChatOrderedUpdateProcessor(WORKERS)), updates)
+
+        self.assertEqual(len(self.handled), len(updates))
+        for chat in range(1, CHATS + 1):
+            ids = [u for c, u in self.handled if c == -chat]
+            self.assertEqual(ids, sorted(ids))
+        self.assertGreater(self.max_running, 1)
+        self.assertLessEqual(self.max_running, WORKERS)
+
+    async def test_updates_without_chat(self):
+        polled = asyncio.Event()
+
+        async def on_poll(*_args: Any) -> None:
+            polled.set()
+
+        app = self._app(ChatOrderedUpdateProcessor(WORKERS))
+        app.add_handler(PollHandler(on_poll))
+        poll = {
+            "id": "1",
+            "question": "?",
+            "options": [{"text": "a", "voter_count": 0}],
+            "total_voter_count": 0,
+            "is_closed": False,
+            "is_anonymous": True,
+            "type": "regular",
+            "allows_multiple_answers": False,
+        }
+        await self._run(app, [{"update_id": 1, "poll": poll}])
+        self.assertTrue(polled.is_set())
+
+    def test_workers(self):
+        with self.assertRaises(ValueError):
+            ChatOrderedUpdateProcessor(0)
+        self.assertGreater(ChatOrderedUpdateProcessor(1).max_concurrent_updates, 1)
+
+    async def test_chats_in_flight(self):
+        updates = self._updates()
+        await self._run(self._app(None), updates)
+        self.assertEqual(self.max_chats_in_flight, 1)
+
+        self.handled.clear()
+        await self._run(self._app(ChatOrderedUpdateProcessor(WORKERS)), updates)
+        # chats are handled side by side, a chat never runs two updates at once
+        self.assertGreater(self.max_chats_in_flight, 1)
+        self.assertLessEqual(self.max_chats_in_flight, WORKERS)
+        self.assertEqual(self.max_per_chat, 1)
+        for chat in range(1, CHATS + 1):
+            ids = [u for c, u in self.handled if c == -chat]
+            self.assertEqual(
+                ids,
+                [
+                    u["update_id"]
+                    for u in updates
+                    if u["message"]["chat"]["id"] == -chat
+                ],
+            )
+
+    async def test_slow_updates_of_chat(self):
+        events: List[Tuple[str, int]] = []
+
+        async def slow(update: Update, _context: Any) -> None:
+            events.append(("start", update.update_id))
+            await asyncio.sleep(10 * HANDLER_SECONDS)
+            events.append(("end", update.update_id))
+
+        app = self._app(ChatOrderedUpdateProcessor(WORKERS))
+        app.add_handler(MessageHandler(filters.ALL, slow), 1)
+        add_router(app)
+        await self._run(app, [_update(1, -1), _update(2, -1)])
+        self.assertEqual(events, [("start", 1), ("end", 1), ("start", 2), ("end", 2)])
+
+    def test_chat_state_handlers_block(self):
+        # non-blocking handlers would run in background, out of the chat order
+        app = self._app(None)
+        for skill in skills:
+            if skill["key"] in ("roll", "towel_mode", "buktopuha"):
+                skill["add_handlers"](app, 1)
+        self.assertTrue(app.handlers[1])
+        for handler in app.handlers[1]:
+            # mode gated handlers block as the handler they wrap
+            self.assertTrue(handler.block, handler)
+
+    @benchmark
+    async def test_throughput_benchmark(self):
+        updates = self._updates()
+        sequential = await self._run(self._app(None), updates)
+        ordered = await self._run(
+            self._app(ChatOrderedUpdateProcessor(WORKERS)), updates
+        )
+        print(
+            f"\n{len(updates)} updates of {CHATS} chats, {WORKERS} workers\n"
+            f"sequential: {len(updates) / sequential:.0f} updates/s\n"
+            f"ordered:    {len(updates) / ordered:.0f} updates/s"
+        )
+        self.assertLess(ordered, sequential)
@@ -0,0 +1,182 @@
+import asyncio
+import os
+import signal
+import statistics
+import time
+from typing import Any, Dict, List, Tuple
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, patch
+
+import aiohttp
+from telegram import Bot
+from telegram.ext import ApplicationBuilder, MessageHandler, filters
+
+from config import WebhookConfig
+from tests.benchmark import benchmark
+from typing_utils import App
+from webhook import (
+    HEALTH_PATH,
+    READY_PATH,
+    SECRET_HEADER,
+    WebhookServer,
+    serve_webhook,
+)
+
+SECRET = "s3cr3t"
+PATH = "/telegram"
+# load test: synthetic updates and connections, as Telegram max_connections
+UPDATES = 1000
+CONNECTIONS = 40
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "bot", "username": "bot"}
+
+
+def _update(update_id: int) -> Dict[str, Any]:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": update_id % 10, "type": "private"},
+            "text": "hello",
+        },
+    }
+
+
+class WebhookServerTestCase(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.handled: List[int] = []
+        self.handled_at: Dict[int, float] = {}
+        self.app: App = ApplicationBuilder().token("1:test").job_queue(None).build()
+
+        async def callback(update: Any, _context: Any) -> None:
+            self.handled.append(update.update_id)
+            self.handled_at[update.update_id] = time.perf_counter()
+
+        self.app.add_handler(MessageHandler(filters.ALL, callback))
+        self.api = patch.object(Bot, "_post", AsyncMock(return_value=BOT_USER))
+        self.api.start()
+        await self.app.initialize()
+        await self.app.start()
+        self.server = WebhookServer(self.app, SECRET, PATH)
+        await self.server.start("127.0.0.1", 0)
+        self.url = f"http://127.0.0.1:{self.server.port}"
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=CONNECTIONS)
+        )
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.server.stop()
+        if self.app.running:
+            await self.app.stop()
+        await self.app.shutdown()
+        self.api.stop()
+
+    async def _post(self, data: Any, secret: str = SECRET) -> int:
+        async with self.session.post(
+            self.url + PATH, json=data, headers={SECRET_HEADER: secret}
+        ) as response:
+            return response.status
+
+    async def _get(self, path: str) -> int:
+        async with self.session.get(self.url + path) as response:
+            return response.status
+
+    async def _until_handled(self, count: int) -> None:
+        while len(self.handled) < count:
+            await asyncio.sleep(0.001)
+
+    async def test_secret_token(self):
+        self.assertEqual(await self._post(_update(1), secret="wrong"), 401)
+        async with self.session.post(self.url + PATH, json=_update(2)) as response:
+            self.assertEqual(response.status, 401)
+        self.assertEqual(await self._post(_update(3)), 200)
+        await asyncio.wait_for(self._until_handled(1), 5)
+        self.assertEqual(self.handled, [3])
+
+    async def test_bad_updates(self):
+        self.assertEqual(await self._post([1, 2]), 400)
+        self.assertEqual(await self._post({"message": {}}), 400)
+        async with self.session.post(
+            self.url + PATH, data=b"{", headers={SECRET_HEADER: SECRET}
+        ) as response:
+            self.assertEqual(response.status, 400)
+
+    async def test_health(self):
+        await self.app.stop()
+        # the server is up before the app is started
+        self.assertEqual(await self._get(HEALTH_PATH), 200)
+        self.assertEqual(await self._get(READY_PATH), 503)
+
+        await self.app.start()
+        self.assertEqual(await self._get(HEALTH_PATH), 200)
+        self.assertEqual(await self._get(READY_PATH), 200)
+
+        await self.app.stop()
+        self.assertEqual(await self._get(HEALTH_PATH), 200)
+        self.assertEqual(await self._get(READY_PATH), 503)
+
+    async def _load(self) -> Tuple[List[int], Dict[int, float]]:
+        """Statuses and send times of UPDATES posted over CONNECTIONS"""
+        statuses: List[int] = []
+        sent: Dict[int, float] = {}
+
+        async def connection(first: int) -> None:
+            # like Telegram, one update at a time per connection
+            for update_id in range(first, UPDATES, CONNECTIONS):
+                sent[update_id] = time.perf_counter()
+                statuses.append(await self._post(_update(update_id)))
+
+        await asyncio.gather(*(connection(i) for i in range(CONNECTIONS)))
+        await asyncio.wait_for(self._until_handled(UPDATES), 30)
+        return statuses, sent
+
+    async def test_load(self):
+        statuses, _ = await self._load()
+        self.assertEqual(statuses, [200] * UPDATES)
+        # every update is handled exactly once
+        self.assertEqual(sorted(self.handled), list(range(UPDATES)))
+
+    @benchmark
+    async def test_load_benchmark(self):
+        asyncio.get_running_loop().set_debug(False)
+        started = time.perf_counter()
+        _, sent = await self._load()
+        elapsed = time.perf_counter() - started
+        latencies = sorted(self.handled_at[i] - sent[i] for i in range(UPDATES))
+        p95 = latencies[int(len(latencies) * 0.95)]
+        print(
+            f"\nwebhook: {UPDATES} updates over {CONNECTIONS} connections, "
+            f"{UPDATES / elapsed:,.0f} updates/s, end-to-end latency "
+            f"p50 {statistics.median(latencies) * 1000:.1f}ms, "
+            f"p95 {p95 * 1000:.1f}ms"
+        )
+
+
+class RunWebhookTestCase(IsolatedAsyncioTestCase):
+    async def test_run_until_signal(self):
+        app: App = ApplicationBuilder().token("1:test").job_queue(None).build()
+        conf: WebhookConfig = {
+            "URL": "https://bot.example.com/",
+            "LISTEN": "127.0.0.1",
+            "PORT": 0,
+            "PATH": PATH,
+            "SECRET_TOKEN": SECRET,
+            "MAX_CONNECTIONS": CONNECTIONS,
+        }
+        post = AsyncMock(return_value=BOT_USER)
+        with patch.object(Bot, "_post", post):
+            run = asyncio.create_task(serve_webhook(app, conf, ["message"]))
+            while not app.running:
+                await asyncio.sleep(0.01)
+            os.kill(os.getpid(), signal.SIGTERM)
+            await asyncio.wait_for(run, 5)
+
+        self.assertFalse(app.running)
+        calls: List[Any] = [c for c in post.call_args_list if c.args[0] == "setWebhook"]
+        self.assertEqual(len(calls), 1)
+        params = calls[0].args[1]
+        self.assertEqual(params["url"], "https://bot.example.com/telegram")
+        self.assertEqual(params["secret_token"], SECRET)
+        self.assertEqual(params["max_connections"], CONNECTIONS)
@@ -0,0 +1,94 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from unittest import TestCase
+from unittest.mock import patch
+
+from db.sqlite import BotDB
+from utils.word_bank import WordBank
+
+
+class WordBankTestCase(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "words.txt")
+        self._write(["cat", "wombat", "capybara", "armadillo", "platypuses"])
+        self.db = BotDB(db_path=os.path.join(self.dir, "test_bot.db"))
+        self.db_patch = patch("utils.word_bank.db", self.db)
+        self.db_patch.start()
+
+    def tearDown(self):
+        self.db_patch.stop()
+        shutil.rmtree(self.dir)
+
+    def _write(self, words: list[str]) -> None:
+        with open(self.path, "w", encoding="utf8") as f:
+            f.write("\n".join(words) + "\n")
+
+    def test_sample_without_replacement(self):
+        bank = WordBank("test", self.path)
+        self.assertEqual(len(bank), 5)
+        cycle = [str(bank.sample()) for _ in range(5)]
+        self.assertEqual(
+            sorted(cycle), ["armadillo", "capybara", "cat", "platypuses", "wombat"]
+        )
+
+        prev = cycle[-1]
+        for _ in range(50):
+            word = bank.sample()
+            self.assertNotEqual(word, prev)
+            prev = word
+
+    def test_levels(self):
+        bank = WordBank("test", self.path)
+        self.assertIn(bank.sample("easy"), ["cat", "wombat"])
+        self.assertIn(bank.sample("medium"), ["capybara", "armadillo"])
+        self.assertEqual(bank.sample("hard"), "platypuses")
+        self.assertIsNone(bank.sample("nightmare"))
+
+    def test_cursor_is_persisted(self):
+        bank = WordBank("test", self.path)
+        first = [bank.sample() for _ in range(3)]
+        rest = [WordBank("test", self.path).sample() for _ in range(2)]
+        self.assertEqual(len(set(first + rest)), 5)
+
+    def test_reload_on_change(self):
+        bank = WordBank("test", self.path)
+        self._write(["кот", "вомбат"])
+        asyncio.run(bank.refresh())
+        self.assertEqual(len(bank), 2)
+        self.assertIn(bank.sample(), ["кот", "вомбат"])
+
+    def test_rewritten_in_place(self):
+        bank = WordBank("test", self.path)
+        # same inode and size, old offsets would split the new words
+        words = ["dog", "quokka", "bilby", "numbat", "koala", "platypuses"]
+        with open(self.path, "r+b") as f:
+            f.write("\n".join(words).encode() + b"\n")
+        self.assertEqual(os.path.getsize(self.path), 41)
+        future = time.time() + 10
+        os.utime(self.path, (future, future))
+        self.assertLessEqual({bank.sample() for _ in range(20)}, set(words))
+        self.assertEqual(len(bank), 6)
+
+    def test_shrunk_in_place(self):
+        bank = WordBank("test", self.path)
+        with open(self.path, "r+b") as f:
+            f.write(b"cat\n")
+            f.truncate()
+        self.assertEqual(bank.sample(), "cat")
+        self.assertEqual(len(bank), 1)
+
+    def test_index_is_compact(self):
+        n = 100_000
+        self._write([f"word{i}" for i in range(n)])
+        tracemalloc.start()
+        bank = WordBank("test", self.path)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertEqual(len(bank), n)
+        # 4 bytes per word for offsets, plus array growth slack
+        self.assertLess(peak, n * 16)
@@ -0,0 +1,159 @@
+import logging
+import re
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from telegram import Message
+from telegram.constants import MessageType
+from telegram.ext.filters import MessageFilter
+
+logger = logging.getLogger(__name__)
+
+NO_TRIGGERS: FrozenSet[str] = frozenset()
+
+# scoped inline flags which can be kept in the combined pattern
+INLINE_FLAGS = [
+    (re.IGNORECASE, "i"),
+    (re.MULTILINE, "m"),
+    (re.DOTALL, "s"),
+    (re.VERBOSE, "x"),
+]
+
+# trigger name and the chat it is limited to, None for all chats
+TriggerKey = Tuple[str, Optional[int]]
+
+
+def _inline(pattern: re.Pattern[str]) -> str:
+    flags = "".join(letter for flag, letter in INLINE_FLAGS if pattern.flags & flag)
+    return f"(?{flags}:{pattern.pattern})"
+
+
+def first_chars(pattern: re.Pattern[str]) -> Optional[str]:
+    """Characters a match starts with, None if it's not plain from the source.
+
+    Only simple patterns are looked into: a literal, an escaped symbol or
+    a set of literals, after `\\b` or `^`.
+    """
+    source = pattern.pattern
+    if pattern.flags & re.VERBOSE or "|" in source:
+        return None
+    while source.startswith(("\\b", "^")):
+        source = source[1:] if source.startswith("^") else source[2:]
+    if source.startswith("\\"):
+        chars, rest = source[1:2], source[2:]
+        if not chars or chars.isalnum():
+            return None
+    elif source.startswith("["):
+        end = source.find("]", 2)
+        chars, rest = source[1:end], source[end + 1 :]
+        if end < 0 or any(c in chars for c in "\\-^["):
+            return None
+    else:
+        chars, rest = source[:1], source[1:]
+        if not chars or chars in ".()[]{}*+?$":
+            return None
+    # the first element may be skipped
+    return None if rest.startswith(("?", "*", "{")) else chars
+
+
+class TextTriggers:
+    """Text patterns of all skills, matched against a message in one scan.
+
+    All patterns are compiled into one alternation, behind a lookahead for
+    the characters matches can start with when they are plain from the
+    patterns. So a message without triggers, which is nearly every message,
+    is scanned once. When it
+    matches, the leftmost match is where other triggers may start, only
+    they are checked one by one from there. Results are kept for the last
+    message, so filters of all skills share one scan.
+    """
+
+    def __init__(self) -> None:
+        self._patterns: Dict[TriggerKey, re.Pattern[str]] = {}
+        self._keys: List[TriggerKey] = []
+        self._combined: Optional[re.Pattern[str]] = None
+        self._version = 0
+        self._last: Tuple[Optional[Message], int, FrozenSet[str]] = (
+            None,
+            0,
+            NO_TRIGGERS,
+        )
+
+    def add(
+        self, name: str, pattern: re.Pattern[str], chat_id: Optional[int] = None
+    ) -> None:
+        if pattern.groups:
+            raise ValueError(f"trigger {name} pattern has groups: {pattern.pattern}")
+        self._patterns[(name, chat_id)] = pattern
+        self._changed()
+
+    def remove(self, name: str, chat_id: Optional[int] = None) -> None:
+        if self._patterns.pop((name, chat_id), None) is not None:
+            self._changed()
+
+    def _changed(self) -> None:
+        self._combined = None
+        self._version += 1
+
+    def _compile(self) -> Optional[re.Pattern[str]]:
+        if self._combined is None and self._patterns:
+            self._keys = list(self._patterns)
+            patterns = [self._patterns[key] for key in self._keys]
+            # no groups: only the position of the leftmost match is used
+            source = "|".join(_inline(p) for p in patterns)
+            first = [first_chars(p) for p in patterns]
+            if all(first):
+                # most positions are skipped by a single set lookup
+                chars = sorted(set("".join(c for c in first if c)))
+                prefilter = "".join(re.escape(c) for c in chars)
+                source = f"(?=(?i:[{prefilter}]))(?:{source})"
+            self._combined = re.compile(source)
+            logger.debug("compiled %d text triggers", len(self._keys))
+        return self._combined
+
+    def scan(self, text: str, chat_id: Optional[int] = None) -> FrozenSet[str]:
+        """Names of triggers found in the text of a message in the chat"""
+        combined = self._compile()
+        m = combined.search(text) if combined is not None else None
+        if m is None:
+            return NO_TRIGGERS
+        # nothing matches before the leftmost match
+        start = m.start()
+        found: Set[str] = set()
+        for key in self._keys:
+            name, scope = key
+            if name in found or scope not in (None, chat_id):
+                continue
+            if self._patterns[key].search(text, start) is not None:
+                found.add(name)
+        return frozenset(found)
+
+    def match(self, message: Message) -> FrozenSet[str]:
+        last_message, version, found = self._last
+        if message is last_message and version == self._version:
+            return found
+        found = (
+            self.scan(message.text, message.chat_id) if message.text else NO_TRIGGERS
+        )
+        self._last = (message, self._version, found)
+        return found
+
+    def filter(self, name: str) -> "TriggerFilter":
+        return TriggerFilter(self, name)
+
+
+class TriggerFilter(MessageFilter):
+    """Messages with a text trigger, see `TextTriggers`"""
+
+    # lets the router skip the filter for non-text messages
+    message_types = frozenset([MessageType.TEXT])
+
+    def __init__(self, triggers: TextTriggers, trigger: str):
+        super().__init__(name=f"Filters.trigger({trigger})")
+        self.triggers = triggers
+        self.trigger = trigger
+
+    def filter(self, message: Message) -> bool:
+        return self.trigger in self.triggers.match(message)
+
+
+text_triggers = TextTriggers()
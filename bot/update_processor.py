@@ -0,0 +1,81 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Coroutine, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+# handlers running at once, updates of other chats wait for a free worker
+UPDATE_WORKERS = 8
+# updates taken from the queue and waiting for their chat or a worker
+MAX_PENDING_UPDATES = 1024
+
+
+def _chat_key(update: object) -> Optional[int]:
+    """Chat the update is ordered within, its user for updates without chat"""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return None
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates of different chats concurrently, of one chat in order.
+
+    An update starts only when the previous update of its chat is handled,
+    so mode state, roll barrels or game answers of a chat are never raced.
+    Up to `workers` updates are handled at once. Handlers with block=False
+    still run in background, out of the order, so skills keeping chat state
+    register blocking handlers.
+    """
+
+    def __init__(
+        self, workers: int = UPDATE_WORKERS, max_pending: int = MAX_PENDING_UPDATES
+    ):
+        # the base semaphore only bounds pending updates: updates pass it in
+        # queue order, the order in a chat is kept below it
+        super().__init__(max(max_pending, workers, 2))
+        if workers < 1:
+            raise ValueError("workers must be a positive integer")
+        self.workers = workers
+        self._running = asyncio.BoundedSemaphore(workers)
+        # the last update of a chat, done when it is handled
+        self._tails: Dict[int, asyncio.Future[None]] = {}
+
+    async def do_process_update(
+        self, update: object, coroutine: Awaitable[Any]
+    ) -> None:
+        key = _chat_key(update)
+        if key is None:
+            async with self._running:
+                await coroutine
+            return
+
+        previous = self._tails.get(key)
+        handled: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._tails[key] = handled
+        try:
+            if previous is not None:
+                # not cancelled along with this update
+                await asyncio.wait([previous])
+            async with self._running:
+                await coroutine
+        finally:
+            # never started if cancelled while waiting
+            if isinstance(coroutine, Coroutine):
+                coroutine.close()
+            handled.set_result(None)
+            if self._tails.get(key) is handled:
+                del self._tails[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        if self._tails:
+            logger.warning("%d chats still have updates in process", len(self._tails))
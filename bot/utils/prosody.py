@@ -0,0 +1,55 @@
+from typing import List
+
+VOWELS = "аеёиоуыэюя"
+CYRILLIC = "абвгдеёжзийклмнопрстуфхцчшщъыьэюя"
+PIROZHOK_SYLLABLES = [9, 8, 9, 8]
+
+_DROP_VOWELS = str.maketrans("", "", VOWELS + VOWELS.upper())
+_DROP_CYRILLIC = str.maketrans("", "", CYRILLIC + CYRILLIC.upper())
+
+
+def count_syllables(text: str) -> int:
+    """Number of (russian) vowels in text"""
+    return len(text) - len(text.translate(_DROP_VOWELS))
+
+
+def is_cyrillic(word: str) -> bool:
+    """True if word consists of cyrillic letters only"""
+    return not word.translate(_DROP_CYRILLIC)
+
+
+def check_pirozhok(pirozhok: str) -> List[str]:
+    """Check poem against pirozhok rules in a single pass.
+
+    Returns all found violations, empty list if poem is fine.
+    """
+    lines = pirozhok.splitlines()
+    non_cyrillic: List[str] = []
+    syllable_errors: List[str] = []
+
+    for i, line in enumerate(lines):
+        non_cyrillic.extend(w for w in line.split() if not is_cyrillic(w))
+        if i >= len(PIROZHOK_SYLLABLES):
+            continue
+        expected = PIROZHOK_SYLLABLES[i]
+        cnt = count_syllables(line)
+        if cnt != expected:
+            syllable_errors.append(
+                f"В строке {i + 1} ({line}) должно быть {expected} слогов, а не {cnt}."
+            )
+
+    errors: List[str] = []
+    if len(lines) != len(PIROZHOK_SYLLABLES):
+        errors.append("Пирожок должен состоять из 4 строк.")
+    if non_cyrillic:
+        errors.append(
+            f"Слова {', '.join(non_cyrillic)} содержат не кириллические символы. "
+            "Попробуй заменить или транслитерировать. Например вместо gpt используй жэпэтэ."
+        )
+    if syllable_errors:
+        errors.extend(syllable_errors)
+        errors.append(
+            "Количество слогов в строках должно соответствовать формуле пирожка (9-8-9-8)."
+        )
+
+    return errors
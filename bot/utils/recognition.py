@@ -1,210 +1,271 @@
+import asyncio
 import json
-from typing import Tuple, Optional, Literal, Any, Callable, NoReturn
+from typing import AsyncIterator, Dict, NamedTuple, Optional, Literal, Tuple, TypedDict
 import logging
 import os
-import subprocess
-from tempfile import NamedTemporaryFile
-import requests
-from requests.exceptions import RequestException
+import time
 
-TOKEN = os.environ["TOKEN"]
+import aiohttp
+
+from config import get_speech_backend, get_vosk_model_path
+from db.sqlite import db
+from utils.recognizers import CHANNEL_COUNT, Recognizer, create_recognizer
+from utils.transcoder import TranscodeError, transcoder
 
-LANG = "ru-RU"
-SAMPLE_RATE_HERTZ = 48000
-ENCODING_TYPE = "LINEAR16"
-CHANNEL_COUNT = 1
-ENABLE_AUTOMATIC_PUNCTUATION = True
-SPEECH_MODEL = "default"
+TOKEN = os.environ["TOKEN"]
 
 OGA = ".oga"
-MP4 = ".mp4"
+# Max number of transcriptions kept, least recently used are evicted
+TRANSCRIPTION_CACHE_SIZE = 1000
 
-VIDEO: MediaType = "video"
-MediaType = Literal["audio", "video"]
+# Send OGG/Opus voice as is when the recognizer supports it
+DIRECT_OPUS = True
+# OGG/Opus sample rates accepted by recognizers, Opus decodes to 48kHz anyway
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
 
+MediaType = Literal["audio", "video"]
 AUDIO: MediaType = "audio"
+VIDEO: MediaType = "video"
+
+TG_API_URL = "https://api.telegram.org"
+# max time of a single telegram request, file streaming included
+DOWNLOAD_TIMEOUT = 30
+CHUNK_SIZE = 64 * 1024
+
+# Payload paths
+OGG_OPUS = "ogg_opus"
+TRANSCODED = "transcoded"
 
 logger = logging.getLogger(__name__)
 
-try:
-    from google.cloud import speech
-except Exception as exc:  # pylint: disable=broad-except
-    speech = None
-    logger.warning("google speech unavailable: %s", exc)
 
+class PayloadStats(TypedDict):
+    requests: int
+    payload_bytes: int
+    # total seconds spent downloading (and transcoding) and recognizing
+    prepare_time: float
+    recognize_time: float
 
-class Dummy:
-    "dummy class to substitute speech client when in dev mode"
 
-    def __getattribute__(self, name: str) -> Callable[..., NoReturn]:
-        def funcoff(*args: Any, **kwargs: Any) -> NoReturn:
-            raise Exception(
-                "google speech failed to initialize, voice recognition unavailable"
-            )
+class Payload(NamedTuple):
+    path: str
+    content: bytes
+    # (sample rate, channels) of OGG/Opus payload, None for LINEAR16 samples
+    opus: Optional[Tuple[int, int]]
 
-        return funcoff
 
+stats: Dict[str, PayloadStats] = {
+    path: {
+        "requests": 0,
+        "payload_bytes": 0,
+        "prepare_time": 0.0,
+        "recognize_time": 0.0,
+    }
+    for path in (OGG_OPUS, TRANSCODED)
+}
 
-credentials_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "").strip()
-if speech is None:
-    logger.info("google speech disabled: library is not available")
-    speech_client: Any = Dummy()
-elif not credentials_path or not os.path.exists(credentials_path):
-    logger.info(
-        "google speech disabled: GOOGLE_APPLICATION_CREDENTIALS is not set or file missing"
-    )
-    speech_client = Dummy()
-else:
-    try:
-        speech_client = speech.SpeechClient()
-    # pylint: disable=W0702
-    except:  # noqa
-        logger.error("failed to initialize google speech")
-        speech_client = Dummy()
+_recognizer: Optional[Recognizer] = None
+_recognizer_ready = False
+
+
+def get_recognizer() -> Optional[Recognizer]:
+    """Recognizer of the configured backend, created on first use"""
+    global _recognizer, _recognizer_ready
+    if not _recognizer_ready:
+        _recognizer = create_recognizer(get_speech_backend(), get_vosk_model_path())
+        _recognizer_ready = True
+    return _recognizer
 
 
-def _get_tg_resource(file_id: str) -> Optional[Tuple[bytes, MediaType]]:
-    url = f"https://api.telegram.org/bot{TOKEN}/getFile?file_id={file_id}"
+async def _get_tg_file_path(
+    session: aiohttp.ClientSession, file_id: str
+) -> Optional[str]:
+    url = f"{TG_API_URL}/bot{TOKEN}/getFile"
     try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        json_response = response.json()
+        async with session.get(url, params={"file_id": file_id}) as response:
+            response.raise_for_status()
+            json_response = await response.json()
         logger.info("Data has been obtained: \n%s", json.dumps(json_response, indent=4))
-        file_path = json_response["result"]["file_path"]
-    except (RequestException, KeyError, ValueError) as exc:
+        return str(json_response["result"]["file_path"])
+    except (aiohttp.ClientError, TimeoutError, KeyError, ValueError) as exc:
         logger.error("failed to fetch tg file metadata: %s", exc)
         return None
 
-    try:
-        url = f"https://api.telegram.org/file/bot{TOKEN}/{file_path}"
-        response = requests.get(url, stream=True, timeout=10)
-        response.raise_for_status()
-    except RequestException as exc:
-        logger.error("failed to download tg file: %s", exc)
-        return None
-
-    return (response.content, AUDIO) if OGA in file_path else (response.content, VIDEO)
-
 
-def _get_converted_audio_content(buffer: bytes) -> Optional[bytes]:
-    with NamedTemporaryFile(suffix=OGA) as tmp_voice:
-        tmp_voice.write(buffer)
-
-        tmp_voice_filename_ogg = tmp_voice.name
-        tmp_voice_filename_wav = tmp_voice_filename_ogg[: -len(OGA)] + ".wav"
-
-        try:
-            result = subprocess.run(
-                ["ffmpeg", "-i", tmp_voice_filename_ogg, tmp_voice_filename_wav],
-                check=True,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-            )
-        except subprocess.CalledProcessError as err:
-            logger.error("error with ffmpeg while processing %s: %s", OGA, err)
-            return None
-
-        if result.returncode != 0 or not os.path.exists(tmp_voice_filename_wav):
-            logger.error("ffmpeg failed to produce wav for %s", OGA)
-            return None
-
-        with open(tmp_voice_filename_wav, "rb") as converted_wav:
-            converted_wav_bin = converted_wav.read()
-
-        os.remove(tmp_voice_filename_wav)
-
-    return converted_wav_bin
+async def _iter_tg_file(
+    session: aiohttp.ClientSession, file_path: str
+) -> AsyncIterator[bytes]:
+    """Download tg file chunk by chunk, never holding it whole in memory"""
+    url = f"{TG_API_URL}/file/bot{TOKEN}/{file_path}"
+    async with session.get(url) as response:
+        response.raise_for_status()
+        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+            yield chunk
+
+
+async def _get_converted_audio_content(
+    chunks: AsyncIterator[bytes], sample_rate: int
+) -> Optional[bytes]:
+    return await transcoder.transcode(chunks, *pcm_output_args(sample_rate))
+
+
+async def _get_converted_video_content(
+    chunks: AsyncIterator[bytes], sample_rate: int
+) -> Optional[bytes]:
+    # drop the video stream, only the sound track is recognized
+    return await transcoder.transcode(chunks, "-vn", *pcm_output_args(sample_rate))
+
+
+def pcm_output_args(sample_rate: int) -> tuple[str, ...]:
+    """Raw LINEAR16 samples the recognizers take, no container needed"""
+    return (
+        "-f",
+        "s16le",
+        "-acodec",
+        "pcm_s16le",
+        "-ac",
+        str(CHANNEL_COUNT),
+        "-ar",
+        str(sample_rate),
+    )
 
 
-def _send_binary_to_google_speech(content: bytes) -> Any:
-    """Sends binary data of voice to google speech."""
-    config = {
-        "language_code": LANG,
-        "sample_rate_hertz": SAMPLE_RATE_HERTZ,
-        "encoding": ENCODING_TYPE,
-        "audio_channel_count": CHANNEL_COUNT,
-        "enable_automatic_punctuation": ENABLE_AUTOMATIC_PUNCTUATION,
-        "model": SPEECH_MODEL,
-    }
-    audio = {"content": content}
-    # noinspection PyTypeChecker
-    return speech_client.recognize(config=config, audio=audio)
+def _get_media_type(file_path: str) -> MediaType:
+    return AUDIO if OGA in file_path else VIDEO
 
 
-def _check_google_speech_response(response: Any) -> Optional[str]:
-    results = list(getattr(response, "results", []) or [])
-    if not results:
-        return None
-    result = results[-1]
-    logger.info("Google speech response results: %s", result)
+def get_opus_format(content: bytes) -> Optional[Tuple[int, int]]:
+    """(sample rate, channels) from the OpusHead packet of an OGG file.
 
-    any_alternatives = list(getattr(result, "alternatives", []) or [])
-    if not any_alternatives:
+    None if the file is not OGG/Opus.
+    """
+    if content[:4] != b"OggS" or len(content) < 27:
         return None
-
-    transcription = getattr(any_alternatives[0], "transcript", None)
-    if transcription is None:
+    # the first page holds only the OpusHead packet, right after segment table
+    start = 27 + content[26]
+    head = content[start : start + 19]
+    if len(head) < 19 or head[:8] != b"OpusHead":
         return None
-    return str(transcription)
+    channels = head[9]
+    sample_rate = int.from_bytes(head[12:16], "little")
+    if sample_rate not in OPUS_SAMPLE_RATES:
+        sample_rate = 48000
+    return sample_rate, channels
 
 
-def _get_converted_video_content(buffer: bytes) -> Optional[bytes]:
-    with NamedTemporaryFile(suffix=MP4) as tmp_video:
-        tmp_video.write(buffer)
+async def _iter_bytes(content: bytes) -> AsyncIterator[bytes]:
+    for i in range(0, len(content), CHUNK_SIZE):
+        yield content[i : i + CHUNK_SIZE]
 
-        tmp_video_filename_mp4 = tmp_video.name
-        tmp_audio_filename_wav = tmp_video_filename_mp4[: -len(MP4)] + ".wav"
 
+async def _get_payload(
+    session: aiohttp.ClientSession, recognizer: Recognizer, file_path: str
+) -> Optional[Payload]:
+    """Voice goes as is if possible, otherwise it is transcoded to LINEAR16"""
+    chunks = _iter_tg_file(session, file_path)
+    media_type = _get_media_type(file_path)
+    if media_type == AUDIO and DIRECT_OPUS and recognizer.supports_opus:
         try:
-            result = subprocess.run(
-                [
-                    "ffmpeg",
-                    "-i",
-                    tmp_video_filename_mp4,
-                    "-acodec",
-                    "libvorbis",
-                    tmp_audio_filename_wav,
-                ],
-                check=True,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-            )
-        except subprocess.CalledProcessError as err:
-            logger.error("error with ffmpeg while processing %s: %s", MP4, err)
+            raw = b"".join([chunk async for chunk in chunks])
+        except (aiohttp.ClientError, TimeoutError) as exc:
+            logger.error("failed to download tg file: %s", exc)
             return None
+        opus = get_opus_format(raw)
+        if opus is not None:
+            return Payload(OGG_OPUS, raw, opus)
+        logger.info("voice is not OGG/Opus, transcoding")
+        chunks = _iter_bytes(raw)
+
+    content = (
+        await _get_converted_audio_content(chunks, recognizer.sample_rate)
+        if media_type == AUDIO
+        else await _get_converted_video_content(chunks, recognizer.sample_rate)
+    )
+    return None if content is None else Payload(TRANSCODED, content, None)
 
-        if result.returncode != 0 or not os.path.exists(tmp_audio_filename_wav):
-            logger.error("ffmpeg failed to produce wav for %s", MP4)
-            return None
 
-        with open(tmp_audio_filename_wav, "rb") as converted_wav:
-            converted_wav_bin = converted_wav.read()
+def _send_payload(recognizer: Recognizer, payload: Payload) -> Optional[str]:
+    if payload.opus is None:
+        return recognizer.recognize(payload.content)
+    sample_rate, channels = payload.opus
+    return recognizer.recognize_opus(payload.content, sample_rate, channels)
 
-        os.remove(tmp_audio_filename_wav)
 
-    return converted_wav_bin
+def _report(payload: Payload, prepare_time: float, recognize_time: float) -> None:
+    path_stats = stats[payload.path]
+    path_stats["requests"] += 1
+    path_stats["payload_bytes"] += len(payload.content)
+    path_stats["prepare_time"] += prepare_time
+    path_stats["recognize_time"] += recognize_time
+    logger.info(
+        "%s payload of %d bytes, prepared in %.2fs, recognized in %.2fs",
+        payload.path,
+        len(payload.content),
+        prepare_time,
+        recognize_time,
+    )
 
 
-def get_recognized_text(file_id: str):
-    try:
-        tg_resource = _get_tg_resource(file_id)
-        if tg_resource is None:
-            return None
-        bin_data, file_type = tg_resource
+async def get_recognized_text(
+    file_id: str, file_unique_id: Optional[str] = None, duration: int = 0
+) -> Optional[str]:
+    """Recognize voice or video note, reusing the cached transcript if any.
 
-        converted_content = (
-            _get_converted_audio_content(bin_data)
-            if file_type == AUDIO
-            else _get_converted_video_content(bin_data)
+    `file_unique_id` is the same for forwarded and re-sent media, unlike
+    `file_id`, so it is the cache key.
+    """
+    recognizer = get_recognizer()
+    if recognizer is None:
+        logger.warning("speech recognition is unavailable")
+        return None
+
+    if file_unique_id is not None:
+        cached = db.get_transcription(file_unique_id)
+        if cached is not None and cached["language"] == recognizer.language:
+            logger.info("transcription cache hit for %s", file_unique_id)
+            return str(cached["transcript"])
+
+    result = await _recognize(recognizer, file_id)
+    if result is not None and file_unique_id is not None:
+        db.add_transcription(
+            file_unique_id,
+            transcript=result,
+            duration=duration,
+            language=recognizer.language,
+            max_entries=TRANSCRIPTION_CACHE_SIZE,
         )
-        if converted_content is None:
-            return converted_content
+    return result
+
+
+async def _recognize(recognizer: Recognizer, file_id: str) -> Optional[str]:
+    try:
+        async with aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=DOWNLOAD_TIMEOUT)
+        ) as session:
+            file_path = await _get_tg_file_path(session, file_id)
+            if file_path is None:
+                return None
+            started = time.monotonic()
+            payload = await _get_payload(session, recognizer, file_path)
+        if payload is None:
+            return None
 
-        response = _send_binary_to_google_speech(converted_content)
-        result = _check_google_speech_response(response)
-        logger.info("Result of voice recognition: %s", result)
+        prepared = time.monotonic()
+        # recognizers are blocking, keep them off the event loop
+        result = await asyncio.to_thread(_send_payload, recognizer, payload)
+        _report(payload, prepared - started, time.monotonic() - prepared)
+        logger.info("Result of %s voice recognition: %s", recognizer.name, result)
         return result
-    except (AttributeError, ValueError, RuntimeError) as ex:
+    except (
+        AttributeError,
+        ValueError,
+        RuntimeError,
+        # ffmpeg is missing, a job or a request timed out, network failures
+        OSError,
+        TimeoutError,
+        aiohttp.ClientError,
+        TranscodeError,
+    ) as ex:
         logger.error(
             "Error during the voice recognition %s",
             {"exception": ex, "file_id": file_id},
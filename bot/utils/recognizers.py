@@ -0,0 +1,180 @@
+import hashlib
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Optional, Protocol
+
+from utils.sdk import optional_module
+
+logger = logging.getLogger(__name__)
+
+LANG = "ru-RU"
+CHANNEL_COUNT = 1
+
+GOOGLE = "google"
+VOSK = "vosk"
+FAKE = "fake"
+
+
+class Recognizer(ABC):
+    """Speech to text backend taking raw mono LINEAR16 samples.
+
+    Samples are expected at `sample_rate`. `recognize` is blocking, callers
+    should run it in a thread.
+    """
+
+    name = ""
+    language = LANG
+    sample_rate = 48000
+    # takes OGG/Opus files as is, without transcoding
+    supports_opus = False
+
+    @abstractmethod
+    def recognize(self, content: bytes) -> Optional[str]:
+        """Transcript of the samples, None if nothing was recognized"""
+
+    def recognize_opus(
+        self, content: bytes, sample_rate: int, channels: int
+    ) -> Optional[str]:
+        raise ValueError(f"{self.name} does not support OGG/Opus")
+
+
+class GoogleRecognizer(Recognizer):
+    name = GOOGLE
+    sample_rate = 48000
+    supports_opus = True
+    enable_automatic_punctuation = True
+    model = "default"
+
+    def __init__(self) -> None:
+        credentials_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "").strip()
+        if not credentials_path or not os.path.exists(credentials_path):
+            raise RuntimeError(
+                "GOOGLE_APPLICATION_CREDENTIALS is not set or file missing"
+            )
+        speech = optional_module("google.cloud.speech")
+        if speech is None:
+            raise RuntimeError("google speech library is not available")
+        self.client: Any = speech.SpeechClient()
+
+    def recognize(self, content: bytes) -> Optional[str]:
+        return self._recognize(content, "LINEAR16", self.sample_rate, CHANNEL_COUNT)
+
+    def recognize_opus(
+        self, content: bytes, sample_rate: int, channels: int
+    ) -> Optional[str]:
+        return self._recognize(content, "OGG_OPUS", sample_rate, channels)
+
+    def _recognize(
+        self, content: bytes, encoding: str, sample_rate: int, channels: int
+    ) -> Optional[str]:
+        config = {
+            "language_code": self.language,
+            "sample_rate_hertz": sample_rate,
+            "encoding": encoding,
+            "audio_channel_count": channels,
+            "enable_automatic_punctuation": self.enable_automatic_punctuation,
+            "model": self.model,
+        }
+        audio = {"content": content}
+        # noinspection PyTypeChecker
+        response = self.client.recognize(config=config, audio=audio)
+        return _check_google_speech_response(response)
+
+
+def _check_google_speech_response(response: Any) -> Optional[str]:
+    results = list(getattr(response, "results", []) or [])
+    if not results:
+        return None
+    result = results[-1]
+    logger.info("Google speech response results: %s", result)
+
+    any_alternatives = list(getattr(result, "alternatives", []) or [])
+    if not any_alternatives:
+        return None
+
+    transcription = getattr(any_alternatives[0], "transcript", None)
+    if transcription is None:
+        return None
+    return str(transcription)
+
+
+class _KaldiRecognizer(Protocol):
+    """The part of vosk.KaldiRecognizer used here (vosk ships no type hints)"""
+
+    def AcceptWaveform(self, data: bytes) -> bool: ...
+
+    def FinalResult(self) -> str: ...
+
+
+class VoskRecognizer(Recognizer):
+    """Offline recognizer running a local Vosk (Kaldi) model on CPU."""
+
+    name = VOSK
+    # vosk models are trained on 16kHz audio
+    sample_rate = 16000
+    # samples fed to the model at once, 0.25s
+    chunk_size = 8000
+
+    def __init__(self, model_path: str):
+        # optional offline backend, not installed by default
+        module: Any = optional_module("vosk")
+        if module is None:
+            raise RuntimeError("vosk library is not available")
+        if not os.path.isdir(model_path):
+            raise RuntimeError(f"vosk model not found at {model_path}")
+        module.SetLogLevel(-1)
+        self.model: object = module.Model(model_path)
+        self._new_recognizer: Callable[[object, int], _KaldiRecognizer] = (
+            module.KaldiRecognizer
+        )
+
+    def recognize(self, content: bytes) -> Optional[str]:
+        rec = self._new_recognizer(self.model, self.sample_rate)
+        for i in range(0, len(content), self.chunk_size):
+            rec.AcceptWaveform(content[i : i + self.chunk_size])
+        text = json.loads(rec.FinalResult()).get("text", "")
+        return str(text) or None
+
+
+class FakeRecognizer(Recognizer):
+    """Deterministic stand-in for tests: transcript depends only on samples.
+
+    Silence is not recognized, like with real backends.
+    """
+
+    name = FAKE
+    sample_rate = 16000
+
+    def __init__(self, supports_opus: bool = False):
+        self.supports_opus = supports_opus
+
+    def recognize(self, content: bytes) -> Optional[str]:
+        if not content.strip(b"\0"):
+            return None
+        seconds = len(content) / (2 * CHANNEL_COUNT * self.sample_rate)
+        return f"{seconds:.1f}s {hashlib.sha1(content).hexdigest()[:8]}"
+
+    def recognize_opus(
+        self, content: bytes, sample_rate: int, channels: int
+    ) -> Optional[str]:
+        if not self.supports_opus:
+            return super().recognize_opus(content, sample_rate, channels)
+        return f"opus {hashlib.sha1(content).hexdigest()[:8]}"
+
+
+def create_recognizer(backend: str, vosk_model_path: str = "") -> Optional[Recognizer]:
+    """Create recognizer by backend name, None if it is unavailable"""
+    try:
+        if backend == GOOGLE:
+            return GoogleRecognizer()
+        if backend == VOSK:
+            return VoskRecognizer(vosk_model_path)
+        if backend == FAKE:
+            return FakeRecognizer()
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.error("%s speech recognition disabled: %s", backend, exc)
+        return None
+    logger.error("unknown speech recognition backend: %s", backend)
+    return None
@@ -0,0 +1,63 @@
+"""Heavy third-party SDKs, imported on first use.
+
+openai, google-genai and google-cloud clients take about a second each to
+import, so skills get them from here when they call a model instead of at
+bot startup.
+"""
+
+import importlib
+import importlib.util
+import logging
+import os
+from types import ModuleType
+from typing import TYPE_CHECKING, Dict, Optional
+
+if TYPE_CHECKING:
+    import openai
+    from google import genai
+
+logger = logging.getLogger(__name__)
+
+_modules: Dict[str, Optional[ModuleType]] = {}
+_openai: Optional["openai.OpenAI"] = None
+_genai: Optional["genai.Client"] = None
+
+
+def has_module(name: str) -> bool:
+    """Whether the module is installed, without importing it"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ImportError:
+        return False
+
+
+def optional_module(name: str) -> Optional[ModuleType]:
+    """Module imported on the first call, None if it is missing or broken"""
+    if name not in _modules:
+        try:
+            _modules[name] = importlib.import_module(name)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("%s unavailable: %s", name, exc)
+            _modules[name] = None
+    return _modules[name]
+
+
+def get_openai() -> "openai.OpenAI":
+    """OpenAI client for OPENAI_API_KEY, raises if the key is not set"""
+    global _openai
+    if _openai is None:
+        import openai  # pylint: disable=import-outside-toplevel,redefined-outer-name
+
+        _openai = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _openai
+
+
+def get_genai() -> "genai.Client":
+    """Gemini client for GEMINI_API_KEY, raises if the key is not set"""
+    global _genai
+    if _genai is None:
+        # pylint: disable=import-outside-toplevel,redefined-outer-name
+        from google import genai
+
+        _genai = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+    return _genai
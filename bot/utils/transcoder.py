@@ -0,0 +1,238 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, List, Optional, Tuple, TypedDict
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+FFMPEG = "ffmpeg"
+# Number of ffmpeg processes running at once
+WORKERS = 2
+# Jobs waiting for a free worker, submitters wait while the queue is full
+QUEUE_SIZE = 16
+# Max time to wait for a free queue slot, seconds
+QUEUE_TIMEOUT = 10
+# Max time of a single job (download included), seconds
+JOB_TIMEOUT = 30
+
+
+class TranscodeError(Exception):
+    """Job was not run: the queue stayed full, it timed out or ffmpeg is missing"""
+
+
+class TranscoderStats(TypedDict):
+    jobs: int
+    failed: int
+    timed_out: int
+    # jobs that did not get a queue slot in time
+    rejected: int
+    bytes_in: int
+    bytes_out: int
+    # total seconds spent transcoding
+    transcode_time: float
+    max_queue_depth: int
+
+
+Job = Tuple[AsyncIterator[bytes], Tuple[str, ...], "asyncio.Future[Optional[bytes]]"]
+
+
+async def run_ffmpeg(chunks: AsyncIterator[bytes], *args: str) -> Optional[bytes]:
+    """Pipe chunks through ffmpeg stdin, collect its stdout.
+
+    Feeding stdin and reading stdout run concurrently, so neither pipe fills up
+    and the input is never written to disk.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        FFMPEG,
+        "-loglevel",
+        "error",
+        "-i",
+        "pipe:0",
+        *args,
+        "pipe:1",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdin, stdout, stderr = proc.stdin, proc.stdout, proc.stderr
+    assert stdin is not None and stdout is not None and stderr is not None
+
+    async def feed() -> None:
+        try:
+            async for chunk in chunks:
+                stdin.write(chunk)
+                await stdin.drain()
+        finally:
+            stdin.close()
+
+    try:
+        try:
+            _, out, err = await asyncio.gather(feed(), stdout.read(), stderr.read())
+        except (
+            aiohttp.ClientError,
+            TimeoutError,
+            BrokenPipeError,
+            ConnectionResetError,
+        ) as exc:
+            logger.error("failed to stream media to ffmpeg: %s", exc)
+            return None
+        returncode = await proc.wait()
+    finally:
+        # timed out, cancelled or failed to feed
+        if proc.returncode is None:
+            proc.kill()
+
+    if returncode != 0:
+        logger.error(
+            "ffmpeg exited with %s: %s",
+            returncode,
+            err.decode("utf8", errors="ignore").strip(),
+        )
+        return None
+    return out
+
+
+class Transcoder:
+    """Fixed pool of workers running ffmpeg jobs from a bounded queue.
+
+    `transcode` waits for a free queue slot, so a burst of media is throttled
+    instead of forking a process per message. Waiting for a slot longer than
+    `queue_timeout` or running longer than `job_timeout` fails the job with
+    TranscodeError. Workers are started lazily on the running event loop.
+    """
+
+    def __init__(
+        self,
+        workers: int = WORKERS,
+        queue_size: int = QUEUE_SIZE,
+        job_timeout: float = JOB_TIMEOUT,
+        queue_timeout: float = QUEUE_TIMEOUT,
+    ):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.job_timeout = job_timeout
+        self.queue_timeout = queue_timeout
+        self.stats: TranscoderStats = {
+            "jobs": 0,
+            "failed": 0,
+            "timed_out": 0,
+            "rejected": 0,
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "transcode_time": 0.0,
+            "max_queue_depth": 0,
+        }
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue[Job]] = None
+        self._tasks: List[asyncio.Task[None]] = []
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def transcode(
+        self, chunks: AsyncIterator[bytes], *args: str
+    ) -> Optional[bytes]:
+        queue = self._ensure_workers()
+        future: asyncio.Future[Optional[bytes]] = (
+            asyncio.get_running_loop().create_future()
+        )
+        try:
+            await asyncio.wait_for(
+                queue.put((chunks, args, future)), self.queue_timeout
+            )
+        except TimeoutError as exc:
+            self.stats["rejected"] += 1
+            raise TranscodeError(
+                f"transcoding queue is full for {self.queue_timeout}s"
+            ) from exc
+        self.stats["max_queue_depth"] = max(
+            self.stats["max_queue_depth"], queue.qsize()
+        )
+        return await future
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._loop = None
+
+    def _ensure_workers(self) -> "asyncio.Queue[Job]":
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._tasks = [
+                loop.create_task(self._worker(self._queue)) for _ in range(self.workers)
+            ]
+        return self._queue
+
+    async def _worker(self, queue: "asyncio.Queue[Job]") -> None:
+        while True:
+            chunks, args, future = await queue.get()
+            try:
+                # the submitter could give up while the job was queued
+                if not future.done():
+                    result = await self._run(chunks, args)
+                    if not future.done():
+                        future.set_result(result)
+            except TranscodeError as exc:
+                logger.error("transcoding job failed: %s", exc)
+                if not future.done():
+                    future.set_exception(exc)
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.exception("transcoding job failed")
+                if not future.done():
+                    future.set_exception(exc)
+            finally:
+                queue.task_done()
+
+    async def _run(
+        self, chunks: AsyncIterator[bytes], args: Tuple[str, ...]
+    ) -> Optional[bytes]:
+        received = 0
+
+        async def counted() -> AsyncIterator[bytes]:
+            nonlocal received
+            async for chunk in chunks:
+                received += len(chunk)
+                yield chunk
+
+        started = time.monotonic()
+        error: Optional[TranscodeError] = None
+        out: Optional[bytes] = None
+        try:
+            async with asyncio.timeout(self.job_timeout):
+                out = await run_ffmpeg(counted(), *args)
+        except TimeoutError as exc:
+            self.stats["timed_out"] += 1
+            error = TranscodeError(f"transcoding took longer than {self.job_timeout}s")
+            error.__cause__ = exc
+        except OSError as exc:
+            error = TranscodeError(f"failed to start {FFMPEG}: {exc}")
+            error.__cause__ = exc
+        elapsed = time.monotonic() - started
+
+        stats = self.stats
+        stats["jobs"] += 1
+        stats["failed"] += out is None
+        stats["bytes_in"] += received
+        stats["bytes_out"] += len(out or b"")
+        stats["transcode_time"] += elapsed
+        logger.info(
+            "transcoded %d -> %d bytes in %.2fs, queue depth %d",
+            received,
+            len(out or b""),
+            elapsed,
+            self.queue_depth,
+        )
+        if error is not None:
+            raise error
+        return out
+
+
+transcoder = Transcoder()
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import mmap
+import os
+import random
+from array import array
+from math import gcd
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from db.sqlite import db
+
+logger = logging.getLogger(__name__)
+
+# word length (in chars) ranges for difficulty levels, upper bound inclusive
+LEVELS: Dict[str, Tuple[int, int]] = {
+    "easy": (0, 6),
+    "medium": (7, 9),
+    "hard": (10, 1 << 30),
+}
+ALL = "all"
+
+
+class _Cursor:
+    """Position in a shuffled order of `size` items without storing the order.
+
+    The order is `(offset + i * step) % size` with `step` coprime to `size`,
+    so every item is visited exactly once per cycle.
+    """
+
+    def __init__(self, size: int, step: int, offset: int, position: int):
+        self.size: int = size
+        self.step: int = step
+        self.offset: int = offset
+        self.position: int = position
+
+    @classmethod
+    def shuffled(cls, size: int, after: Optional[int] = None) -> "_Cursor":
+        step = 1
+        if size > 2:
+            step = random.randrange(1, size)
+            while gcd(step, size) != 1:
+                step = random.randrange(1, size)
+        offset = random.randrange(size) if size > 0 else 0
+        # don't start a new cycle with the item the previous one ended with
+        if after is not None and size > 1 and offset == after:
+            offset = (offset + 1) % size
+        return cls(size, step, offset, 0)
+
+    def next(self) -> int:
+        if self.position >= self.size:
+            last = (self.offset + (self.size - 1) * self.step) % self.size
+            fresh = _Cursor.shuffled(self.size, after=last)
+            self.step, self.offset, self.position = fresh.step, fresh.offset, 0
+        i = (self.offset + self.position * self.step) % self.size
+        self.position += 1
+        return i
+
+
+# (inode, size, mtime in ns) of the indexed file
+FileStat = Tuple[int, int, int]
+
+
+def _file_stat(st: os.stat_result) -> FileStat:
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class _Index(NamedTuple):
+    mm: Optional[mmap.mmap]
+    # line start offsets grouped by level
+    offsets: array[int]
+    ranges: Dict[str, Tuple[int, int]]
+    stat: Optional[FileStat] = None
+
+
+def _build_index(path: str) -> _Index:
+    with open(path, "rb") as f:
+        stat = _file_stat(os.fstat(f.fileno()))
+        if stat[1] == 0:
+            logger.warning("word bank %s is empty", path)
+            return _Index(None, array("I"), {}, stat)
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    by_level: Dict[str, array[int]] = {level: array("I") for level in LEVELS}
+    size = len(mm)
+    pos = 0
+    while pos < size:
+        end = mm.find(b"\n", pos)
+        if end == -1:
+            end = size
+        length = len(mm[pos:end].decode("utf8", errors="ignore").strip())
+        if length > 0:
+            for level, (lo, hi) in LEVELS.items():
+                if lo <= length <= hi:
+                    by_level[level].append(pos)
+                    break
+        pos = end + 1
+
+    offsets: array[int] = array("I")
+    ranges: Dict[str, Tuple[int, int]] = {}
+    for level, level_offsets in by_level.items():
+        ranges[level] = (len(offsets), len(offsets) + len(level_offsets))
+        offsets.extend(level_offsets)
+    ranges[ALL] = (0, len(offsets))
+    return _Index(mm, offsets, ranges, stat)
+
+
+class WordBank:
+    """Words file memory-mapped and indexed by line offsets (4 bytes per word).
+
+    Words are grouped by difficulty level and drawn without replacement: every
+    level has its own shuffled cursor persisted in SQLite, so restarts don't
+    reset it. `refresh` reindexes the file in a worker thread when it changes
+    on disk. `sample` checks the file too: offsets of a file rewritten in
+    place would point into the middle of other words, or past its end.
+    """
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self._missing = False
+        self._index = _Index(None, array("I"), {})
+        self._cursors: Dict[str, _Cursor] = {}
+        self._maybe_reload()
+
+    def __len__(self) -> int:
+        return len(self._index.offsets)
+
+    async def refresh(self) -> None:
+        """Reindex the file if it changed, off the event loop"""
+        await asyncio.to_thread(self._maybe_reload)
+
+    def sample(self, level: str = ALL) -> Optional[str]:
+        # a stat call, the file is reindexed here only if refresh missed a change
+        self._maybe_reload()
+        index = self._index
+        if index.mm is None or level not in index.ranges:
+            return None
+        start, end = index.ranges[level]
+        if start == end:
+            return None
+
+        cursor = self._cursors.get(level)
+        if cursor is None or cursor.size != end - start:
+            cursor = self._load_cursor(level, end - start)
+            self._cursors[level] = cursor
+        i = start + cursor.next()
+        db.set_word_bank_cursor(
+            self.name,
+            level,
+            size=cursor.size,
+            step=cursor.step,
+            offset=cursor.offset,
+            position=cursor.position,
+        )
+        return self._read_line(index.mm, index.offsets[i])
+
+    @staticmethod
+    def _read_line(mm: mmap.mmap, pos: int) -> str:
+        end = mm.find(b"\n", pos)
+        line = mm[pos : end if end != -1 else len(mm)]
+        return line.decode("utf8", errors="ignore").strip()
+
+    def _load_cursor(self, level: str, size: int) -> _Cursor:
+        stored = db.get_word_bank_cursor(self.name, level)
+        if stored is not None and stored["size"] == size:
+            return _Cursor(size, stored["step"], stored["offset"], stored["position"])
+        return _Cursor.shuffled(size)
+
+    def _maybe_reload(self) -> None:
+        try:
+            stat = _file_stat(os.stat(self.path))
+        except OSError as err:
+            # keep serving the last indexed words
+            if not self._missing:
+                logger.error("failed to read word bank %s: %s", self.path, err)
+            self._missing = True
+            return
+        self._missing = False
+        if stat == self._index.stat:
+            return
+        self._reload()
+
+    def _reload(self) -> None:
+        # swapped as a whole: `sample` on the event loop may run meanwhile,
+        # the old map is closed once the last reader drops it
+        try:
+            self._index = _build_index(self.path)
+        except OSError as err:
+            logger.error("failed to index word bank %s: %s", self.path, err)
+            return
+        self._cursors = {}
+        logger.info(
+            "word bank %s: indexed %d words", self.name, len(self._index.offsets)
+        )
@@ -0,0 +1,134 @@
+"""Webhook mode: Telegram posts updates to an aiohttp server of the bot.
+
+An alternative to long polling, enabled by WEBHOOK_URL.
+"""
+
+import asyncio
+import hmac
+import logging
+import secrets
+import signal
+from typing import Any, Dict, Optional, Sequence, cast
+
+from aiohttp import web
+from telegram import Update
+
+from config import WebhookConfig
+from typing_utils import App
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# the process is alive
+HEALTH_PATH = "/healthz"
+# the bot is handling updates
+READY_PATH = "/readyz"
+
+
+class WebhookServer:
+    """Puts updates posted by Telegram into the update queue of the app.
+
+    Requests without the secret token are rejected. An update is answered
+    as soon as it is queued, handlers run in the app just like with polling.
+    """
+
+    def __init__(self, application: App, secret_token: str, path: str = "/telegram"):
+        self.application = application
+        self._secret_token = secret_token.encode()
+        self.app = web.Application()
+        self.app.router.add_post(path, self._update)
+        self.app.router.add_get(HEALTH_PATH, self._health)
+        self.app.router.add_get(READY_PATH, self._ready)
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _update(self, request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_HEADER, "").encode()
+        if not hmac.compare_digest(token, self._secret_token):
+            logger.warning("webhook request without the secret token")
+            return web.Response(status=401)
+        try:
+            data = await request.json()
+            if not isinstance(data, dict):
+                raise ValueError("update is not an object")
+            update = Update.de_json(cast(Dict[str, Any], data), self.application.bot)
+        except (ValueError, TypeError, KeyError) as exc:
+            logger.warning("bad webhook update: %s", exc)
+            return web.Response(status=400)
+        await self.application.update_queue.put(update)
+        return web.Response()
+
+    async def _health(self, _request: web.Request) -> web.Response:
+        return web.Response(text="ok")
+
+    async def _ready(self, _request: web.Request) -> web.Response:
+        if not self.application.running:
+            return web.Response(status=503, text="not running")
+        return web.Response(text="ok")
+
+    async def start(self, listen: str, port: int) -> None:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, listen, port).start()
+        logger.info("webhook is listening on %s", self._runner.addresses)
+
+    @property
+    def port(self) -> int:
+        """Port the server listens on, the real one if it was started on 0"""
+        if self._runner is None:
+            raise RuntimeError("webhook server is not started")
+        return int(self._runner.addresses[0][1])
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def run_webhook(
+    application: App, conf: WebhookConfig, allowed_updates: Sequence[str]
+) -> None:
+    """Like `Application.run_webhook`, served by aiohttp with health endpoints.
+
+    Runs until SIGINT or SIGTERM.
+    """
+    asyncio.run(serve_webhook(application, conf, allowed_updates))
+
+
+async def serve_webhook(
+    application: App, conf: WebhookConfig, allowed_updates: Sequence[str]
+) -> None:
+    """Serve webhook in the running event loop until SIGINT or SIGTERM"""
+    if not conf["URL"]:
+        raise ValueError("WEBHOOK_URL is not set")
+    url = conf["URL"].rstrip("/") + conf["PATH"]
+    secret_token = conf["SECRET_TOKEN"] or secrets.token_urlsafe(32)
+    server = WebhookServer(application, secret_token, conf["PATH"])
+
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopped.set)
+
+    async with application:
+        if application.post_init is not None:
+            await application.post_init(application)
+        await server.start(conf["LISTEN"], conf["PORT"])
+        try:
+            await application.bot.set_webhook(
+                url,
+                allowed_updates=allowed_updates,
+                max_connections=conf["MAX_CONNECTIONS"],
+                secret_token=secret_token,
+            )
+            await application.start()
+            logger.info("webhook is set to %s", url)
+            await stopped.wait()
+        finally:
+            # stop taking updates first, queued ones are handled by stop()
+            await server.stop()
+            if application.running:
+                await application.stop()
+                if application.post_stop is not None:
+                    await application.post_stop(application)
+    if application.post_shutdown is not None:
+        await application.post_shutdown(application)